@@ -5,7 +5,8 @@ from .models import (
     ChamadoTecnico, 
     ApontamentoHoras, 
     EquipamentoEntrada, 
-    ComentarioChamado
+    ComentarioChamado,
+    SequenciaProtocolo
 )
 
 @admin.register(AssuntoChamado)
@@ -100,4 +101,9 @@ class EquipamentoEntradaAdmin(admin.ModelAdmin):
 class ComentarioChamadoAdmin(admin.ModelAdmin):
     list_display = ('chamado', 'autor', 'created_at')
     search_fields = ('texto', 'chamado__protocolo')
-    list_filter = ('created_at',)
\ No newline at end of file
+    list_filter = ('created_at',)
+
+@admin.register(SequenciaProtocolo)
+class SequenciaProtocoloAdmin(admin.ModelAdmin):
+    list_display = ('data', 'ultimo_numero')
+    ordering = ('-data',)
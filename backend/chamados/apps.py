@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class ChamadosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'chamados'
\ No newline at end of file
+    name = 'chamados'
+
+    def ready(self):
+        import chamados.signals
@@ -8,6 +8,7 @@ from django.db import transaction
 
 # Modelos
 from chamados.models import Chamado, ChamadoTecnico, ApontamentoHoras
+from chamados.services import alocar_protocolos
 from equipe.models import Equipe
 from clientes.models import Cliente
 from financeiro.models import LancamentoFinanceiro
@@ -84,6 +85,8 @@ class Command(BaseCommand):
             for cliente in clientes:
                 # Quantidade aleatória de chamados por cliente (entre 3 e 12)
                 qtd_chamados = random.randint(3, 12)
+                # Reserva o bloco de protocolos do cliente de uma vez
+                protocolos = alocar_protocolos(qtd_chamados)
                 
                 for _ in range(qtd_chamados):
                     # Define data aleatória
@@ -118,6 +121,7 @@ class Command(BaseCommand):
 
                     # Cria o Chamado
                     chamado = Chamado(
+                        protocolo=protocolos.pop(0),
                         cliente=cliente,
                         ativo=ativo_vinculado,
                         titulo=titulo,
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import TruncMonth
+from chamados.models import Chamado
+from chamados.services import recalcular_resumo_operacional, mes_local
+from servicos.models import OrdemServico
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o rollup mensal do dashboard operacional (TB_RESUMO_OPERACIONAL_MENSAL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int, help='Reconstrói apenas este ano')
+        parser.add_argument('--mes', type=int, help='Reconstrói apenas este mês (exige --ano)')
+        parser.add_argument('--empresa', type=int, help='Reconstrói apenas esta empresa')
+
+    def handle(self, *args, **options):
+        fatias = set()
+        fontes = [
+            (Chamado, 'data_abertura'), (Chamado, 'data_fechamento'),
+            (OrdemServico, 'data_entrada'), (OrdemServico, 'data_finalizacao'),
+        ]
+        for model, campo in fontes:
+            qs = model.objects.filter(**{f'{campo}__isnull': False})
+            if options['empresa']:
+                qs = qs.filter(empresa_id=options['empresa'])
+            meses = qs.annotate(mes_ref=TruncMonth(campo)).values_list('empresa_id', 'mes_ref').distinct()
+            for empresa_id, mes_ref in meses:
+                ano, mes = mes_local(mes_ref)
+                fatias.add((empresa_id, ano, mes))
+
+        if options['ano']:
+            fatias = {f for f in fatias if f[1] == options['ano']}
+        if options['mes']:
+            fatias = {f for f in fatias if f[2] == options['mes']}
+
+        for empresa_id, ano, mes in sorted(fatias, key=lambda f: (f[1], f[2], f[0] or 0)):
+            recalcular_resumo_operacional(empresa_id, ano, mes)
+            self.stdout.write(f"  -> Empresa {empresa_id or '-'}: {mes:02d}/{ano}")
+
+        self.stdout.write(self.style.SUCCESS(f'{len(fatias)} fatia(s) do resumo operacional reconstruída(s).'))
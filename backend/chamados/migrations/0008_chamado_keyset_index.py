@@ -0,0 +1,21 @@
+# Generated by Django 6.0.3 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0007_resolucaoassunto'),
+        ('clientes', '0002_emailgestao'),
+        ('core', '0001_initial'),
+        ('equipe', '0001_initial'),
+        ('infra', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['-created_at', '-id'], name='idx_chamado_keyset'),
+        ),
+    ]
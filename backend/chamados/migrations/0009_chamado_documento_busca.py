@@ -0,0 +1,60 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+from chamados.models import normalizar_busca
+
+
+def preencher_documento_busca(apps, schema_editor):
+    Chamado = apps.get_model('chamados', 'Chamado')
+    lote = []
+    for chamado in Chamado.objects.select_related('cliente').iterator(chunk_size=500):
+        partes = [chamado.protocolo, chamado.titulo, chamado.cliente.nome, chamado.cliente.razao_social]
+        chamado.documento_busca = normalizar_busca(' '.join(p for p in partes if p))
+        lote.append(chamado)
+        if len(lote) >= 500:
+            Chamado.objects.bulk_update(lote, ['documento_busca'])
+            lote = []
+    if lote:
+        Chamado.objects.bulk_update(lote, ['documento_busca'])
+
+
+def criar_indices_busca(apps, schema_editor):
+    # Apenas PostgreSQL: no SQLite (testes) a busca cai para LIKE simples.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_chamado_busca_trgm '
+        'ON "TB_CHAMADO" USING gin ("documento_busca" gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_chamado_busca_fts '
+        'ON "TB_CHAMADO" USING gin '
+        '(to_tsvector(\'portuguese\'::regconfig, COALESCE("documento_busca", \'\')))'
+    )
+
+
+def remover_indices_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS idx_chamado_busca_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS idx_chamado_busca_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0008_chamado_keyset_index'),
+        ('clientes', '0002_emailgestao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chamado',
+            name='documento_busca',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(preencher_documento_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0009_chamado_documento_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaProtocolo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Protocolo',
+                'db_table': 'TB_SEQUENCIA_PROTOCOLO',
+            },
+        ),
+    ]
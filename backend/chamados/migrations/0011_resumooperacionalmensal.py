@@ -0,0 +1,36 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0010_sequenciaprotocolo'),
+        ('clientes', '0002_emailgestao'),
+        ('core', '0001_initial'),
+        ('equipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoOperacionalMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('origem', models.CharField(choices=[('CHAMADO', 'Chamado'), ('OS', 'Ordem de Serviço')], max_length=10)),
+                ('bucket', models.CharField(choices=[('ABERTO', 'Aberto'), ('ANDAMENTO', 'Em Andamento'), ('FINALIZADO', 'Finalizado'), ('OUTRO', 'Outro')], max_length=20)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clientes.cliente')),
+                ('empresa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.empresa')),
+                ('tecnico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='equipe.equipe')),
+            ],
+            options={
+                'verbose_name': 'Resumo Operacional Mensal',
+                'db_table': 'TB_RESUMO_OPERACIONAL_MENSAL',
+                'indexes': [models.Index(fields=['ano', 'mes', 'empresa'], name='idx_resumo_op_mes')],
+            },
+        ),
+    ]
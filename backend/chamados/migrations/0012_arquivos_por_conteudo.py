@@ -0,0 +1,39 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:10
+
+import utils.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0011_resumooperacionalmensal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chamado',
+            name='arquivo_1',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='chamados/docs/'),
+        ),
+        migrations.AlterField(
+            model_name='chamado',
+            name='arquivo_2',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='chamados/docs/'),
+        ),
+        migrations.AlterField(
+            model_name='chamado',
+            name='arquivo_conclusao',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='chamados/conclusao/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='chamado',
+            name='foto_antes',
+            field=models.ImageField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='chamados/fotos/'),
+        ),
+        migrations.AlterField(
+            model_name='chamado',
+            name='foto_depois',
+            field=models.ImageField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='chamados/fotos/'),
+        ),
+    ]
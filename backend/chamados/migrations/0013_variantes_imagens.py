@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamados', '0012_arquivos_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chamado',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,6 +1,17 @@
-from django.db import models
+import unicodedata
+from django.db import models, transaction
 from django.utils import timezone
 from django.conf import settings
+from utils.armazenamento import armazenamento_conteudo
+
+
+def normalizar_busca(texto):
+    """Minúsculas e sem acentos: 'Manutenção João' -> 'manutencao joao'."""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
 
 class AssuntoChamado(models.Model):
     titulo = models.CharField(max_length=100, unique=True)
@@ -104,11 +115,13 @@ class Chamado(TimeStampedModel):
     financeiro_gerado = models.BooleanField(default=False, help_text="Indica se a cobrança automática foi gerada")
     
     # Arquivos
-    arquivo_conclusao = models.FileField(upload_to='chamados/conclusao/%Y/%m/', null=True, blank=True)
-    arquivo_1 = models.FileField(upload_to='chamados/docs/', null=True, blank=True)
-    arquivo_2 = models.FileField(upload_to='chamados/docs/', null=True, blank=True)
-    foto_antes = models.ImageField(upload_to='chamados/fotos/', null=True, blank=True)
-    foto_depois = models.ImageField(upload_to='chamados/fotos/', null=True, blank=True)
+    arquivo_conclusao = models.FileField(upload_to='chamados/conclusao/%Y/%m/', storage=armazenamento_conteudo, null=True, blank=True)
+    arquivo_1 = models.FileField(upload_to='chamados/docs/', storage=armazenamento_conteudo, null=True, blank=True)
+    arquivo_2 = models.FileField(upload_to='chamados/docs/', storage=armazenamento_conteudo, null=True, blank=True)
+    foto_antes = models.ImageField(upload_to='chamados/fotos/', storage=armazenamento_conteudo, null=True, blank=True)
+    foto_depois = models.ImageField(upload_to='chamados/fotos/', storage=armazenamento_conteudo, null=True, blank=True)
+    # Thumb/médio em WebP e JPEG, gerados em background (core.tasks.gerar_variantes_imagem)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
 
     data_agendamento = models.DateTimeField(null=True, blank=True)
     
@@ -124,35 +137,71 @@ class Chamado(TimeStampedModel):
     
     tecnicos = models.ManyToManyField('equipe.Equipe', through='ChamadoTecnico')
 
+    # Documento de busca (protocolo + título + cliente), normalizado sem acentos.
+    # Indexado com pg_trgm/tsvector no PostgreSQL (ver migração 0009).
+    documento_busca = models.TextField(blank=True, default='', editable=False)
+
+    # Campos que alimentam o documento de busca
+    CAMPOS_BUSCA = {'protocolo', 'titulo', 'cliente', 'cliente_id'}
+
     class Meta: 
         db_table = 'TB_CHAMADO'
         ordering = ['-created_at']
+        indexes = [
+            # Paginação por cursor (utils.pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='idx_chamado_keyset'),
+        ]
 
     def __str__(self):
         return self.protocolo or f"ID {self.pk}"
 
+    def montar_documento_busca(self, cliente=None):
+        if cliente is None and self.cliente_id:
+            cliente = self.cliente
+        partes = [self.protocolo, self.titulo]
+        if cliente:
+            partes += [cliente.nome, cliente.razao_social]
+        return normalizar_busca(' '.join(p for p in partes if p))
+
     def save(self, *args, **kwargs):
         ida = float(self.custo_ida or 0)
         volta = float(self.custo_volta or 0)
         self.custo_transporte = ida + volta
 
         if not self.protocolo:
-            hoje = timezone.now().strftime('%Y%m%d')
-            ultimo = Chamado.objects.filter(protocolo__startswith=hoje).order_by('-protocolo').first()
-            
-            sequencia = 1
-            if ultimo and ultimo.protocolo:
-                try:
-                    sequencia = int(ultimo.protocolo[-3:]) + 1
-                except ValueError:
-                    sequencia = 1
-            
-            self.protocolo = f"{hoje}{str(sequencia).zfill(3)}"
-
-        super().save(*args, **kwargs)
-
-        if self.tecnico:
-            ChamadoTecnico.objects.get_or_create(chamado=self, tecnico=self.tecnico)
+            from .services import alocar_protocolos
+            self.protocolo = alocar_protocolos(1)[0]
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.CAMPOS_BUSCA.intersection(update_fields):
+            self.documento_busca = self.montar_documento_busca()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'documento_busca'}
+
+        # Atômico: os on_commit do post_save (rollup do dashboard) só rodam depois do
+        # vínculo com o técnico, mesmo em autocommit
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Com update_fields, o vínculo só precisa ser garantido quando o responsável muda
+            if self.tecnico_id and (update_fields is None or 'tecnico' in update_fields):
+                ChamadoTecnico.objects.get_or_create(chamado=self, tecnico_id=self.tecnico_id)
+
+class SequenciaProtocolo(models.Model):
+    """
+    Contador de protocolos por dia (uma linha por data).
+    Incrementado com UPDATE atômico em chamados.services.alocar_protocolos,
+    que trava só a linha do dia em vez de ler o maior protocolo da tabela.
+    """
+    data = models.DateField(unique=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'TB_SEQUENCIA_PROTOCOLO'
+        verbose_name = 'Sequência de Protocolo'
+
+    def __str__(self):
+        return f"{self.data:%Y%m%d}: {self.ultimo_numero}"
 
 class ChamadoTecnico(models.Model):
     chamado = models.ForeignKey(Chamado, on_delete=models.CASCADE)
@@ -202,3 +251,42 @@ class ComentarioChamado(models.Model):
 
     class Meta:
         ordering = ['created_at']
+
+
+class ResumoOperacionalMensal(models.Model):
+    """
+    Rollup mensal do dashboard operacional (ChamadoViewSet.estatisticas).
+
+    Dois tipos de linha, ambos chaveados por (empresa, ano, mes, origem, bucket):
+    - tecnico NULO: contagem de chamados/OS abertos no mês por bucket de status
+      e cliente (cards e lista de clientes atendidos);
+    - tecnico preenchido: chamados/OS FINALIZADOS no mês por técnico (ranking).
+
+    Recalculado por fatia (empresa, mês) em chamados.services.recalcular_resumo_operacional,
+    disparado pelos saves de Chamado/OrdemServico (chamados/signals.py).
+    """
+    class Origem(models.TextChoices):
+        CHAMADO = 'CHAMADO', 'Chamado'
+        OS = 'OS', 'Ordem de Serviço'
+
+    class Bucket(models.TextChoices):
+        ABERTO = 'ABERTO', 'Aberto'
+        ANDAMENTO = 'ANDAMENTO', 'Em Andamento'
+        FINALIZADO = 'FINALIZADO', 'Finalizado'
+        OUTRO = 'OUTRO', 'Outro'
+
+    empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    ano = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    origem = models.CharField(max_length=10, choices=Origem.choices)
+    bucket = models.CharField(max_length=20, choices=Bucket.choices)
+    tecnico = models.ForeignKey('equipe.Equipe', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    cliente = models.ForeignKey('clientes.Cliente', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    quantidade = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'TB_RESUMO_OPERACIONAL_MENSAL'
+        verbose_name = 'Resumo Operacional Mensal'
+        indexes = [
+            models.Index(fields=['ano', 'mes', 'empresa'], name='idx_resumo_op_mes'),
+        ]
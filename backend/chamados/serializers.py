@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from utils.imagens import VariantesImagemField
 from django.db import transaction
 from .models import Chamado, ChamadoTecnico, AssuntoChamado, ComentarioChamado, ResolucaoAssunto
 from clientes.models import Cliente, ContatoCliente
@@ -8,14 +9,21 @@ from core.models import Empresa
 
 
 class ChamadoRelacionadoSerializer(serializers.ModelSerializer):
-    cliente_nome = serializers.CharField(source='cliente.nome_fantasia', read_only=True)
+    cliente_nome = serializers.SerializerMethodField()
     resolucao_assunto = serializers.SerializerMethodField()
 
     class Meta:
         model = Chamado
         fields = ['id', 'protocolo', 'resolucao', 'resolucao_assunto', 'created_at', 'cliente_nome']
 
+    def get_cliente_nome(self, obj):
+        return obj.cliente.nome or obj.cliente.razao_social
+
     def get_resolucao_assunto(self, obj):
+        # Já vem anotado pela query de janela (services._consultar_historico_assuntos)
+        if hasattr(obj, 'resolucao_assunto_texto'):
+            return obj.resolucao_assunto_texto or None
+
         # We will pass 'assunto_id' in the serializer context from the view
         assunto_id = self.context.get('assunto_id')
         if assunto_id:
@@ -88,6 +96,8 @@ class ChamadoSerializer(serializers.ModelSerializer):
     solicitante_telefone = serializers.CharField(source='solicitante.telefone', read_only=True)
     titulo = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
     resolucoes_assuntos = ResolucaoAssuntoSerializer(many=True, read_only=True)
+    foto_antes_variantes = VariantesImagemField('foto_antes')
+    foto_depois_variantes = VariantesImagemField('foto_depois')
 
 
 
@@ -112,6 +122,7 @@ class ChamadoSerializer(serializers.ModelSerializer):
             'custo_transporte', 'protocolo', 'data_abertura',
             'data_fechamento', 'tecnicos', 'tecnicos_nomes',
             'resolucao', 'resolucoes_assuntos', 'valor_servico',
+            'foto_antes_variantes', 'foto_depois_variantes',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['protocolo', 'custo_transporte', 'created_at', 'updated_at', 'tecnicos_nomes', 'nome_tecnico', 'assuntos_detalhes']
@@ -151,8 +162,10 @@ class ChamadoSerializer(serializers.ModelSerializer):
         if instance.tecnico:
             representation['tecnico'] = { "id": instance.tecnico.id, "nome": instance.tecnico.nome }
 
-        if instance.tecnicos.exists():
-            representation['tecnicos'] = [ {"id": t.id, "nome": t.nome} for t in instance.tecnicos.all() ]
+        # .all() reaproveita o prefetch da view; .exists() iria ao banco de novo
+        tecnicos = list(instance.tecnicos.all())
+        if tecnicos:
+            representation['tecnicos'] = [ {"id": t.id, "nome": t.nome} for t in tecnicos ]
 
         if instance.solicitante:
             representation['solicitante'] = {
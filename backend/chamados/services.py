@@ -1,15 +1,116 @@
 import json
-from django.db import transaction
+import datetime
+import logging
+from django.db import transaction, connections
 from django.utils import timezone
 from django.apps import apps
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from decimal import Decimal
+from django.db.models import Q, F, Count, Sum, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.core.cache import cache
+from utils.armazenamento import compartilhar_arquivo
+
+logger = logging.getLogger(__name__)
+
+
+def _maior_sequencia_do_dia(prefixo):
+    """Semente do contador: maior sufixo já usado no dia (protocolos legados)."""
+    Chamado = apps.get_model('chamados', 'Chamado')
+    maior = 0
+    for protocolo in Chamado.objects.filter(protocolo__startswith=prefixo).values_list('protocolo', flat=True):
+        sufixo = protocolo[len(prefixo):]
+        if sufixo.isdigit():
+            maior = max(maior, int(sufixo))
+    return maior
+
+
+def alocar_protocolos(quantidade=1, data=None):
+    """
+    Reserva `quantidade` protocolos consecutivos do dia (formato AAAAMMDD + sequência).
+
+    O contador fica em TB_SEQUENCIA_PROTOCOLO e é incrementado com um único
+    UPDATE ... SET ultimo_numero = ultimo_numero + N, que trava apenas a linha
+    do dia: workers paralelos recebem faixas distintas, sem colisão no unique.
+    Importações em lote pedem um bloco inteiro de uma vez.
+    A sequência tem no mínimo 3 dígitos e cresce além de 999 se necessário.
+    """
+    SequenciaProtocolo = apps.get_model('chamados', 'SequenciaProtocolo')
+
+    if quantidade < 1:
+        raise ValueError("A quantidade de protocolos deve ser positiva.")
+
+    data = data or timezone.now().date()
+    prefixo = data.strftime('%Y%m%d')
+
+    with transaction.atomic():
+        if not SequenciaProtocolo.objects.filter(data=data).exists():
+            # get_or_create trata a corrida de dois workers criando a linha do dia
+            SequenciaProtocolo.objects.get_or_create(
+                data=data, defaults={'ultimo_numero': _maior_sequencia_do_dia(prefixo)}
+            )
+        SequenciaProtocolo.objects.filter(data=data).update(ultimo_numero=F('ultimo_numero') + quantidade)
+        ultimo = SequenciaProtocolo.objects.filter(data=data).values_list('ultimo_numero', flat=True).get()
+
+    primeiro = ultimo - quantidade + 1
+    return [f"{prefixo}{numero:03d}" for numero in range(primeiro, ultimo + 1)]
+
+
+def filtrar_chamados_por_busca(queryset, termo):
+    """
+    Busca por protocolo/título/cliente usando o documento_busca normalizado.
+    - Cada palavra do termo precisa aparecer no documento (sem acentos, LIKE
+      atendido pelo índice pg_trgm no PostgreSQL).
+    - No PostgreSQL também aceita casamento por full-text ('portuguese'), e o
+      resultado é ordenado por relevância (ts_rank + similaridade trigram).
+    - Em outros bancos (SQLite dos testes) fica só o filtro, na ordem padrão.
+    """
+    Chamado = apps.get_model('chamados', 'Chamado')
+    from chamados.models import normalizar_busca
+
+    termo_normalizado = normalizar_busca(termo)
+    if not termo_normalizado:
+        return queryset
+
+    filtro_palavras = Q()
+    for palavra in termo_normalizado.split():
+        filtro_palavras &= Q(documento_busca__contains=palavra)
+
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(filtro_palavras)
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+
+    vetor = SearchVector('documento_busca', config='portuguese')
+    consulta = SearchQuery(termo_normalizado, config='portuguese', search_type='websearch')
+    return queryset.annotate(
+        busca_vetor=vetor,
+        relevancia=SearchRank(vetor, consulta) + TrigramWordSimilarity(termo_normalizado, 'documento_busca'),
+    ).filter(
+        filtro_palavras | Q(busca_vetor=consulta)
+    ).order_by('-relevancia', *Chamado._meta.ordering)
+
+
+def _ids_do_payload(dados, campo):
+    """Lista de ids vinda de JSON (lista) ou de FormData (QueryDict com valores repetidos)."""
+    valores = dados.getlist(campo) if hasattr(dados, 'getlist') else dados.get(campo, [])
+    if valores is None:
+        return []
+    if not isinstance(valores, (list, tuple)):
+        valores = [valores]
+    return [int(v) for v in valores if str(v).isdigit()]
+
 
 @transaction.atomic
 def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquivos=None):
+    """
+    Atualiza o chamado com escrita em lote: uma leitura de Equipe para todos os
+    técnicos citados, bulk_create dos vínculos, upsert das resoluções por assunto
+    e save() só dos campos que realmente mudaram.
+    """
     Chamado = apps.get_model('chamados', 'Chamado')
     ChamadoTecnico = apps.get_model('chamados', 'ChamadoTecnico') # <--- Necessário para tabela intermediária
+    ResolucaoAssunto = apps.get_model('chamados', 'ResolucaoAssunto')
     LancamentoFinanceiro = apps.get_model('financeiro', 'LancamentoFinanceiro')
     Equipe = apps.get_model('equipe', 'Equipe')
 
@@ -40,8 +141,7 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
     if chamado.status == 'FINALIZADO':
         if 'assuntos' in dados_atualizacao:
             # 1. Update the M2M relationship first
-            assuntos_ids = [int(aid) for aid in dados_atualizacao.get('assuntos', []) if str(aid).isdigit()]
-            chamado.assuntos.set(assuntos_ids)
+            chamado.assuntos.set(_ids_do_payload(dados_atualizacao, 'assuntos'))
 
             novo_titulo = dados_atualizacao.get('titulo', '').strip()
 
@@ -59,34 +159,59 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
             return Decimal(str(valor).replace(',', '.'))
         except: return Decimal('0.00')
 
+    # Campos alterados nesta chamada: vão para save(update_fields=...)
+    alterados = set()
+
+    def definir(campo, valor):
+        if getattr(chamado, campo) != valor:
+            setattr(chamado, campo, valor)
+            alterados.add(campo)
+
     # 1. SALVAR ARQUIVOS
     if arquivos:
         for campo in ['arquivo_conclusao', 'arquivo_1', 'arquivo_2', 'foto_antes', 'foto_depois']:
             if campo in arquivos:
                 setattr(chamado, campo, arquivos[campo])
+                alterados.add(campo)
 
     # 2. ATUALIZAR CAMPOS GERAIS (TEXTO)
     campos_texto = ['titulo', 'descricao_detalhada', 'prioridade', 'resolucao']
     for campo in campos_texto:
         if campo in dados_atualizacao:
-            setattr(chamado, campo, dados_atualizacao[campo])
-    
+            definir(campo, dados_atualizacao[campo])
+
+    # Técnicos citados no payload (equipe + responsável): UMA query em Equipe
+    novos_ids = set(_ids_do_payload(dados_atualizacao, 'tecnicos')) if 'tecnicos' in dados_atualizacao else None
+    tecnico_id = dados_atualizacao.get('tecnico') if 'tecnico' in dados_atualizacao else None
+    tecnico_id = int(tecnico_id) if str(tecnico_id or '').isdigit() else None
+    equipe = Equipe.objects.in_bulk((novos_ids or set()) | ({tecnico_id} if tecnico_id else set()))
+
+    # 3.1 ATUALIZAR TÉCNICO RESPONSÁVEL (FK)
+    if 'tecnico' in dados_atualizacao:
+        responsavel = equipe.get(tecnico_id)
+        # Compara pelo id para não carregar o técnico atual
+        if chamado.tecnico_id != (responsavel.id if responsavel else None):
+            chamado.tecnico = responsavel
+            alterados.add('tecnico')
+
     # 3. ATUALIZAR TÉCNICOS (CORREÇÃO CRÍTICA)
-    # Abordagem não-destrutiva para sincronizar a equipe técnica
-    if 'tecnicos' in dados_atualizacao:
-        novos_ids_str = dados_atualizacao.get('tecnicos', [])
-        novos_ids = {int(tid) for tid in novos_ids_str if tid}
-        
-        atuais_ids = {tec.id for tec in chamado.tecnicos.all()}
-        
+    # Abordagem não-destrutiva para sincronizar a equipe técnica.
+    # O responsável entra no conjunto para o vínculo dele não ser removido
+    # (o save() só recria o vínculo quando o responsável muda).
+    if novos_ids is not None:
+        novos_ids = {tid for tid in novos_ids if tid in equipe}
+        if chamado.tecnico_id:
+            novos_ids.add(chamado.tecnico_id)
+
+        atuais_ids = set(ChamadoTecnico.objects.filter(chamado=chamado).values_list('tecnico_id', flat=True))
+
         # Adicionar novos técnicos
         ids_para_adicionar = novos_ids - atuais_ids
-        for tec_id in ids_para_adicionar:
-            try:
-                tecnico_obj = Equipe.objects.get(pk=tec_id)
-                ChamadoTecnico.objects.create(chamado=chamado, tecnico=tecnico_obj)
-            except Equipe.DoesNotExist:
-                continue
+        if ids_para_adicionar:
+            ChamadoTecnico.objects.bulk_create(
+                [ChamadoTecnico(chamado=chamado, tecnico_id=tid) for tid in ids_para_adicionar],
+                ignore_conflicts=True,
+            )
 
         # Remover técnicos que não estão mais na lista
         ids_para_remover = atuais_ids - novos_ids
@@ -96,31 +221,18 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
     # ATUALIZAR ASSUNTOS (M2M)
     if 'assuntos' in dados_atualizacao:
         # 1. Update the M2M relationship first
-        assuntos_ids = [int(aid) for aid in dados_atualizacao.get('assuntos', []) if str(aid).isdigit()]
-        chamado.assuntos.set(assuntos_ids)
+        chamado.assuntos.set(_ids_do_payload(dados_atualizacao, 'assuntos'))
 
         novo_titulo = dados_atualizacao.get('titulo', '').strip()
 
         # 3. If a new title is provided, update it. Do not auto-generate.
         if novo_titulo:
-            chamado.titulo = novo_titulo
-
-    # 3.1 ATUALIZAR TÉCNICO RESPONSÁVEL (FK)
-    if 'tecnico' in dados_atualizacao:
-        tecnico_id = dados_atualizacao.get('tecnico')
-        if tecnico_id:
-            try:
-                tecnico_responsavel = Equipe.objects.get(pk=tecnico_id)
-                chamado.tecnico = tecnico_responsavel
-            except Equipe.DoesNotExist:
-                chamado.tecnico = None
-        else:
-            chamado.tecnico = None
+            definir('titulo', novo_titulo)
 
     # 4. ATUALIZAR CUSTOS
-    chamado.custo_ida = safe_decimal(dados_atualizacao.get('custo_ida', chamado.custo_ida))
-    chamado.custo_volta = safe_decimal(dados_atualizacao.get('custo_volta', chamado.custo_volta))
-    chamado.valor_servico = safe_decimal(dados_atualizacao.get('valor_servico', chamado.valor_servico))
+    definir('custo_ida', safe_decimal(dados_atualizacao.get('custo_ida', chamado.custo_ida)))
+    definir('custo_volta', safe_decimal(dados_atualizacao.get('custo_volta', chamado.custo_volta)))
+    definir('valor_servico', safe_decimal(dados_atualizacao.get('valor_servico', chamado.valor_servico)))
 
 
     novo_status = dados_atualizacao.get('status')
@@ -130,25 +242,33 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
         if not chamado.resolucao and not dados_atualizacao.get('resolucao') and not resolucoes_data:
              raise ValidationError("A resolução técnica (geral ou por assunto) é obrigatória para finalizar.")
 
-        chamado.status = 'FINALIZADO'
-        chamado.data_fechamento = timezone.now()
-        chamado.custo_transporte = chamado.custo_ida + chamado.custo_volta
+        definir('status', 'FINALIZADO')
+        definir('data_fechamento', timezone.now())
 
         if resolucoes_data:
-            ResolucaoAssunto = apps.get_model('chamados', 'ResolucaoAssunto')
-            for res in resolucoes_data:
-                if 'assunto_id' in res and 'texto_resolucao' in res:
-                    ResolucaoAssunto.objects.update_or_create(
-                        chamado=chamado,
-                        assunto_id=res['assunto_id'],
-                        defaults={'texto_resolucao': res['texto_resolucao']}
-                    )
+            # Upsert em lote: INSERT ... ON CONFLICT (chamado, assunto) DO UPDATE
+            resolucoes = {
+                int(res['assunto_id']): res['texto_resolucao']
+                for res in resolucoes_data
+                if 'assunto_id' in res and 'texto_resolucao' in res
+            }
+            ResolucaoAssunto.objects.bulk_create(
+                [
+                    ResolucaoAssunto(chamado=chamado, assunto_id=assunto_id, texto_resolucao=texto)
+                    for assunto_id, texto in resolucoes.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['chamado', 'assunto'],
+                update_fields=['texto_resolucao', 'updated_at'],
+            )
+
+        custo_transporte = chamado.custo_ida + chamado.custo_volta
 
         # A. REGRA FINANCEIRO (RECEITA - AVULSO)
         eh_avulso = getattr(chamado.cliente, 'tipo_cliente', 'AVULSO') == 'AVULSO'
         
         if eh_avulso and chamado.valor_servico > 0 and not chamado.financeiro_gerado:
-            lancamento_entrada = LancamentoFinanceiro.objects.create(
+            LancamentoFinanceiro.objects.create(
                 empresa=chamado.empresa, # <--- Vinculando à empresa do Core
                 cliente=chamado.cliente,
                 tecnico=getattr(usuario_responsavel, 'equipe', None) if hasattr(usuario_responsavel, 'equipe') else None,
@@ -158,32 +278,22 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
                 categoria='SERVICO',
                 status='PENDENTE',
                 data_vencimento=timezone.now().date(),
-                forma_pagamento='PIX'
+                forma_pagamento='PIX',
+                # Comprovante/laudo compartilhado com o financeiro: mesmo blob, sem copiar bytes
+                comprovante=compartilhar_arquivo(chamado.arquivo_conclusao),
             )
-
-            # Clonar comprovante/laudo para o financeiro
-            if chamado.arquivo_conclusao:
-                try:
-                    nome_arquivo = chamado.arquivo_conclusao.name.split('/')[-1]
-                    lancamento_entrada.comprovante.save(
-                        f"comp_{nome_arquivo}",
-                        ContentFile(chamado.arquivo_conclusao.read()),
-                        save=True
-                    )
-                except Exception:
-                    pass # Se falhar ao copiar arquivo, não trava a finalização
             
-            chamado.financeiro_gerado = True
+            definir('financeiro_gerado', True)
 
         # B. REGRA DE CUSTOS (DESPESA - REEMBOLSO TRANSPORTE)
-        if chamado.custo_transporte > 0:
+        if custo_transporte > 0:
             descricao_transporte = f"Reembolso Transporte - OS #{chamado.protocolo}"
             
             LancamentoFinanceiro.objects.update_or_create(
                 descricao=descricao_transporte,
                 defaults={
                     'empresa': chamado.empresa, # <--- Vinculando à empresa do Core
-                    'valor': chamado.custo_transporte,
+                    'valor': custo_transporte,
                     'tipo_lancamento': 'SAIDA',
                     'status': 'PENDENTE',
                     'data_vencimento': timezone.now().date(),
@@ -194,7 +304,254 @@ def atualizar_chamado(chamado_id, dados_atualizacao, usuario_responsavel, arquiv
             )
 
     elif novo_status:
-        chamado.status = novo_status
+        definir('status', novo_status)
+
+    if alterados:
+        if alterados & {'custo_ida', 'custo_volta'}:
+            alterados.add('custo_transporte')  # recalculado no save()
+        chamado.save(update_fields=alterados | {'updated_at'})
+    return chamado
+
+# =====================================================
+# ROLLUP DO DASHBOARD OPERACIONAL
+# =====================================================
+
+BUCKETS_CHAMADO = {
+    'ABERTO': 'ABERTO',
+    'EM_ANDAMENTO': 'ANDAMENTO',
+    'AGENDADO': 'ANDAMENTO',
+    'FINALIZADO': 'FINALIZADO',
+}
 
-    chamado.save()
-    return chamado
\ No newline at end of file
+BUCKETS_OS = {
+    'ORCAMENTO': 'ABERTO',
+    'APROVADO': 'ANDAMENTO',
+    'EM_EXECUCAO': 'ANDAMENTO',
+    'AGUARDANDO_PECA': 'ANDAMENTO',
+    'FINALIZADO': 'FINALIZADO',
+}
+
+
+def intervalo_mes(ano, mes):
+    """[primeiro instante do mês, primeiro instante do mês seguinte) no fuso local."""
+    inicio = timezone.make_aware(datetime.datetime(ano, mes, 1))
+    if mes == 12:
+        fim = timezone.make_aware(datetime.datetime(ano + 1, 1, 1))
+    else:
+        fim = timezone.make_aware(datetime.datetime(ano, mes + 1, 1))
+    return inicio, fim
+
+
+def mes_local(data_hora):
+    if not data_hora:
+        return None
+    if timezone.is_aware(data_hora):
+        data_hora = timezone.localtime(data_hora)
+    return data_hora.year, data_hora.month
+
+
+def _travar_fatia_resumo(empresa_id, ano, mes):
+    # Serializa recálculos concorrentes da mesma fatia (delete + insert).
+    connection = connections['default']
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [(empresa_id or 0) * 1000000 + ano * 100 + mes])
+
+
+@transaction.atomic
+def recalcular_resumo_operacional(empresa_id, ano, mes):
+    """
+    Reconstrói as linhas de TB_RESUMO_OPERACIONAL_MENSAL de uma fatia (empresa, ano, mês).
+    Custa algumas queries agrupadas sobre os chamados/OS daquele mês e daquela
+    empresa, em vez de o dashboard varrer as tabelas a cada acesso.
+    A trava vem antes das leituras: um recálculo mais lento não regrava a fatia
+    com contagens anteriores ao commit que disparou o recálculo seguinte.
+    """
+    Chamado = apps.get_model('chamados', 'Chamado')
+    ChamadoTecnico = apps.get_model('chamados', 'ChamadoTecnico')
+    OrdemServico = apps.get_model('servicos', 'OrdemServico')
+    Resumo = apps.get_model('chamados', 'ResumoOperacionalMensal')
+
+    _travar_fatia_resumo(empresa_id, ano, mes)
+
+    inicio, fim = intervalo_mes(ano, mes)
+    if empresa_id:
+        filtro_empresa = {'empresa_id': empresa_id}
+    else:
+        filtro_empresa = {'empresa__isnull': True}
+
+    contagens = {}
+
+    def somar(origem, bucket, quantidade, tecnico_id=None, cliente_id=None):
+        chave = (origem, bucket, tecnico_id, cliente_id)
+        contagens[chave] = contagens.get(chave, 0) + quantidade
+
+    # 1. Cards e clientes: abertos no mês, por status e cliente
+    chamados_mes = Chamado.objects.filter(
+        data_abertura__gte=inicio, data_abertura__lt=fim, **filtro_empresa
+    ).values('status', 'cliente_id').annotate(qtd=Count('id')).order_by()
+    for linha in chamados_mes:
+        somar('CHAMADO', BUCKETS_CHAMADO.get(linha['status'], 'OUTRO'), linha['qtd'], cliente_id=linha['cliente_id'])
+
+    os_mes = OrdemServico.objects.filter(
+        data_entrada__gte=inicio, data_entrada__lt=fim, **filtro_empresa
+    ).values('status', 'cliente_id').annotate(qtd=Count('id')).order_by()
+    for linha in os_mes:
+        somar('OS', BUCKETS_OS.get(linha['status'], 'OUTRO'), linha['qtd'], cliente_id=linha['cliente_id'])
+
+    # 2. Ranking: finalizados no mês, por técnico participante
+    ranking_chamados = ChamadoTecnico.objects.filter(
+        chamado__status='FINALIZADO',
+        chamado__data_fechamento__gte=inicio, chamado__data_fechamento__lt=fim,
+        **{f'chamado__{k}': v for k, v in filtro_empresa.items()}
+    ).values('tecnico_id').annotate(qtd=Count('chamado_id', distinct=True)).order_by()
+    for linha in ranking_chamados:
+        somar('CHAMADO', 'FINALIZADO', linha['qtd'], tecnico_id=linha['tecnico_id'])
+
+    TecnicosOS = OrdemServico.tecnicos.through
+    ranking_os = TecnicosOS.objects.filter(
+        ordemservico__status='FINALIZADO',
+        ordemservico__data_finalizacao__gte=inicio, ordemservico__data_finalizacao__lt=fim,
+        **{f'ordemservico__{k}': v for k, v in filtro_empresa.items()}
+    ).values('equipe_id').annotate(qtd=Count('ordemservico_id', distinct=True)).order_by()
+    for linha in ranking_os:
+        somar('OS', 'FINALIZADO', linha['qtd'], tecnico_id=linha['equipe_id'])
+
+    Resumo.objects.filter(ano=ano, mes=mes, **filtro_empresa).delete()
+    Resumo.objects.bulk_create([
+        Resumo(
+            empresa_id=empresa_id, ano=ano, mes=mes,
+            origem=origem, bucket=bucket, tecnico_id=tecnico_id, cliente_id=cliente_id,
+            quantidade=quantidade,
+        )
+        for (origem, bucket, tecnico_id, cliente_id), quantidade in contagens.items()
+    ])
+
+
+def montar_estatisticas_operacionais(ano, mes, empresa_id=None):
+    """Cards, ranking de técnicos e clientes atendidos lidos do rollup mensal."""
+    Resumo = apps.get_model('chamados', 'ResumoOperacionalMensal')
+
+    resumo = Resumo.objects.filter(ano=ano, mes=mes)
+    if empresa_id:
+        resumo = resumo.filter(empresa_id=empresa_id)
+
+    cards = {'total': 0, 'ABERTO': 0, 'ANDAMENTO': 0, 'FINALIZADO': 0, 'OUTRO': 0}
+    for linha in resumo.filter(tecnico__isnull=True).values('bucket').annotate(qtd=Sum('quantidade')).order_by():
+        cards[linha['bucket']] += linha['qtd']
+        cards['total'] += linha['qtd']
+
+    ranking = {}
+    linhas_ranking = resumo.filter(tecnico__isnull=False).values(
+        'tecnico_id', 'tecnico__nome', 'origem'
+    ).annotate(qtd=Sum('quantidade')).order_by()
+    for linha in linhas_ranking:
+        item = ranking.setdefault(linha['tecnico_id'], {
+            "nome": linha['tecnico__nome'], "chamados_count": 0, "servicos_count": 0, "total_geral": 0
+        })
+        item['chamados_count' if linha['origem'] == 'CHAMADO' else 'servicos_count'] += linha['qtd']
+        item['total_geral'] += linha['qtd']
+    ranking_tecnicos = sorted(
+        (item for item in ranking.values() if item['total_geral'] > 0),
+        key=lambda item: -item['total_geral']
+    )[:5]
+
+    nomes_clientes = resumo.filter(
+        tecnico__isnull=True, cliente__isnull=False
+    ).values_list('cliente__nome', 'cliente__razao_social').distinct()
+    lista_empresas = sorted({n if n else r for n, r in nomes_clientes if n or r})
+
+    return {
+        "total": cards['total'],
+        "abertos": cards['ABERTO'],
+        "emAndamento": cards['ANDAMENTO'],
+        "finalizados": cards['FINALIZADO'],
+        "empresas": lista_empresas,
+        "ranking_tecnicos": ranking_tecnicos,
+    }
+
+
+# =====================================================
+# HISTÓRICO DE RESOLUÇÕES POR ASSUNTO (chamados/relacionados)
+# =====================================================
+
+LIMITE_HISTORICO_ASSUNTO = 5
+CACHE_HISTORICO_ASSUNTO = 'chamados:historico_assunto:{}'
+CACHE_HISTORICO_TIMEOUT = 60 * 60  # rede de segurança; a invalidação é feita pelos signals
+
+
+def _consultar_historico_assuntos(assunto_ids, limite):
+    """
+    Top-N chamados finalizados de cada assunto em UMA query:
+    ROW_NUMBER() OVER (PARTITION BY assunto ORDER BY data_fechamento DESC)
+    sobre a tabela M2M, com o cliente (JOIN) e a ResolucaoAssunto do par
+    (chamado, assunto) (subquery correlacionada) na mesma consulta.
+    """
+    Chamado = apps.get_model('chamados', 'Chamado')
+    ResolucaoAssunto = apps.get_model('chamados', 'ResolucaoAssunto')
+    ChamadoAssunto = Chamado.assuntos.through
+
+    resolucao = ResolucaoAssunto.objects.filter(
+        chamado_id=OuterRef('chamado_id'), assunto_id=OuterRef('assuntochamado_id')
+    ).values('texto_resolucao')[:1]
+
+    linhas = ChamadoAssunto.objects.filter(
+        assuntochamado_id__in=assunto_ids, chamado__status='FINALIZADO'
+    ).select_related('chamado__cliente').annotate(
+        posicao=Window(
+            RowNumber(),
+            partition_by=F('assuntochamado_id'),
+            order_by=[F('chamado__data_fechamento').desc(nulls_last=True), F('chamado_id').desc()],
+        ),
+        resolucao_assunto_texto=Subquery(resolucao),
+    ).filter(posicao__lte=limite).order_by('assuntochamado_id', 'posicao')
+
+    historico = {assunto_id: [] for assunto_id in assunto_ids}
+    for linha in linhas:
+        chamado = linha.chamado
+        chamado.resolucao_assunto_texto = linha.resolucao_assunto_texto
+        historico[linha.assuntochamado_id].append(chamado)
+    return historico
+
+
+def historico_resolucoes_por_assunto(assunto_ids, limite=LIMITE_HISTORICO_ASSUNTO):
+    """
+    Histórico serializado (ChamadoRelacionadoSerializer) por assunto, com cache
+    por assunto. Guarda limite + 1 itens para o chamado atual poder ser removido
+    da lista sem nova consulta. Invalidado por invalidar_historico_assuntos.
+    """
+    from .serializers import ChamadoRelacionadoSerializer
+
+    chaves = {assunto_id: CACHE_HISTORICO_ASSUNTO.format(assunto_id) for assunto_id in assunto_ids}
+    try:
+        em_cache = cache.get_many(list(chaves.values()))
+    except Exception as erro:
+        logger.warning(f"Cache do histórico por assunto indisponível: {erro}")
+        em_cache = {}
+    historico = {
+        assunto_id: em_cache[chave] for assunto_id, chave in chaves.items() if chave in em_cache
+    }
+
+    faltando = [assunto_id for assunto_id in assunto_ids if assunto_id not in historico]
+    if faltando:
+        novos = {}
+        for assunto_id, chamados in _consultar_historico_assuntos(faltando, limite + 1).items():
+            historico[assunto_id] = ChamadoRelacionadoSerializer(chamados, many=True).data
+            novos[chaves[assunto_id]] = historico[assunto_id]
+        try:
+            cache.set_many(novos, timeout=CACHE_HISTORICO_TIMEOUT)
+        except Exception as erro:
+            logger.warning(f"Cache do histórico por assunto não gravado: {erro}")
+
+    return historico
+
+
+def invalidar_historico_assuntos(assunto_ids):
+    if not assunto_ids:
+        return
+    try:
+        cache.delete_many([CACHE_HISTORICO_ASSUNTO.format(assunto_id) for assunto_id in assunto_ids])
+    except Exception as erro:
+        # Roda após o commit: não derruba a gravação; o TTL limita o dado velho
+        logger.warning(f"Cache do histórico por assunto não invalidado: {erro}")
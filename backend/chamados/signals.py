@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_init, pre_delete, m2m_changed
+from django.dispatch import receiver
+from clientes.models import Cliente
+from servicos.models import OrdemServico
+from .models import Chamado, ResolucaoAssunto
+from .services import mes_local, recalcular_resumo_operacional, invalidar_historico_assuntos
+
+
+# Campos do cliente que entram no documento de busca (Chamado.montar_documento_busca)
+CAMPOS_BUSCA_CLIENTE = ('nome', 'razao_social')
+
+
+def _estado_busca_cliente(instance):
+    # __dict__ para não disparar query em campos adiados (.only/.defer)
+    return {campo: instance.__dict__.get(campo) for campo in CAMPOS_BUSCA_CLIENTE}
+
+
+@receiver(post_init, sender=Cliente)
+def guardar_estado_busca_cliente(sender, instance, **kwargs):
+    instance._estado_busca = _estado_busca_cliente(instance)
+
+
+@receiver(post_save, sender=Cliente)
+def atualizar_documento_busca_cliente(sender, instance, created, **kwargs):
+    """Renomear o cliente precisa refletir no documento de busca dos chamados dele."""
+    antes = getattr(instance, '_estado_busca', None)
+    depois = _estado_busca_cliente(instance)
+    instance._estado_busca = depois
+    if created or antes == depois:
+        return
+
+    chamados = list(Chamado.objects.filter(cliente=instance).only('id', 'protocolo', 'titulo', 'cliente_id'))
+    for chamado in chamados:
+        chamado.documento_busca = chamado.montar_documento_busca(cliente=instance)
+    Chamado.objects.bulk_update(chamados, ['documento_busca'], batch_size=500)
+
+
+# =====================================================
+# ROLLUP DO DASHBOARD (ResumoOperacionalMensal)
+# =====================================================
+# Campos que mudam alguma linha do rollup, e os campos de data que definem o mês.
+CAMPOS_RESUMO = {
+    Chamado: ('empresa_id', 'cliente_id', 'status', 'tecnico_id', 'data_abertura', 'data_fechamento'),
+    OrdemServico: ('empresa_id', 'cliente_id', 'status', 'tecnico_responsavel_id', 'data_entrada', 'data_finalizacao'),
+}
+DATAS_RESUMO = {
+    Chamado: ('data_abertura', 'data_fechamento'),
+    OrdemServico: ('data_entrada', 'data_finalizacao'),
+}
+
+
+def _estado_resumo(instance):
+    # __dict__ para não disparar query em campos adiados (.only/.defer)
+    return {campo: instance.__dict__.get(campo) for campo in CAMPOS_RESUMO[type(instance)]}
+
+
+def _fatias(estado, campos_data):
+    fatias = set()
+    for campo in campos_data:
+        mes = mes_local(estado.get(campo))
+        if mes:
+            fatias.add((estado.get('empresa_id'), *mes))
+    return fatias
+
+
+def _agendar_recalculo(fatias):
+    def recalcular():
+        for empresa_id, ano, mes in fatias:
+            recalcular_resumo_operacional(empresa_id, ano, mes)
+    # Após o commit: M2M de técnicos e demais saves da mesma transação já estão gravados
+    transaction.on_commit(recalcular)
+
+
+@receiver(post_init, sender=Chamado)
+@receiver(post_init, sender=OrdemServico)
+def guardar_estado_resumo(sender, instance, **kwargs):
+    instance._estado_resumo = _estado_resumo(instance)
+
+
+@receiver(post_save, sender=Chamado)
+@receiver(post_save, sender=OrdemServico)
+def atualizar_resumo_operacional(sender, instance, created, **kwargs):
+    antes = getattr(instance, '_estado_resumo', {})
+    depois = _estado_resumo(instance)
+    instance._estado_resumo = depois
+
+    if not created and antes == depois:
+        return
+
+    campos_data = DATAS_RESUMO[sender]
+    _agendar_recalculo(_fatias(antes, campos_data) | _fatias(depois, campos_data))
+
+
+@receiver(post_delete, sender=Chamado)
+@receiver(post_delete, sender=OrdemServico)
+def remover_do_resumo_operacional(sender, instance, **kwargs):
+    _agendar_recalculo(_fatias(_estado_resumo(instance), DATAS_RESUMO[sender]))
+
+
+# =====================================================
+# CACHE DO HISTÓRICO POR ASSUNTO (chamados/relacionados)
+# =====================================================
+def _invalidar_historico(assunto_ids):
+    assunto_ids = set(assunto_ids)
+    if assunto_ids:
+        # Após o commit, para nenhuma leitura concorrente recolocar dados antigos no cache
+        transaction.on_commit(lambda: invalidar_historico_assuntos(assunto_ids))
+
+
+@receiver(post_init, sender=Chamado)
+def guardar_status_historico(sender, instance, **kwargs):
+    instance._status_historico = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Chamado)
+def invalidar_historico_chamado(sender, instance, created, **kwargs):
+    # Entrar, sair ou editar um chamado FINALIZADO muda o top-N dos assuntos dele
+    finalizado = 'FINALIZADO' in (instance.status, getattr(instance, '_status_historico', None))
+    instance._status_historico = instance.status
+    if finalizado and not created:
+        _invalidar_historico(instance.assuntos.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Chamado)
+def invalidar_historico_chamado_removido(sender, instance, **kwargs):
+    if instance.status == 'FINALIZADO':
+        _invalidar_historico(instance.assuntos.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Chamado.assuntos.through)
+def invalidar_historico_assuntos_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or instance.status != 'FINALIZADO':
+        return
+    if action in ('post_add', 'post_remove'):
+        _invalidar_historico(pk_set or ())
+    elif action == 'pre_clear':
+        _invalidar_historico(instance.assuntos.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=ResolucaoAssunto)
+@receiver(post_delete, sender=ResolucaoAssunto)
+def invalidar_historico_resolucao(sender, instance, **kwargs):
+    _invalidar_historico([instance.assunto_id])
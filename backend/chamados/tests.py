@@ -1,3 +1,443 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from clientes.models import Cliente, ContatoCliente
+from core.models import Empresa
+from equipe.models import Equipe
+from infra.models import Ativo
+from .models import Chamado, ComentarioChamado, AssuntoChamado, ChamadoTecnico, ResolucaoAssunto, SequenciaProtocolo, ResumoOperacionalMensal
+from .services import alocar_protocolos, atualizar_chamado
 
-# Create your tests here.
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+TEST_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ChamadoListQueryBudgetTest(APITestCase):
+    """Garante que a listagem de chamados não volta a ter N+1 queries."""
+
+    # count da paginação + select principal (com joins) + 4 prefetches
+    QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        cls.tecnico = Equipe.objects.create(usuario=user, nome='Test User', cargo='TECNICO')
+        cls.apoio = Equipe.objects.create(nome='Apoio', cargo='TECNICO')
+        cls.user = user
+        cls.empresa = Empresa.objects.create(razao_social='Empresa Teste', nome_fantasia='Empresa', cnpj='00000000000100')
+        cls.assunto_a = AssuntoChamado.objects.create(titulo='Rede')
+        cls.assunto_b = AssuntoChamado.objects.create(titulo='Impressora')
+
+        for i in range(30):
+            cliente = Cliente.objects.create(razao_social=f'Cliente {i}', nome=f'Cliente {i}')
+            chamado = Chamado.objects.create(
+                empresa=cls.empresa,
+                cliente=cliente,
+                ativo=Ativo.objects.create(cliente=cliente, nome=f'PC {i}', tipo='COMPUTADOR'),
+                tecnico=cls.tecnico,
+                solicitante=ContatoCliente.objects.create(cliente=cliente, nome=f'Contato {i}'),
+                descricao_detalhada='Teste',
+            )
+            chamado.assuntos.set([cls.assunto_a, cls.assunto_b])
+            ChamadoTecnico.objects.create(chamado=chamado, tecnico=cls.apoio)
+            ResolucaoAssunto.objects.create(chamado=chamado, assunto=cls.assunto_a, texto_resolucao='Ok')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def _queries_da_listagem(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/chamados/?page_size={page_size}', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_listagem_respeita_orcamento_de_queries(self):
+        self.assertLessEqual(self._queries_da_listagem(page_size=10), self.QUERY_BUDGET)
+
+    def test_queries_nao_crescem_com_tamanho_da_pagina(self):
+        self.assertEqual(self._queries_da_listagem(page_size=5), self._queries_da_listagem(page_size=30))
+
+    def test_listagem_mantem_formato_dos_relacionados(self):
+        response = self.client.get('/api/chamados/?page_size=1', format='json')
+        item = response.data['results'][0]
+        self.assertEqual(item['tecnico']['nome'], 'Test User')
+        self.assertEqual({t['nome'] for t in item['tecnicos']}, {'Test User', 'Apoio'})
+        self.assertEqual({a['titulo'] for a in item['assuntos_detalhes']}, {'Rede', 'Impressora'})
+        self.assertEqual(item['resolucoes_assuntos'][0]['assunto_titulo'], 'Rede')
+        self.assertEqual(item['empresa_nome'], 'Empresa')
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ChamadoCursorPaginationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        Equipe.objects.create(usuario=cls.user, nome='Test User', cargo='TECNICO')
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente Teste')
+        cls.chamados = [
+            Chamado.objects.create(cliente=cliente, descricao_detalhada=f'Chamado {i}') for i in range(7)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        url = '/api/chamados/?paginacao=cursor&page_size=3'
+        vistos = []
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            vistos.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        esperado = [c.id for c in sorted(self.chamados, key=lambda c: (c.created_at, c.id), reverse=True)]
+        self.assertEqual(vistos, esperado)
+
+    def test_pagina_anterior_volta_para_os_mesmos_itens(self):
+        primeira = self.client.get('/api/chamados/?paginacao=cursor&page_size=3', format='json').data
+        segunda = self.client.get(primeira['next'], format='json').data
+        anterior = self.client.get(segunda['previous'], format='json').data
+        self.assertEqual([i['id'] for i in anterior['results']], [i['id'] for i in primeira['results']])
+
+    def test_total_aproximado_somente_quando_pedido(self):
+        response = self.client.get('/api/chamados/?paginacao=cursor&com_total=1', format='json')
+        self.assertEqual(response.data['count_aproximado'], 7)
+
+    def test_cursor_invalido_retorna_404(self):
+        response = self.client.get('/api/chamados/?cursor=invalido', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sem_opt_in_mantem_paginacao_por_pagina(self):
+        response = self.client.get('/api/chamados/', format='json')
+        self.assertEqual(response.data['count'], 7)
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ChamadoBuscaTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        Equipe.objects.create(usuario=cls.user, nome='Test User', cargo='TECNICO')
+        cls.cliente = Cliente.objects.create(razao_social='Padaria São João LTDA', nome='Padaria São João')
+        outro = Cliente.objects.create(razao_social='Mercado Central', nome='Mercado')
+        cls.chamado = Chamado.objects.create(cliente=cls.cliente, titulo='Manutenção da impressora', descricao_detalhada='x')
+        cls.outro = Chamado.objects.create(cliente=outro, titulo='Rede lenta', descricao_detalhada='x')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def _buscar(self, termo, param='busca'):
+        response = self.client.get('/api/chamados/', {param: termo}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_busca_ignora_acentos_e_maiusculas(self):
+        self.assertEqual(self._buscar('sao joao'), [self.chamado.id])
+        self.assertEqual(self._buscar('MANUTENÇÃO'), [self.chamado.id])
+
+    def test_busca_por_protocolo_e_parametro_search(self):
+        self.assertEqual(self._buscar(self.outro.protocolo, param='search'), [self.outro.id])
+
+    def test_busca_exige_todas_as_palavras(self):
+        self.assertEqual(self._buscar('padaria rede'), [])
+
+    def test_renomear_cliente_atualiza_documento(self):
+        self.cliente.nome = 'Confeitaria Estrela'
+        self.cliente.save()
+        self.assertEqual(self._buscar('estrela'), [self.chamado.id])
+
+    def test_editar_cliente_sem_mudar_nome_nao_reescreve_chamados(self):
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        cliente.ativo = False
+        with CaptureQueriesContext(connection) as ctx:
+            cliente.save()
+        self.assertFalse([q for q in ctx.captured_queries if '"TB_CHAMADO"' in q['sql']])
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class AlocacaoProtocoloTest(TestCase):
+    data = datetime.date(2026, 1, 15)
+
+    def test_bloco_consecutivo(self):
+        self.assertEqual(alocar_protocolos(3, data=self.data), ['20260115001', '20260115002', '20260115003'])
+        self.assertEqual(alocar_protocolos(1, data=self.data), ['20260115004'])
+
+    def test_continua_apos_protocolos_existentes_do_dia(self):
+        cliente = Cliente.objects.create(razao_social='Cliente Teste')
+        Chamado.objects.create(cliente=cliente, protocolo='20260115041', descricao_detalhada='x')
+        self.assertEqual(alocar_protocolos(1, data=self.data), ['20260115042'])
+
+    def test_passa_de_999_por_dia(self):
+        SequenciaProtocolo.objects.create(data=self.data, ultimo_numero=999)
+        self.assertEqual(alocar_protocolos(1, data=self.data), ['202601151000'])
+
+    def test_save_usa_o_alocador(self):
+        cliente = Cliente.objects.create(razao_social='Cliente Teste')
+        primeiro = Chamado.objects.create(cliente=cliente, descricao_detalhada='x')
+        segundo = Chamado.objects.create(cliente=cliente, descricao_detalhada='x')
+        self.assertEqual(int(segundo.protocolo) - int(primeiro.protocolo), 1)
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ResumoOperacionalTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        cls.tecnico = Equipe.objects.create(usuario=cls.user, nome='Test User', cargo='TECNICO')
+        cls.cliente = Cliente.objects.create(razao_social='Padaria LTDA', nome='Padaria')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def _estatisticas(self):
+        response = self.client.get('/api/chamados/estatisticas/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _criar_chamados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Chamado.objects.create(cliente=self.cliente, status='ABERTO', descricao_detalhada='x')
+            Chamado.objects.create(cliente=self.cliente, status='AGENDADO', descricao_detalhada='x')
+            finalizado = Chamado.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao_detalhada='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            finalizado.status = 'FINALIZADO'
+            finalizado.data_fechamento = finalizado.data_abertura
+            finalizado.save()
+
+    def test_dashboard_le_o_rollup_atualizado_nos_saves(self):
+        self._criar_chamados()
+        dados = self._estatisticas()
+        self.assertEqual((dados['total'], dados['abertos'], dados['emAndamento'], dados['finalizados']), (3, 1, 1, 1))
+        self.assertEqual(dados['empresas'], ['Padaria'])
+        self.assertEqual(dados['ranking_tecnicos'], [
+            {'nome': 'Test User', 'chamados_count': 1, 'servicos_count': 0, 'total_geral': 1}
+        ])
+
+    def test_comando_de_reconstrucao_gera_o_mesmo_resultado(self):
+        self._criar_chamados()
+        esperado = self._estatisticas()
+        ResumoOperacionalMensal.objects.all().delete()
+        call_command('reconstruir_resumo_operacional', stdout=StringIO())
+        self.assertEqual(self._estatisticas(), esperado)
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ResumoOperacionalAutocommitTest(TransactionTestCase):
+    """Sem captureOnCommitCallbacks: em autocommit o on_commit do post_save roda na hora."""
+
+    def test_tecnico_atribuido_junto_com_a_finalizacao_entra_no_ranking(self):
+        tecnico = Equipe.objects.create(nome='Técnico', cargo='TECNICO')
+        chamado = Chamado.objects.create(cliente=Cliente.objects.create(razao_social='Cliente'), descricao_detalhada='x')
+
+        chamado.tecnico = tecnico
+        chamado.status = 'FINALIZADO'
+        chamado.data_fechamento = chamado.data_abertura
+        chamado.save()
+
+        self.assertTrue(ResumoOperacionalMensal.objects.filter(
+            tecnico=tecnico, bucket='FINALIZADO', quantidade=1,
+        ).exists())
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ChamadosRelacionadosTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        Equipe.objects.create(usuario=cls.user, nome='Test User', cargo='TECNICO')
+        cls.cliente = Cliente.objects.create(razao_social='Padaria LTDA', nome='Padaria')
+        cls.rede = AssuntoChamado.objects.create(titulo='Rede')
+        cls.impressora = AssuntoChamado.objects.create(titulo='Impressora')
+        cls.atual = Chamado.objects.create(cliente=cls.cliente, descricao_detalhada='x')
+        cls.atual.assuntos.set([cls.rede, cls.impressora])
+
+        inicio = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        cls.finalizados = []
+        for i in range(7):
+            chamado = Chamado.objects.create(
+                cliente=cls.cliente, status='FINALIZADO', resolucao=f'Geral {i}',
+                data_fechamento=inicio + datetime.timedelta(days=i), descricao_detalhada='x',
+            )
+            chamado.assuntos.set([cls.rede])
+            ResolucaoAssunto.objects.create(chamado=chamado, assunto=cls.rede, texto_resolucao=f'Rede {i}')
+            cls.finalizados.append(chamado)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def _relacionados(self):
+        response = self.client.get(f'/api/chamados/{self.atual.id}/relacionados/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['assunto_titulo']: item['historico'] for item in response.data}
+
+    def test_top_5_mais_recentes_por_assunto(self):
+        dados = self._relacionados()
+        esperado = [c.id for c in reversed(self.finalizados)][:5]
+        self.assertEqual([h['id'] for h in dados['Rede']], esperado)
+        self.assertEqual(dados['Rede'][0]['resolucao_assunto'], 'Rede 6')
+        self.assertEqual(dados['Rede'][0]['cliente_nome'], 'Padaria')
+        self.assertEqual(dados['Impressora'], [])
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_consulta_unica_e_cache_por_assunto(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as primeira:
+            self._relacionados()
+        with CaptureQueriesContext(connection) as segunda:
+            self._relacionados()
+        # chamado atual + assuntos (+ 1 query de janela para os dois assuntos na primeira)
+        self.assertEqual(len(primeira.captured_queries), len(segunda.captured_queries) + 1)
+
+    def test_finalizar_chamado_invalida_o_cache(self):
+        self._relacionados()
+        novo = Chamado.objects.create(cliente=self.cliente, descricao_detalhada='x')
+        novo.assuntos.set([self.rede])
+        with self.captureOnCommitCallbacks(execute=True):
+            novo.status = 'FINALIZADO'
+            novo.data_fechamento = datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc)
+            novo.save()
+        self.assertEqual(self._relacionados()['Rede'][0]['id'], novo.id)
+
+
+    def test_cache_fora_do_ar_nao_derruba_finalizacao_nem_relacionados(self):
+        fora_do_ar = mock.Mock(**{
+            f'{metodo}.side_effect': ConnectionError('redis indisponível')
+            for metodo in ('get_many', 'set_many', 'delete_many')
+        })
+        with mock.patch('chamados.services.cache', fora_do_ar):
+            with self.captureOnCommitCallbacks(execute=True):
+                ResolucaoAssunto.objects.create(chamado=self.atual, assunto=self.impressora, texto_resolucao='x')
+                self.atual.status = 'FINALIZADO'
+                self.atual.save()
+            dados = self._relacionados()  # consultado no banco
+        self.assertEqual(len(dados['Rede']), 5)
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class AtualizarChamadoEmLoteTest(TestCase):
+    # Constante, qualquer que seja o nº de técnicos/resoluções: chamado, equipe (1x),
+    # vínculos (leitura + bulk_create + remoção), assuntos, upsert das resoluções,
+    # UPDATE só dos campos alterados, signals de notificação e savepoints.
+    # Antes: ~34 queries para 3 técnicos e 2 resoluções.
+    QUERY_BUDGET = 22
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        cls.tecnicos = [Equipe.objects.create(nome=f'Técnico {i}', cargo='TECNICO') for i in range(4)]
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente', tipo_cliente='CONTRATO')
+        cls.rede = AssuntoChamado.objects.create(titulo='Rede')
+        cls.impressora = AssuntoChamado.objects.create(titulo='Impressora')
+        cls.chamado = Chamado.objects.create(cliente=cliente, tecnico=cls.tecnicos[3], descricao_detalhada='x')
+        ResolucaoAssunto.objects.create(chamado=cls.chamado, assunto=cls.rede, texto_resolucao='Antiga')
+
+    def _finalizar(self):
+        return atualizar_chamado(self.chamado.id, {
+            'tecnicos': [t.id for t in self.tecnicos[:3]],
+            'tecnico': self.tecnicos[0].id,
+            'assuntos': [self.rede.id, self.impressora.id],
+            'status': 'FINALIZADO',
+            'resolucoes_assuntos': [
+                {'assunto_id': self.rede.id, 'texto_resolucao': 'Cabo trocado'},
+                {'assunto_id': self.impressora.id, 'texto_resolucao': 'Driver atualizado'},
+            ],
+        }, usuario_responsavel=self.user)
+
+    def test_finalizacao_em_poucas_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._finalizar()
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+
+    def test_finalizacao_grava_vinculos_e_resolucoes(self):
+        self._finalizar()
+        chamado = Chamado.objects.get(pk=self.chamado.pk)
+        self.assertEqual(chamado.status, 'FINALIZADO')
+        self.assertEqual(chamado.tecnico_id, self.tecnicos[0].id)
+        self.assertIsNotNone(chamado.data_fechamento)
+        self.assertEqual(
+            set(ChamadoTecnico.objects.filter(chamado=chamado).values_list('tecnico_id', flat=True)),
+            {t.id for t in self.tecnicos[:3]},
+        )
+        self.assertEqual(
+            dict(ResolucaoAssunto.objects.filter(chamado=chamado).values_list('assunto__titulo', 'texto_resolucao')),
+            {'Rede': 'Cabo trocado', 'Impressora': 'Driver atualizado'},
+        )
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ComentariosIncrementaisTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        cls.autor = Equipe.objects.create(usuario=cls.user, nome='Test User', cargo='TECNICO')
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        cls.chamado = Chamado.objects.create(cliente=cliente, descricao_detalhada='x')
+        outros = [Equipe.objects.create(nome=f'Autor {i}', cargo='TECNICO') for i in range(5)]
+        cls.comentarios = [
+            ComentarioChamado.objects.create(chamado=cls.chamado, autor=outros[i % 5], texto=f'Comentário {i}')
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/chamados/{self.chamado.id}/comentarios/'
+
+    def test_pagina_e_busca_so_os_novos(self):
+        primeira = self.client.get(self.url, {'limite': 5})
+        self.assertEqual([c['texto'] for c in primeira.data], [f'Comentário {i}' for i in range(5)])
+        self.assertEqual(primeira['X-Tem-Mais'], 'true')
+
+        resto = self.client.get(self.url, {'since_id': primeira.data[-1]['id']})
+        self.assertEqual(len(resto.data), 7)
+        self.assertEqual(resto['X-Tem-Mais'], 'false')
+        self.assertEqual(resto.data[0]['autor_nome'], 'Autor 0')
+
+        vazio = self.client.get(self.url, {'since_id': resto.data[-1]['id']})
+        self.assertEqual(vazio.data, [])
+
+    def test_sem_parametros_devolve_tudo(self):
+        # Telas de detalhe atuais fazem um GET simples: nada pode ficar de fora
+        ComentarioChamado.objects.bulk_create([
+            ComentarioChamado(chamado=self.chamado, autor=self.autor, texto=f'Extra {i}') for i in range(60)
+        ])
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 72)
+        self.assertEqual(response.data[-1]['texto'], 'Extra 59')
+        self.assertEqual(response['X-Tem-Mais'], 'false')
+
+    def test_autores_sem_n_mais_1(self):
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(self.url, {'limite': 2})
+        with CaptureQueriesContext(connection) as muitos:
+            self.client.get(self.url, {'limite': 12})
+        self.assertEqual(len(poucos.captured_queries), len(muitos.captured_queries))
+
+    def test_parametro_invalido(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'ontem'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_novo_comentario_e_enviado_para_quem_esta_na_tela(self):
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'comentarios_chamado_{self.chamado.id}', canal)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'texto': 'Chegou a peça'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        evento = async_to_sync(layer.receive)(canal)
+        self.assertEqual(evento['type'], 'novo_comentario')
+        self.assertEqual(evento['comentario']['id'], response.data['id'])
+        self.assertEqual(evento['comentario']['autor_nome'], 'Test User')
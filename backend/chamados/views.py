@@ -4,24 +4,30 @@ from rest_framework.decorators import action
 from django.core.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count, Q
+from rest_framework.exceptions import APIException
 from django.utils import timezone
 from datetime import datetime
-import calendar
 import traceback
 
 # MODELOS E SERIALIZERS
 from .models import Chamado, AssuntoChamado, ComentarioChamado
-from .serializers import ChamadoSerializer, AssuntoChamadoSerializer, ChamadoRelacionadoSerializer, ComentarioChamadoSerializer
-from .services import atualizar_chamado
-from equipe.models import Equipe  # Importação corrigida
-from servicos.models import OrdemServico
+from .serializers import ChamadoSerializer, AssuntoChamadoSerializer, ComentarioChamadoSerializer
+from .services import (
+    atualizar_chamado, filtrar_chamados_por_busca, montar_estatisticas_operacionais, intervalo_mes,
+    historico_resolucoes_por_assunto, LIMITE_HISTORICO_ASSUNTO
+)
+from utils.pagination import KeysetPagination
+from utils.comentarios import feed_comentarios, publicar_comentario, grupo_comentarios
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class ChamadoPagination(KeysetPagination):
+    """Page-number por padrão; cursor (created_at, id) com ?paginacao=cursor."""
+    fallback_class = StandardResultsSetPagination
+
 class AssuntoChamadoViewSet(viewsets.ModelViewSet):
     queryset = AssuntoChamado.objects.filter(ativo=True)
     serializer_class = AssuntoChamadoSerializer
@@ -29,9 +35,17 @@ class AssuntoChamadoViewSet(viewsets.ModelViewSet):
 class ChamadoViewSet(viewsets.ModelViewSet):
     queryset = Chamado.objects.all().order_by('-created_at')
     serializer_class = ChamadoSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ChamadoPagination
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
+    # Tudo o que o ChamadoSerializer.to_representation lê de cada linha.
+    # Mantém a página inteira em um número fixo de queries (sem N+1).
+    RELACIONADOS_FK = ('cliente', 'ativo', 'tecnico', 'solicitante', 'empresa')
+    RELACIONADOS_M2M = ('assuntos', 'tecnicos', 'resolucoes_assuntos__assunto')
+
+    def _com_relacionados(self, queryset):
+        return queryset.select_related(*self.RELACIONADOS_FK).prefetch_related(*self.RELACIONADOS_M2M)
+
     def list(self, request, *args, **kwargs):
         try:
             queryset = self.filter_queryset(self.get_queryset())
@@ -42,6 +56,8 @@ class ChamadoViewSet(viewsets.ModelViewSet):
 
             serializer = self.get_serializer(queryset, many=True)
             return Response(serializer.data)
+        except APIException:
+            raise
         except Exception as e:
             traceback.print_exc()
             return Response(
@@ -54,26 +70,22 @@ class ChamadoViewSet(viewsets.ModelViewSet):
     def relacionados(self, request, pk=None):
         try:
             chamado_atual = self.get_object()
-            assuntos = chamado_atual.assuntos.all()
+            assuntos = list(chamado_atual.assuntos.all())
             
-            if not assuntos.exists():
+            if not assuntos:
                 return Response([], status=status.HTTP_200_OK)
 
+            # Top 5 finalizados de TODOS os assuntos em uma query de janela (com cache por assunto)
+            historico = historico_resolucoes_por_assunto([assunto.id for assunto in assuntos])
+
             resultado = []
             for assunto in assuntos:
-                # Top 5 finalized tickets for THIS specific subject
-                chamados = Chamado.objects.prefetch_related('resolucoes_assuntos').filter(
-                    assuntos=assunto,
-                    status='FINALIZADO'
-                ).exclude(
-                    id=chamado_atual.id
-                ).order_by('-data_fechamento')[:5]
-                
-                serializer = ChamadoRelacionadoSerializer(chamados, many=True, context={'assunto_id': assunto.id})
                 resultado.append({
                     "assunto_id": assunto.id,
                     "assunto_titulo": assunto.titulo,
-                    "historico": serializer.data
+                    "historico": [
+                        item for item in historico[assunto.id] if item['id'] != chamado_atual.id
+                    ][:LIMITE_HISTORICO_ASSUNTO]
                 })
 
             return Response(resultado, status=status.HTTP_200_OK)
@@ -88,7 +100,7 @@ class ChamadoViewSet(viewsets.ModelViewSet):
             )
 
     def get_queryset(self):
-        queryset = Chamado.objects.all().order_by('-created_at')
+        queryset = self._com_relacionados(Chamado.objects.all()).order_by('-created_at')
         
         empresa_id = self.request.query_params.get('empresa')
         if empresa_id:
@@ -105,12 +117,7 @@ class ChamadoViewSet(viewsets.ModelViewSet):
         termo_busca = self.request.query_params.get('busca') or self.request.query_params.get('search')
         
         if termo_busca:
-            queryset = queryset.filter(
-                Q(protocolo__icontains=termo_busca) |
-                Q(titulo__icontains=termo_busca) |
-                Q(cliente__nome__icontains=termo_busca) |
-                Q(cliente__razao_social__icontains=termo_busca)
-            )
+            queryset = filtrar_chamados_por_busca(queryset, termo_busca)
         # ------------------------------------------
 
         if data_inicio and data_fim:
@@ -145,98 +152,32 @@ class ChamadoViewSet(viewsets.ModelViewSet):
             hoje = timezone.now()
             ano, mes = hoje.year, hoje.month
 
-        ultimo_dia = calendar.monthrange(ano, mes)[1]
-        
         try:
-            # Definição do período
-            dt_ini_naive = datetime(ano, mes, 1, 0, 0, 0)
-            dt_fim_naive = datetime(ano, mes, ultimo_dia, 23, 59, 59)
-            data_inicio = timezone.make_aware(dt_ini_naive)
-            data_fim = timezone.make_aware(dt_fim_naive)
-            
-            # === UNIFIED STATS ===
-            
-            # Queryset base para CHAMADOS
-            qs_chamados_mes = Chamado.objects.filter(data_abertura__range=(data_inicio, data_fim))
-            if empresa_id:
-                qs_chamados_mes = qs_chamados_mes.filter(empresa_id=empresa_id)
+            # 1. Cards, ranking de técnicos e clientes: lidos do rollup mensal
+            # (TB_RESUMO_OPERACIONAL_MENSAL), sem varrer TB_CHAMADO/TB_ORDEM_SERVICO
+            resumo = montar_estatisticas_operacionais(ano, mes, empresa_id)
 
-            # Queryset base para SERVIÇOS
-            qs_os_mes = OrdemServico.objects.filter(data_entrada__range=(data_inicio, data_fim))
-            if empresa_id:
-                qs_os_mes = qs_os_mes.filter(empresa_id=empresa_id)
-            
-            # 1. Agregados para os Cards (CHAMADOS)
-            stats_chamados = qs_chamados_mes.aggregate(
-                total=Count('id', distinct=True),
-                abertos=Count('id', filter=Q(status='ABERTO'), distinct=True),
-                andamento=Count('id', filter=Q(status__in=['EM_ANDAMENTO', 'AGENDADO']), distinct=True),
-                finalizados=Count('id', filter=Q(status='FINALIZADO'), distinct=True)
-            )
-
-            # Agregados para os Cards (SERVIÇOS)
-            stats_os = qs_os_mes.aggregate(
-                total=Count('id', distinct=True),
-                abertos=Count('id', filter=Q(status='ORCAMENTO'), distinct=True),
-                andamento=Count('id', filter=Q(status__in=['APROVADO', 'EM_EXECUCAO', 'AGUARDANDO_PECA']), distinct=True),
-                finalizados=Count('id', filter=Q(status='FINALIZADO'), distinct=True)
-            )
-            
-            # Unificar os stats
-            total_unificado = stats_chamados['total'] + stats_os['total']
-            abertos_unificado = stats_chamados['abertos'] + stats_os['abertos']
-            andamento_unificado = stats_chamados['andamento'] + stats_os['andamento']
-            finalizados_unificado = stats_chamados['finalizados'] + stats_os['finalizados']
-            
             # 2. Listas Operacionais (mantendo apenas chamados por enquanto)
-            ultimos_pendentes = qs_chamados_mes.filter(status='ABERTO').order_by('-created_at')[:5]
-            em_andamento = qs_chamados_mes.filter(status__in=['EM_ANDAMENTO', 'AGENDADO']).order_by('data_agendamento')[:5]
-            ultimos_resolvidos = qs_chamados_mes.filter(status='FINALIZADO').order_by('-data_fechamento')[:5]
-
-            # 3. RANKING DE TÉCNICOS UNIFICADO
-            from django.db.models import F
-
-            chamado_finalizado_filter = Q(chamado__status='FINALIZADO', chamado__data_fechamento__range=(data_inicio, data_fim))
-            os_concluido_filter = Q(servicos_participante__status='FINALIZADO', servicos_participante__data_finalizacao__range=(data_inicio, data_fim))
-
+            data_inicio, data_fim = intervalo_mes(ano, mes)
+            qs_listas = self._com_relacionados(
+                Chamado.objects.filter(data_abertura__gte=data_inicio, data_abertura__lt=data_fim)
+            )
             if empresa_id:
-                chamado_finalizado_filter &= Q(chamado__empresa_id=empresa_id)
-                os_concluido_filter &= Q(servicos_participante__empresa_id=empresa_id)
-
-            ranking_raw = Equipe.objects.annotate(
-                chamados_count=Count('chamado', filter=chamado_finalizado_filter, distinct=True),
-                servicos_count=Count('servicos_participante', filter=os_concluido_filter, distinct=True)
-            ).annotate(
-                total_geral=F('chamados_count') + F('servicos_count')
-            ).filter(total_geral__gt=0).order_by('-total_geral')[:5]
+                qs_listas = qs_listas.filter(empresa_id=empresa_id)
 
-            ranking_tecnicos = [{
-                "nome": t.nome,
-                "chamados_count": t.chamados_count,
-                "servicos_count": t.servicos_count,
-                "total_geral": t.total_geral
-            } for t in ranking_raw]
-
-            # 4. Lista de Clientes (unificando fontes)
-            clientes_chamado = qs_chamados_mes.values_list('cliente__nome', 'cliente__razao_social')
-            clientes_os = qs_os_mes.values_list('cliente__nome', 'cliente__razao_social')
-            raw_empresas = set(clientes_chamado) | set(clientes_os)
-            lista_empresas = sorted([n if n else r for n, r in raw_empresas if n or r])
+            ultimos_pendentes = qs_listas.filter(status='ABERTO').order_by('-created_at')[:5]
+            em_andamento = qs_listas.filter(status__in=['EM_ANDAMENTO', 'AGENDADO']).order_by('data_agendamento')[:5]
+            ultimos_resolvidos = qs_listas.filter(status='FINALIZADO').order_by('-data_fechamento')[:5]
 
             return Response({
-                "total": total_unificado,
-                "abertos": abertos_unificado,
-                "emAndamento": andamento_unificado,
-                "finalizados": finalizados_unificado,
-                "empresas": lista_empresas,
+                **resumo,
                 "ultimos_pendentes": ChamadoSerializer(ultimos_pendentes, many=True).data,
                 "em_andamento": ChamadoSerializer(em_andamento, many=True).data,
                 "ultimos_resolvidos": ChamadoSerializer(ultimos_resolvidos, many=True).data,
-                "ranking_tecnicos": ranking_tecnicos,
                 "grafico": [
-                    { "name": "Abertos", "quantidade": abertos_unificado },
-                    { "name": "Em Curso", "quantidade": andamento_unificado },
-                    { "name": "Resolvidos", "quantidade": finalizados_unificado }
+                    { "name": "Abertos", "quantidade": resumo['abertos'] },
+                    { "name": "Em Curso", "quantidade": resumo['emAndamento'] },
+                    { "name": "Resolvidos", "quantidade": resumo['finalizados'] }
                 ]
             })
         except Exception as e:
@@ -267,9 +208,8 @@ class ChamadoViewSet(viewsets.ModelViewSet):
     def comentarios(self, request, pk=None):
         chamado = self.get_object()
         if request.method == 'GET':
-            comentarios = chamado.comentarios.all()
-            serializer = ComentarioChamadoSerializer(comentarios, many=True, context={'request': request})
-            return Response(serializer.data)
+            # Incremental: ?since_id= / ?since=, paginado (?limite=)
+            return feed_comentarios(chamado.comentarios.all(), request, ComentarioChamadoSerializer)
         
         if request.method == 'POST':
             autor = getattr(request.user, 'equipe', None)
@@ -279,5 +219,6 @@ class ChamadoViewSet(viewsets.ModelViewSet):
             serializer = ComentarioChamadoSerializer(data=request.data, context={'request': request})
             if serializer.is_valid():
                 serializer.save(chamado=chamado, autor=autor)
+                publicar_comentario(grupo_comentarios('chamado', chamado.id), dict(serializer.data))
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
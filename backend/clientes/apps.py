@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'clientes'
\ No newline at end of file
+    name = 'clientes'
+
+    def ready(self):
+        import clientes.signals
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:42
+
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+ORIGENS_ATIVIDADE = [
+    ('chamados', 'Chamado', 'created_at'),
+    ('servicos', 'OrdemServico', 'created_at'),
+    ('vendas', 'Venda', 'data_venda'),
+]
+
+
+def preencher_ultima_atividade(apps, schema_editor):
+    # Um UPDATE por origem; Coalesce porque GREATEST com NULL é NULL fora do Postgres
+    Cliente = apps.get_model('clientes', 'Cliente')
+    for app_label, modelo, campo in ORIGENS_ATIVIDADE:
+        ultima = Subquery(
+            apps.get_model(app_label, modelo).objects.filter(cliente_id=OuterRef('pk'))
+            .order_by().values('cliente_id').annotate(ultima=Max(campo)).values('ultima')
+        )
+        Cliente.objects.update(
+            ultima_atividade_em=Coalesce(Greatest(F('ultima_atividade_em'), ultima), ultima, F('ultima_atividade_em'))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_variantes_imagens'),
+        ('chamados', '0013_variantes_imagens'),
+        ('servicos', '0009_notificacao_ciclo_de_vida'),
+        ('vendas', '0008_alter_venda_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='ultima_atividade_em',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_ultima_atividade, migrations.RunPython.noop),
+    ]
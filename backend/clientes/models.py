@@ -17,6 +17,8 @@ class Cliente(TimeStampedModel):
 
     nome = models.CharField(max_length=100, null=True, blank=True, verbose_name="Nome Fantasia / Apelido")
     foto = models.ImageField(upload_to='clientes_fotos/', null=True, blank=True)
+    # Thumb/médio em WebP e JPEG, gerados em background (core.tasks.gerar_variantes_imagem)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     razao_social = models.CharField(max_length=100)
     cpf = models.CharField(max_length=11, null=True, blank=True)
     cnpj = models.CharField(max_length=18, null=True, blank=True)
@@ -28,6 +30,8 @@ class Cliente(TimeStampedModel):
     dia_vencimento = models.PositiveSmallIntegerField(default=10)
     tipo_cliente = models.CharField(max_length=20, choices=TipoCliente.choices, default=TipoCliente.AVULSO)
     ativo = models.BooleanField(default=True)
+    # Abertura do último chamado/OS/venda (clientes.signals); base da detecção de churn
+    ultima_atividade_em = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     class Meta:
         db_table = 'TB_CLIENTE'
@@ -1,5 +1,6 @@
 import re # <--- IMPORTANTE: Adicione este import no topo
 from rest_framework import serializers
+from utils.imagens import VariantesImagemField
 from .models import (
     Cliente, ContatoCliente, ProvedorInternet, 
     ContaEmail, DocumentacaoTecnica, ContratoCliente, EmailGestao
@@ -42,6 +43,7 @@ class ClienteSerializer(serializers.ModelSerializer):
     contas_email = ContaEmailSerializer(many=True, read_only=True)
     contratos = ContratoClienteSerializer(many=True, read_only=True)
     nome_exibicao = serializers.SerializerMethodField()
+    foto_variantes = VariantesImagemField('foto')
     
     documentacao_tecnica = serializers.SerializerMethodField()
     email_gestao = serializers.SerializerMethodField()
@@ -0,0 +1,25 @@
+from django.apps import apps
+from django.db.models import Q
+from django.utils import timezone
+
+
+def registrar_atividade_cliente(cliente_id, quando=None):
+    """
+    Avança Cliente.ultima_atividade_em (nunca volta: um UPDATE condicional,
+    sem ler o cliente e sem disparar os signals do Cliente).
+    """
+    if not cliente_id:
+        return
+    quando = quando or timezone.now()
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Cliente.objects.filter(pk=cliente_id).filter(
+        Q(ultima_atividade_em__isnull=True) | Q(ultima_atividade_em__lt=quando)
+    ).update(ultima_atividade_em=quando)
+
+
+def clientes_sem_atividade(desde):
+    """Clientes sem chamado/OS/venda aberto desde `desde` (ou que nunca tiveram)."""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    return Cliente.objects.filter(
+        Q(ultima_atividade_em__isnull=True) | Q(ultima_atividade_em__lt=desde)
+    )
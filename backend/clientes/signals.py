@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .services import registrar_atividade_cliente
+
+# Modelo -> campo com a data de abertura
+CAMPO_DATA_ATIVIDADE = {
+    'chamados.Chamado': 'created_at',
+    'servicos.OrdemServico': 'created_at',
+    'vendas.Venda': 'data_venda',
+}
+
+
+@receiver(post_save, sender='chamados.Chamado')
+@receiver(post_save, sender='servicos.OrdemServico')
+@receiver(post_save, sender='vendas.Venda')
+def atualizar_ultima_atividade(sender, instance, created, **kwargs):
+    if created:
+        quando = getattr(instance, CAMPO_DATA_ATIVIDADE[sender._meta.label])
+        registrar_atividade_cliente(instance.cliente_id, quando)
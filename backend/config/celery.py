@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -16,6 +17,13 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def aquecer_renderizador_pdf(**kwargs):
+    # Cada processo do worker já nasce com fontes e CSS dos PDFs carregados
+    from utils.pdf_service import aquecer_renderizador
+    aquecer_renderizador()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
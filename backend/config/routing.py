@@ -1,6 +1,7 @@
-from django.urls import path
+from django.urls import path, re_path
 from servicos import consumers
 
 websocket_urlpatterns = [
     path('ws/notificacoes/<int:user_id>/', consumers.NotificacaoConsumer.as_asgi()),
+    re_path(r'^ws/comentarios/(?P<tipo>chamado|os)/(?P<objeto_id>\d+)/$', consumers.ComentariosConsumer.as_asgi()),
 ]
@@ -224,4 +224,12 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+# Tasks com ETA (lembretes de visita, até 12h à frente) ficam sem ack no worker;
+# com o padrão de 1h o Redis as re-entregaria várias vezes antes de disparar
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 60 * 60 * 13}
+
+# Retenção de notificações (servicos.tasks.limpar_notificacoes_antigas):
+# lidas há mais de N dias saem de TB_NOTIFICACAO (arquivadas ou apagadas)
+NOTIFICACOES_RETENCAO_DIAS = env.int('NOTIFICACOES_RETENCAO_DIAS', default=90)
+NOTIFICACOES_ARQUIVAR = env.bool('NOTIFICACOES_ARQUIVAR', default=True)
\ No newline at end of file
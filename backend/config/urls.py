@@ -35,7 +35,7 @@ from chamados.views import ChamadoViewSet, AssuntoChamadoViewSet
 from financeiro.views import LancamentoFinanceiroViewSet
 
 # [NOVO] Importação do Core (Empresas)
-from core.views import EmpresaViewSet 
+from core.views import EmpresaViewSet, TarefaPDFViewSet
 
 # Autenticação JWT
 from rest_framework_simplejwt.views import (
@@ -51,6 +51,8 @@ router = DefaultRouter()
 # --- CORE (Multi-Empresa) ---
 # Isso gera a rota: /api/core/empresas/
 router.register(r'core/empresas', EmpresaViewSet, basename='empresa')
+# Status dos PDFs gerados em background: /api/tarefas-pdf/<id>/
+router.register(r'tarefas-pdf', TarefaPDFViewSet, basename='tarefa-pdf')
 
 # --- Clientes e Equipe ---
 router.register(r'clientes', ClienteViewSet)
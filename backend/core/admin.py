@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Empresa
+from .models import Empresa, BlobArquivo, TarefaPDF
 
 
 @admin.register(Empresa)
@@ -62,3 +62,17 @@ class EmpresaAdmin(admin.ModelAdmin):
             'fields': ('created_at',),
         }),
     )
+
+
+@admin.register(BlobArquivo)
+class BlobArquivoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'tamanho', 'referencias', 'updated_at')
+    search_fields = ('sha256', 'nome')
+    readonly_fields = ('sha256', 'nome', 'tamanho', 'referencias', 'created_at', 'updated_at')
+
+
+@admin.register(TarefaPDF)
+class TarefaPDFAdmin(admin.ModelAdmin):
+    list_display = ('id', 'documento', 'objeto_id', 'status', 'solicitado_por', 'created_at', 'duracao_ms')
+    list_filter = ('documento', 'status')
+    readonly_fields = ('created_at', 'concluido_em', 'duracao_ms')
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .signals import conectar_contagem_de_referencias, conectar_variantes_imagem
+        conectar_contagem_de_referencias()
+        conectar_variantes_imagem()
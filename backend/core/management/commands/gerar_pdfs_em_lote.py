@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.models import TarefaPDF
+from core.services import solicitar_pdfs_em_lote, TAMANHO_LOTE_PDF
+
+# Documento -> (modelo, campo de data usado no filtro --mes)
+ORIGENS_PDF = {
+    TarefaPDF.Documento.ORCAMENTO_OS: ('servicos.OrdemServico', 'data_entrada'),
+    TarefaPDF.Documento.ORCAMENTO_VENDA: ('vendas.Venda', 'data_venda'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Enfileira a geração em lote dos PDFs de orçamento (ex.: rodada mensal)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('documento', choices=TarefaPDF.Documento.values)
+        parser.add_argument('--mes', help='AAAA-MM: objetos criados no mês')
+        parser.add_argument('--ids', nargs='+', type=int, help='IDs específicos')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PDF, help='PDFs por mensagem do Celery')
+
+    def handle(self, *args, **options):
+        modelo, campo_data = ORIGENS_PDF[options['documento']]
+        qs = apps.get_model(modelo).objects.order_by('pk')
+
+        if options['ids']:
+            qs = qs.filter(pk__in=options['ids'])
+        if options['mes']:
+            try:
+                ano, mes = map(int, options['mes'].split('-'))
+                inicio = timezone.make_aware(datetime(ano, mes, 1))
+            except ValueError:
+                raise CommandError('Use --mes no formato AAAA-MM.')
+            fim = timezone.make_aware(datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1))
+            qs = qs.filter(**{f'{campo_data}__gte': inicio, f'{campo_data}__lt': fim})
+        if not options['ids'] and not options['mes']:
+            raise CommandError('Informe --mes ou --ids.')
+
+        tarefas = solicitar_pdfs_em_lote(options['documento'], qs.values_list('pk', flat=True), tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{len(tarefas)} PDF(s) enfileirado(s) em lotes de {options["lote"]}.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.signals import campos_com_variantes
+from core.tasks import gerar_variantes_imagem
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes (thumb/medio, WebP/JPEG) das imagens já enviadas que ainda não têm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fila', action='store_true', help='Envia para o Celery em vez de processar aqui')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, campos in campos_com_variantes().items():
+            for campo in campos:
+                registros = model._base_manager.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+                for pk, nome, variantes in registros.values_list('pk', campo, 'variantes_imagens').iterator():
+                    if (variantes or {}).get(campo, {}).get('origem') == nome:
+                        continue
+                    if options['fila']:
+                        gerar_variantes_imagem.delay(model._meta.label, pk, campo)
+                    else:
+                        gerar_variantes_imagem(model._meta.label, pk, campo)
+                    total += 1
+            self.stdout.write(f"  -> {model._meta.label}: {', '.join(campos)}")
+
+        self.stdout.write(self.style.SUCCESS(f'{total} imagem(ns) processada(s).'))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.services import recontar_referencias, limpar_blobs_orfaos
+
+
+class Command(BaseCommand):
+    help = 'Apaga do storage os blobs de anexos sem nenhuma referência (TB_BLOB_ARQUIVO)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24, help='Carência desde a última referência (padrão: 24h)')
+        parser.add_argument('--recontar', action='store_true', help='Recalcula os contadores a partir dos FileFields antes de limpar')
+
+    def handle(self, *args, **options):
+        if options['recontar']:
+            contagem = recontar_referencias()
+            self.stdout.write(f"  -> {len(contagem)} blob(s) referenciado(s)")
+
+        removidos = limpar_blobs_orfaos(timedelta(hours=options['horas']))
+        self.stdout.write(self.style.SUCCESS(f'{removidos} blob(s) órfão(s) removido(s).'))
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('nome', models.CharField(help_text='Caminho no storage (blobs/ab/cd/<sha256>.ext)', max_length=255, unique=True)),
+                ('tamanho', models.BigIntegerField(default=0)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Arquivo (Blob)',
+                'verbose_name_plural': 'Arquivos (Blobs)',
+                'db_table': 'TB_BLOB_ARQUIVO',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_blobarquivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
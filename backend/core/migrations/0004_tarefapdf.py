@@ -0,0 +1,38 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:18
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_variantes_imagens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaPDF',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('documento', models.CharField(choices=[('ORCAMENTO_OS', 'Orçamento da OS'), ('ORCAMENTO_VENDA', 'Orçamento da Venda')], max_length=30)),
+                ('objeto_id', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20)),
+                ('arquivo', models.FileField(blank=True, null=True, upload_to='pdfs/')),
+                ('erro', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de PDF',
+                'verbose_name_plural': 'Tarefas de PDF',
+                'db_table': 'TB_TAREFA_PDF',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['documento', 'objeto_id', 'status'], name='idx_tarefa_pdf_objeto')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tarefapdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefapdf',
+            name='duracao_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Tempo de renderização (métrica)', null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.3 on 2026-10-18 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+EM_ANDAMENTO = ['PENDENTE', 'PROCESSANDO']
+
+
+def encerrar_duplicadas(apps, schema_editor):
+    # Antes da constraint: fica só a tarefa em andamento mais recente de cada objeto
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    em_andamento = TarefaPDF.objects.filter(status__in=EM_ANDAMENTO)
+    duplicados = (
+        em_andamento.order_by().values('documento', 'objeto_id')
+        .annotate(quantidade=Count('id')).filter(quantidade__gt=1)
+    )
+    for grupo in duplicados:
+        do_objeto = em_andamento.filter(documento=grupo['documento'], objeto_id=grupo['objeto_id'])
+        mais_recente = do_objeto.order_by('-created_at').values_list('pk', flat=True)[0]
+        do_objeto.exclude(pk=mais_recente).update(status='ERRO', erro='Tarefa duplicada encerrada na migração.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_tarefapdf_duracao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(encerrar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tarefapdf',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDENTE', 'PROCESSANDO'])), fields=('documento', 'objeto_id'), name='uniq_tarefa_pdf_em_andamento'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+from django.conf import settings
 from django.db import models
 
 class Empresa(models.Model):
@@ -8,6 +10,8 @@ class Empresa(models.Model):
 
     # Identidade Visual (para o Frontend mudar cor/logo)
     logo = models.ImageField(upload_to='logos_empresas/', null=True, blank=True)
+    # Thumb/médio em WebP e JPEG, gerados em background (core.tasks.gerar_variantes_imagem)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     cor_primaria = models.CharField(max_length=7, default='#302464', help_text="Cor HEX (ex: #302464)")
     cor_secundaria = models.CharField(max_length=7, default='#7C69AF', help_text="Cor HEX Secundária")
 
@@ -25,4 +29,72 @@ class Empresa(models.Model):
         verbose_name_plural = "Empresas / Filiais"
 
     def __str__(self):
-        return f"{self.nome_fantasia} ({self.cnpj})"
\ No newline at end of file
+        return f"{self.nome_fantasia} ({self.cnpj})"
+
+class BlobArquivo(models.Model):
+    """
+    Arquivo físico do storage endereçado por conteúdo (utils.armazenamento).
+    `referencias` conta quantos FileFields apontam para ele; blobs sem
+    referência são apagados pelo comando limpar_blobs_orfaos.
+    """
+    sha256 = models.CharField(max_length=64, db_index=True)
+    nome = models.CharField(max_length=255, unique=True, help_text="Caminho no storage (blobs/ab/cd/<sha256>.ext)")
+    tamanho = models.BigIntegerField(default=0)
+    referencias = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'TB_BLOB_ARQUIVO'
+        verbose_name = "Arquivo (Blob)"
+        verbose_name_plural = "Arquivos (Blobs)"
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} ref.)"
+
+
+class TarefaPDF(models.Model):
+    """
+    Geração de PDF em background (Celery), acompanhada por polling em
+    /api/tarefas-pdf/<id>/ ou pelo evento 'pdf_pronto' no WebSocket do usuário.
+    O arquivo final também fica anexado ao objeto (OS/Venda).
+    """
+    class Documento(models.TextChoices):
+        ORCAMENTO_OS = 'ORCAMENTO_OS', 'Orçamento da OS'
+        ORCAMENTO_VENDA = 'ORCAMENTO_VENDA', 'Orçamento da Venda'
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    documento = models.CharField(max_length=30, choices=Documento.choices)
+    objeto_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    arquivo = models.FileField(upload_to='pdfs/', null=True, blank=True)
+    erro = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    duracao_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Tempo de renderização (métrica)")
+
+    class Meta:
+        db_table = 'TB_TAREFA_PDF'
+        verbose_name = "Tarefa de PDF"
+        verbose_name_plural = "Tarefas de PDF"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['documento', 'objeto_id', 'status'], name='idx_tarefa_pdf_objeto'),
+        ]
+        constraints = [
+            # Uma tarefa em andamento por objeto: dois POSTs simultâneos não duplicam a fila
+            models.UniqueConstraint(
+                fields=['documento', 'objeto_id'], condition=models.Q(status__in=['PENDENTE', 'PROCESSANDO']),
+                name='uniq_tarefa_pdf_em_andamento',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_documento_display()} #{self.objeto_id} ({self.status})"
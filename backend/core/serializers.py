@@ -1,12 +1,29 @@
 from rest_framework import serializers
-from .models import Empresa
+from utils.imagens import VariantesImagemField
+from .models import Empresa, TarefaPDF
 
 class EmpresaSerializer(serializers.ModelSerializer):
+    logo_variantes = VariantesImagemField('logo')
+
     class Meta:
         model = Empresa
         # Adicionei eh_matriz, chave_pix e banco_nome
         fields = [
             'id', 'nome_fantasia', 'razao_social', 'cnpj', 
-            'cor_primaria', 'logo', 'eh_matriz',
+            'cor_primaria', 'logo', 'logo_variantes', 'eh_matriz',
             'banco_nome', 'chave_pix'
-        ]
\ No newline at end of file
+        ]
+
+class TarefaPDFSerializer(serializers.ModelSerializer):
+    arquivo_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TarefaPDF
+        fields = ['id', 'documento', 'objeto_id', 'status', 'arquivo_url', 'erro', 'created_at', 'concluido_em']
+        read_only_fields = fields
+
+    def get_arquivo_url(self, obj):
+        if not obj.arquivo:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(obj.arquivo.url) if request else obj.arquivo.url
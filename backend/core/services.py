@@ -0,0 +1,253 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Count, Avg, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from utils.armazenamento import ArmazenamentoPorConteudo, armazenamento_conteudo, eh_blob, sha256_do_nome
+
+logger = logging.getLogger(__name__)
+
+
+def campos_por_conteudo():
+    """(model, campo) de todos os FileFields que usam o storage endereçado por conteúdo."""
+    campos = []
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(getattr(field, 'storage', None), ArmazenamentoPorConteudo):
+                campos.append((model, field))
+    return campos
+
+
+def _tamanho(nome):
+    try:
+        return armazenamento_conteudo.size(nome)
+    except OSError:
+        return 0
+
+
+def ajustar_referencias(deltas):
+    """Aplica {nome_do_blob: +n/-n} no contador de referências (UPDATE atômico com F())."""
+    BlobArquivo = apps.get_model('core', 'BlobArquivo')
+
+    for nome, delta in deltas.items():
+        if not delta or not eh_blob(nome):
+            continue
+        if delta > 0:
+            BlobArquivo.objects.get_or_create(
+                nome=nome, defaults={'sha256': sha256_do_nome(nome), 'tamanho': _tamanho(nome)}
+            )
+        BlobArquivo.objects.filter(nome=nome).update(
+            referencias=Greatest(F('referencias') + delta, 0), updated_at=timezone.now()
+        )
+
+
+@transaction.atomic
+def recontar_referencias():
+    """Recalcula todos os contadores a partir dos FileFields (ex: após bulk_create/update)."""
+    BlobArquivo = apps.get_model('core', 'BlobArquivo')
+
+    contagem = Counter()
+    for model, field in campos_por_conteudo():
+        linhas = model._base_manager.filter(**{f'{field.attname}__startswith': 'blobs/'}) \
+            .values(field.attname).annotate(total=Count('pk'))
+        for linha in linhas:
+            contagem[linha[field.attname]] += linha['total']
+
+    BlobArquivo.objects.exclude(nome__in=list(contagem)).update(referencias=0)
+    for nome, total in contagem.items():
+        BlobArquivo.objects.update_or_create(
+            nome=nome,
+            defaults={'sha256': sha256_do_nome(nome), 'referencias': total},
+            create_defaults={'sha256': sha256_do_nome(nome), 'referencias': total, 'tamanho': _tamanho(nome)},
+        )
+    return contagem
+
+
+def limpar_blobs_orfaos(carencia):
+    """
+    Apaga do disco os blobs sem referência há mais de `carencia` (timedelta).
+    A carência evita apagar um blob que acabou de ser reaproveitado por um upload.
+    """
+    BlobArquivo = apps.get_model('core', 'BlobArquivo')
+    limite = timezone.now() - carencia
+    removidos = 0
+
+    for blob_id in BlobArquivo.objects.filter(referencias=0, updated_at__lt=limite).values_list('id', flat=True):
+        with transaction.atomic():
+            blob = BlobArquivo.objects.select_for_update().filter(
+                pk=blob_id, referencias=0, updated_at__lt=limite
+            ).first()
+            if not blob:
+                continue
+            armazenamento_conteudo.delete(blob.nome)
+            blob.delete()
+            removidos += 1
+    return removidos
+
+
+# =====================================================
+# PDFs EM BACKGROUND (TarefaPDF)
+# =====================================================
+
+# Documento -> função(objeto_id) que anexa e devolve o PDF se um idêntico já
+# foi renderizado (cache por conteúdo, utils.pdf_service), ou None
+PDFS_EM_CACHE = {
+    'ORCAMENTO_OS': 'servicos.services.orcamento_os_pdf_em_cache',
+    'ORCAMENTO_VENDA': 'vendas.services.orcamento_venda_pdf_em_cache',
+}
+
+
+# Tarefa PENDENTE/PROCESSANDO mais velha que isso perdeu o worker (morto no meio
+# da renderização) ou a mensagem no broker: vira ERRO e o próximo pedido enfileira
+# outra. Folga sobre o time_limit de core.tasks.renderizar_pdf e a espera na fila.
+PRAZO_TAREFA_PDF = timedelta(minutes=30)
+
+
+def expirar_tarefas_pdf_travadas(documento, objeto_ids):
+    """Marca como ERRO as tarefas em andamento criadas antes do PRAZO_TAREFA_PDF."""
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    agora = timezone.now()
+    return TarefaPDF.objects.filter(
+        documento=documento, objeto_id__in=objeto_ids,
+        status__in=[TarefaPDF.Status.PENDENTE, TarefaPDF.Status.PROCESSANDO],
+        created_at__lt=agora - PRAZO_TAREFA_PDF,
+    ).update(status=TarefaPDF.Status.ERRO, erro='Tempo esgotado aguardando o worker.', concluido_em=agora)
+
+
+def _falha_ao_enfileirar_pdf(tarefas):
+    """Broker fora: a tarefa não fica PENDENTE sem mensagem na fila (o próximo pedido cria outra)."""
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    logger.warning(f"Falha ao enfileirar {len(tarefas)} tarefa(s) de PDF", exc_info=True)
+    agora = timezone.now()
+    erro = 'Falha ao enfileirar a renderização (fila indisponível).'
+    TarefaPDF.objects.filter(
+        pk__in=[tarefa.pk for tarefa in tarefas], status=TarefaPDF.Status.PENDENTE,
+    ).update(status=TarefaPDF.Status.ERRO, erro=erro, concluido_em=agora)
+    for tarefa in tarefas:
+        tarefa.status, tarefa.erro, tarefa.concluido_em = TarefaPDF.Status.ERRO, erro, agora
+
+
+def solicitar_pdf(documento, objeto_id, usuario=None):
+    """
+    Cria (ou reaproveita, se já houver uma na fila) a tarefa de PDF do objeto
+    e enfileira a renderização no Celery após o commit. Se o objeto não mudou
+    desde o último PDF, a tarefa já nasce CONCLUIDO, sem passar pelo worker.
+    Tarefas travadas além do PRAZO_TAREFA_PDF não são reaproveitadas.
+    """
+    from .tasks import renderizar_pdf
+
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    solicitante = usuario if getattr(usuario, 'is_authenticated', False) else None
+
+    arquivo = import_string(PDFS_EM_CACHE[documento])(objeto_id)
+    if arquivo:
+        return TarefaPDF.objects.create(
+            documento=documento, objeto_id=objeto_id, solicitado_por=solicitante,
+            status=TarefaPDF.Status.CONCLUIDO, arquivo=arquivo.name,
+            concluido_em=timezone.now(),
+        )
+
+    expirar_tarefas_pdf_travadas(documento, [objeto_id])
+    em_andamento = TarefaPDF.objects.filter(
+        documento=documento, objeto_id=objeto_id,
+        status__in=[TarefaPDF.Status.PENDENTE, TarefaPDF.Status.PROCESSANDO],
+    )
+    tarefa = em_andamento.first()
+    if tarefa:
+        return tarefa
+
+    try:
+        with transaction.atomic():
+            tarefa = TarefaPDF.objects.create(documento=documento, objeto_id=objeto_id, solicitado_por=solicitante)
+    except IntegrityError:
+        # Outro pedido criou a tarefa entre a consulta e o INSERT (uniq_tarefa_pdf_em_andamento)
+        return em_andamento.get()
+
+    def enfileirar():
+        try:
+            renderizar_pdf.apply_async((str(tarefa.id),), retry=False)
+        except Exception:
+            _falha_ao_enfileirar_pdf([tarefa])
+    transaction.on_commit(enfileirar)
+    return tarefa
+
+
+# Tarefas por mensagem do Celery nos lotes: cada worker renderiza um pedaço
+# seguido no mesmo processo (fontes/CSS já aquecidos) e os pedaços se
+# espalham pelos workers/núcleos disponíveis.
+TAMANHO_LOTE_PDF = 20
+
+
+def solicitar_pdfs_em_lote(documento, objeto_ids, usuario=None, tamanho_lote=TAMANHO_LOTE_PDF):
+    """
+    Cria uma TarefaPDF por objeto e envia para o Celery em pedaços (celery chunks).
+    Objetos que já têm tarefa em andamento ficam de fora (uniq_tarefa_pdf_em_andamento).
+    """
+    from .tasks import renderizar_pdf
+
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    objeto_ids = list(objeto_ids)
+    expirar_tarefas_pdf_travadas(documento, objeto_ids)
+    tarefas = [
+        TarefaPDF(
+            documento=documento, objeto_id=objeto_id,
+            solicitado_por=usuario if getattr(usuario, 'is_authenticated', False) else None,
+        )
+        for objeto_id in objeto_ids
+    ]
+    TarefaPDF.objects.bulk_create(tarefas, ignore_conflicts=True)
+    # ignore_conflicts não informa quais entraram: o id (UUID) é gerado aqui, então confere no banco
+    criadas = set(TarefaPDF.objects.filter(pk__in=[tarefa.pk for tarefa in tarefas]).values_list('pk', flat=True))
+    tarefas = [tarefa for tarefa in tarefas if tarefa.pk in criadas]
+    if tarefas:
+        argumentos = [(str(tarefa.id),) for tarefa in tarefas]
+
+        def enfileirar():
+            try:
+                renderizar_pdf.chunks(argumentos, tamanho_lote).group().apply_async(retry=False)
+            except Exception:
+                _falha_ao_enfileirar_pdf(tarefas)
+        transaction.on_commit(enfileirar)
+    return tarefas
+
+
+def metricas_pdf(desde=None):
+    """Tempo de renderização por documento (ms) a partir das tarefas concluídas."""
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+    qs = TarefaPDF.objects.all()
+    if desde:
+        qs = qs.filter(created_at__gte=desde)
+    concluidas = Q(status=TarefaPDF.Status.CONCLUIDO)
+    return list(
+        qs.order_by().values('documento').annotate(
+            quantidade=Count('id', filter=concluidas),
+            erros=Count('id', filter=Q(status=TarefaPDF.Status.ERRO)),
+            media_ms=Avg('duracao_ms', filter=concluidas),
+            max_ms=Max('duracao_ms', filter=concluidas),
+        ).order_by('documento')
+    )
+
+
+def avisar_pdf_pronto(tarefa):
+    """Evento 'pdf_pronto' no grupo do usuário (NotificacaoConsumer)."""
+    if not tarefa.solicitado_por_id:
+        return
+    async_to_sync(get_channel_layer().group_send)(f"user_{tarefa.solicitado_por_id}", {
+        "type": "pdf_pronto",
+        "tarefa": {
+            "id": str(tarefa.id),
+            "documento": tarefa.documento,
+            "objeto_id": tarefa.objeto_id,
+            "status": tarefa.status,
+            "url": tarefa.arquivo.url if tarefa.arquivo else None,
+            "erro": tarefa.erro,
+        },
+    })
@@ -0,0 +1,103 @@
+import logging
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models.signals import post_init, post_save, post_delete
+
+from utils.armazenamento import eh_blob
+from .services import campos_por_conteudo, ajustar_referencias
+
+logger = logging.getLogger(__name__)
+
+
+def _nome(valor):
+    return getattr(valor, 'name', valor) or None
+
+
+def conectar_contagem_de_referencias():
+    """Liga a contagem de referências dos blobs em todo model com FileField por conteúdo."""
+    campos = {}
+    for model, field in campos_por_conteudo():
+        campos.setdefault(model, []).append(field.attname)
+
+    for model, attnames in campos.items():
+
+        def estado(instance, attnames=attnames):
+            # __dict__ para não disparar query em campos adiados (.only/.defer)
+            return {attname: _nome(instance.__dict__.get(attname)) for attname in attnames}
+
+        def guardar(sender, instance, estado=estado, **kwargs):
+            instance._blobs_salvos = estado(instance)
+
+        def salvar(sender, instance, created, update_fields=None, estado=estado, **kwargs):
+            antes = {} if created else getattr(instance, '_blobs_salvos', {})
+            depois = estado(instance)
+
+            deltas = Counter()
+            for attname, nome in depois.items():
+                # save(update_fields=...) sem este campo: o banco não mudou
+                if update_fields is not None and attname not in update_fields:
+                    depois[attname] = antes.get(attname)
+                    continue
+                if antes.get(attname) != nome:
+                    if eh_blob(nome):
+                        deltas[nome] += 1
+                    if eh_blob(antes.get(attname)):
+                        deltas[antes[attname]] -= 1
+            instance._blobs_salvos = depois
+            ajustar_referencias(deltas)
+
+        def remover(sender, instance, estado=estado, **kwargs):
+            deltas = Counter()
+            for nome in estado(instance).values():
+                if eh_blob(nome):
+                    deltas[nome] -= 1
+            ajustar_referencias(deltas)
+
+        uid = f'blobs_{model._meta.label_lower}'
+        post_init.connect(guardar, sender=model, weak=False, dispatch_uid=f'{uid}_init')
+        post_save.connect(salvar, sender=model, weak=False, dispatch_uid=f'{uid}_save')
+        post_delete.connect(remover, sender=model, weak=False, dispatch_uid=f'{uid}_delete')
+
+
+def campos_com_variantes():
+    """{model: [campos]} das ImageFields em models que têm o campo `variantes_imagens`."""
+    from django.apps import apps
+
+    campos = {}
+    for model in apps.get_models():
+        nomes = {field.name for field in model._meta.concrete_fields}
+        if 'variantes_imagens' not in nomes:
+            continue
+        campos[model] = [
+            field.name for field in model._meta.concrete_fields if isinstance(field, models.ImageField)
+        ]
+    return campos
+
+
+def _agendar_variantes(modelo, pk, campo):
+    from .tasks import gerar_variantes_imagem
+    try:
+        gerar_variantes_imagem.apply_async((modelo, pk, campo), retry=False)
+    except Exception:
+        # Broker fora: o save já foi gravado; o comando gerar_variantes_imagens recupera depois
+        logger.warning(f"Falha ao agendar as variantes de {modelo}#{pk}.{campo}", exc_info=True)
+
+
+def conectar_variantes_imagem():
+    """Agenda a geração das variantes quando uma imagem é enviada, trocada ou removida."""
+    for model, campos in campos_com_variantes().items():
+
+        def salvar(sender, instance, update_fields=None, campos=campos, **kwargs):
+            registradas = instance.variantes_imagens or {}
+            for campo in campos:
+                if update_fields is not None and campo not in update_fields:
+                    continue
+                nome = getattr(instance, campo).name or None
+                if nome == registradas.get(campo, {}).get('origem'):
+                    continue
+                transaction.on_commit(
+                    lambda campo=campo: _agendar_variantes(sender._meta.label, instance.pk, campo)
+                )
+
+        post_save.connect(salvar, sender=model, weak=False, dispatch_uid=f'variantes_{model._meta.label_lower}')
@@ -0,0 +1,94 @@
+import logging
+import time
+
+from celery import shared_task
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from utils.imagens import gerar_variantes
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def gerar_variantes_imagem(modelo, pk, campo):
+    """
+    Gera as variantes (thumb/medio, WebP/JPEG, sem EXIF) de uma ImageField e
+    registra os caminhos em `variantes_imagens` do registro.
+    Disparada pelo post_save (core.signals) após o commit.
+    """
+    Model = apps.get_model(modelo)
+    instance = Model._base_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    arquivo = getattr(instance, campo)
+    variantes = None
+    if arquivo:
+        try:
+            variantes = gerar_variantes(arquivo)
+        except (OSError, ValueError) as e:
+            # Inclui PIL.UnidentifiedImageError (arquivo não é imagem) e arquivo ausente
+            logger.warning("Variantes não geradas para %s#%s.%s: %s", modelo, pk, campo, e)
+            return
+
+    with transaction.atomic():
+        # Trava a linha e confere se a imagem não foi trocada enquanto processava
+        atual = Model._base_manager.select_for_update().filter(pk=pk).values_list(campo, 'variantes_imagens').first()
+        if atual is None or (atual[0] or None) != (arquivo.name or None):
+            return
+        dados = dict(atual[1] or {})
+        if variantes:
+            dados[campo] = variantes
+        else:
+            dados.pop(campo, None)
+        # update() direto: não dispara signals (nem um novo processamento)
+        Model._base_manager.filter(pk=pk).update(variantes_imagens=dados)
+
+
+# Função que renderiza e anexa o PDF ao objeto; recebe o id e devolve o FieldFile salvo
+RENDERIZADORES_PDF = {
+    'ORCAMENTO_OS': 'servicos.services.salvar_orcamento_os_pdf',
+    'ORCAMENTO_VENDA': 'vendas.services.salvar_orcamento_venda_pdf',
+}
+
+
+# Limite de uma renderização no worker (s). Estourou o soft: vira ERRO; o hard
+# mata o processo e a tarefa fica em PROCESSANDO até core.services.PRAZO_TAREFA_PDF.
+LIMITE_RENDERIZACAO_PDF = 5 * 60
+
+
+@shared_task(soft_time_limit=LIMITE_RENDERIZACAO_PDF - 30, time_limit=LIMITE_RENDERIZACAO_PDF)
+def renderizar_pdf(tarefa_id):
+    """Renderiza o PDF de uma TarefaPDF fora do request (libera os workers web)."""
+    from .services import avisar_pdf_pronto
+
+    TarefaPDF = apps.get_model('core', 'TarefaPDF')
+
+    # Marca como PROCESSANDO só se ainda estiver PENDENTE (evita processar em dobro)
+    if not TarefaPDF.objects.filter(pk=tarefa_id, status=TarefaPDF.Status.PENDENTE).update(
+        status=TarefaPDF.Status.PROCESSANDO
+    ):
+        return
+    tarefa = TarefaPDF.objects.get(pk=tarefa_id)
+
+    inicio = time.perf_counter()
+    try:
+        arquivo = import_string(RENDERIZADORES_PDF[tarefa.documento])(tarefa.objeto_id)
+        tarefa.arquivo.name = arquivo.name
+        tarefa.status = TarefaPDF.Status.CONCLUIDO
+    except Exception as e:
+        logger.exception("Falha ao gerar PDF da tarefa %s", tarefa_id)
+        tarefa.status = TarefaPDF.Status.ERRO
+        tarefa.erro = str(e)
+
+    tarefa.duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    tarefa.concluido_em = timezone.now()
+    tarefa.save(update_fields=['arquivo', 'status', 'erro', 'concluido_em', 'duracao_ms'])
+
+    try:
+        avisar_pdf_pronto(tarefa)
+    except Exception:
+        logger.warning("Falha ao avisar via WebSocket a tarefa %s", tarefa_id, exc_info=True)
@@ -1,3 +1,312 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from PIL import Image
+
+from chamados.models import Chamado
+from chamados.services import atualizar_chamado
+from clientes.models import Cliente
+from equipe.models import Equipe
+from equipe.serializers import EquipeSerializer
+from financeiro.models import LancamentoFinanceiro
+from servicos.models import OrdemServico
+from utils import pdf_service
+from utils.armazenamento import armazenamento_conteudo
+from utils.pdf_service import TEMPLATES_PDF, _estilos, _fontes
+from .models import BlobArquivo, TarefaPDF
+from .services import limpar_blobs_orfaos, recontar_referencias, PRAZO_TAREFA_PDF
+from .tasks import gerar_variantes_imagem, renderizar_pdf
+
+MEDIA_TESTE = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_TESTE,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class ArmazenamentoPorConteudoTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTE, ignore_errors=True)
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+
+    def _chamado_com_anexo(self, conteudo=b'laudo tecnico', **kwargs):
+        return Chamado.objects.create(
+            cliente=self.cliente, descricao_detalhada='x',
+            arquivo_conclusao=SimpleUploadedFile('laudo.pdf', conteudo), **kwargs,
+        )
+
+    def test_mesmo_conteudo_vira_um_unico_blob(self):
+        primeiro = self._chamado_com_anexo()
+        segundo = self._chamado_com_anexo()
+        self.assertEqual(primeiro.arquivo_conclusao.name, segundo.arquivo_conclusao.name)
+        self.assertTrue(primeiro.arquivo_conclusao.name.startswith('blobs/'))
+        self.assertTrue(primeiro.arquivo_conclusao.name.endswith('.pdf'))
+        self.assertEqual(BlobArquivo.objects.get().referencias, 2)
+
+    def test_upload_concorrente_do_mesmo_conteudo_nao_duplica_o_blob(self):
+        primeiro = self._chamado_com_anexo()
+        # O outro upload passou pelo exists() antes do primeiro terminar de gravar
+        with mock.patch.object(armazenamento_conteudo, 'exists', return_value=False) as exists:
+            segundo = self._chamado_com_anexo()
+        self.assertTrue(exists.called)
+        self.assertEqual(segundo.arquivo_conclusao.name, primeiro.arquivo_conclusao.name)
+        self.assertEqual(os.listdir(os.path.dirname(primeiro.arquivo_conclusao.path)), [
+            os.path.basename(primeiro.arquivo_conclusao.name),
+        ])
+
+    def test_finalizacao_compartilha_comprovante_sem_copiar(self):
+        chamado = self._chamado_com_anexo(valor_servico=150)
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        atualizar_chamado(chamado.id, {'status': 'FINALIZADO', 'resolucao': 'Ok'}, usuario_responsavel=user)
+
+        lancamento = LancamentoFinanceiro.objects.get(categoria='SERVICO')
+        self.assertEqual(lancamento.comprovante.name, chamado.arquivo_conclusao.name)
+        self.assertEqual(lancamento.comprovante.read(), b'laudo tecnico')
+        self.assertEqual(BlobArquivo.objects.get().referencias, 2)
+        pasta = os.path.dirname(chamado.arquivo_conclusao.path)
+        self.assertEqual(len(os.listdir(pasta)), 1)
+
+    def test_blob_sem_referencia_e_removido_apos_carencia(self):
+        chamado = self._chamado_com_anexo(conteudo=b'temporario')
+        caminho = chamado.arquivo_conclusao.path
+        chamado.arquivo_conclusao = None
+        chamado.save()
+
+        self.assertEqual(BlobArquivo.objects.get().referencias, 0)
+        self.assertEqual(limpar_blobs_orfaos(timedelta(hours=1)), 0)
+        self.assertEqual(limpar_blobs_orfaos(timedelta(0)), 1)
+        self.assertFalse(os.path.exists(caminho))
+        self.assertFalse(BlobArquivo.objects.exists())
+
+    def test_recontar_corrige_contadores(self):
+        self._chamado_com_anexo()
+        BlobArquivo.objects.update(referencias=7)
+        recontar_referencias()
+        self.assertEqual(BlobArquivo.objects.get().referencias, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTE)
+class VariantesImagemTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTE, ignore_errors=True)
+
+    def _foto_de_celular(self):
+        imagem = Image.new('RGB', (3000, 2000), (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: girar 90°
+        exif[0x010F] = 'Fabricante do celular'
+        buffer = BytesIO()
+        imagem.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_agenda_geracao_das_variantes(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Equipe.objects.create(nome='Sem foto', cargo='TECNICO')
+        self.assertEqual(len(callbacks), 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Equipe.objects.create(nome='Com foto', cargo='TECNICO', foto=self._foto_de_celular())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_broker_fora_do_ar_nao_derruba_o_upload(self):
+        with mock.patch.object(gerar_variantes_imagem, 'apply_async', side_effect=ConnectionError('broker')):
+            with self.captureOnCommitCallbacks(execute=True):
+                membro = Equipe.objects.create(nome='Com foto', cargo='TECNICO', foto=self._foto_de_celular())
+        self.assertTrue(Equipe.objects.filter(pk=membro.pk).exists())
+
+    def test_variantes_reduzidas_sem_exif_e_expostas_no_serializer(self):
+        membro = Equipe.objects.create(nome='Técnico', cargo='TECNICO', foto=self._foto_de_celular())
+        self.assertIsNone(EquipeSerializer(membro).data['foto_variantes'])
+
+        gerar_variantes_imagem('equipe.Equipe', membro.pk, 'foto')
+        membro.refresh_from_db()
+
+        variantes = membro.variantes_imagens['foto']
+        self.assertEqual(variantes['origem'], membro.foto.name)
+        with Image.open(os.path.join(MEDIA_TESTE, variantes['thumb']['jpeg'])) as thumb:
+            # Orientação aplicada (retrato) e EXIF removido
+            self.assertEqual(thumb.size, (171, 256))
+            self.assertNotIn('exif', thumb.info)
+        with Image.open(os.path.join(MEDIA_TESTE, variantes['medio']['webp'])) as medio:
+            self.assertEqual(medio.format, 'WEBP')
+            self.assertEqual(max(medio.size), 1024)
+
+        urls = EquipeSerializer(membro).data['foto_variantes']
+        self.assertTrue(urls['thumb']['webp'].startswith('/media/variantes/'))
+        self.assertEqual(set(urls), {'thumb', 'medio'})
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_TESTE,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class TarefaPDFTest(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTE, ignore_errors=True)
+
+    def setUp(self):
+        # PDFs em cache de um teste não valem para o próximo
+        self.addCleanup(shutil.rmtree, MEDIA_TESTE, ignore_errors=True)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        Equipe.objects.create(usuario=self.user, nome='Test User', cargo='TECNICO')
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        self.os = OrdemServico.objects.create(cliente=cliente, titulo='Orçamento', descricao_problema='x')
+        self.client.force_authenticate(user=self.user)
+
+    def test_pedido_responde_202_e_agenda_renderizacao(self):
+        url = f'/api/servicos/{self.os.id}/gerar_orcamento/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'PENDENTE')
+        self.assertIsNone(response.data['arquivo_url'])
+        self.assertEqual(len(callbacks), 1)
+
+        # Pedido repetido enquanto a primeira está na fila reaproveita a tarefa
+        with self.captureOnCommitCallbacks() as callbacks:
+            repetido = self.client.post(url)
+        self.assertEqual(repetido.data['id'], response.data['id'])
+        self.assertEqual(len(callbacks), 0)
+
+    def test_tarefa_travada_vira_erro_e_pedido_enfileira_outra(self):
+        url = f'/api/servicos/{self.os.id}/gerar_orcamento/'
+        travada = TarefaPDF.objects.create(
+            documento=TarefaPDF.Documento.ORCAMENTO_OS, objeto_id=self.os.id, status=TarefaPDF.Status.PROCESSANDO,
+        )
+        TarefaPDF.objects.filter(pk=travada.pk).update(created_at=timezone.now() - PRAZO_TAREFA_PDF - timedelta(minutes=1))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url)
+        self.assertNotEqual(response.data['id'], str(travada.id))
+        self.assertEqual(len(callbacks), 1)
+        travada.refresh_from_db()
+        self.assertEqual(travada.status, TarefaPDF.Status.ERRO)
+
+        # Só uma em andamento por objeto, mesmo com pedidos simultâneos
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TarefaPDF.objects.create(documento=TarefaPDF.Documento.ORCAMENTO_OS, objeto_id=self.os.id)
+
+    def test_broker_fora_do_ar_nao_deixa_tarefa_pendente(self):
+        url = f'/api/servicos/{self.os.id}/gerar_orcamento/'
+        with mock.patch.object(renderizar_pdf, 'apply_async', side_effect=ConnectionError('broker')):
+            with self.captureOnCommitCallbacks(execute=True):
+                primeira = self.client.post(url)
+        self.assertEqual(TarefaPDF.objects.get(pk=primeira.data['id']).status, TarefaPDF.Status.ERRO)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            segunda = self.client.post(url)
+        self.assertNotEqual(segunda.data['id'], primeira.data['id'])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_worker_anexa_pdf_e_status_informa_a_url(self):
+        response = self.client.post(f'/api/servicos/{self.os.id}/gerar_orcamento/')
+        renderizar_pdf(response.data['id'])
+
+        tarefa = TarefaPDF.objects.get(pk=response.data['id'])
+        self.os.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDO)
+        self.assertEqual(tarefa.arquivo.name, self.os.arquivo_orcamento.name)
+        self.assertIsNotNone(tarefa.duracao_ms)
+
+        status_tarefa = self.client.get(f'/api/tarefas-pdf/{tarefa.id}/')
+        self.assertEqual(status_tarefa.data['status'], 'CONCLUIDO')
+        self.assertTrue(status_tarefa.data['arquivo_url'].endswith('.pdf'))
+
+        outro = User.objects.create_user(username='outro', password='testpassword')
+        self.client.force_authenticate(user=outro)
+        self.assertEqual(self.client.get(f'/api/tarefas-pdf/{tarefa.id}/').status_code, 404)
+
+    def test_falha_na_renderizacao_marca_erro(self):
+        tarefa = TarefaPDF.objects.create(documento=TarefaPDF.Documento.ORCAMENTO_OS, objeto_id=999999)
+        renderizar_pdf(str(tarefa.id))
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.ERRO)
+        self.assertTrue(tarefa.erro)
+
+    def test_fontes_e_css_carregados_uma_vez_por_processo(self):
+        self.assertIs(_fontes(), _fontes())
+        for template_name in TEMPLATES_PDF:
+            self.assertEqual(len(_estilos(template_name)), 1)
+            self.assertIs(_estilos(template_name), _estilos(template_name))
+
+    def test_lote_cria_tarefas_e_envia_uma_vez(self):
+        outra = OrdemServico.objects.create(cliente=self.os.cliente, titulo='Outra', descricao_problema='x')
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('gerar_pdfs_em_lote', 'ORCAMENTO_OS', '--ids', str(self.os.id), str(outra.id), stdout=StringIO())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            set(TarefaPDF.objects.values_list('objeto_id', flat=True)), {self.os.id, outra.id}
+        )
+
+        # Repetido com as tarefas ainda na fila: nada novo
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('gerar_pdfs_em_lote', 'ORCAMENTO_OS', '--ids', str(self.os.id), str(outra.id), stdout=StringIO())
+        self.assertEqual(len(callbacks), 0)
+        self.assertEqual(TarefaPDF.objects.count(), 2)
+
+    def test_metricas_de_renderizacao(self):
+        response = self.client.post(f'/api/servicos/{self.os.id}/gerar_orcamento/')
+        renderizar_pdf(response.data['id'])
+
+        self.assertEqual(self.client.get('/api/tarefas-pdf/metricas/').status_code, 403)
+        self.user.equipe.cargo = 'SOCIO'
+        self.user.equipe.save()
+        metricas = self.client.get('/api/tarefas-pdf/metricas/').data
+        self.assertEqual(metricas[0]['documento'], 'ORCAMENTO_OS')
+        self.assertEqual(metricas[0]['quantidade'], 1)
+        self.assertIsNotNone(metricas[0]['media_ms'])
+
+    def test_pdf_inalterado_vem_do_cache_com_etag(self):
+        url = f'/api/servicos/{self.os.id}/gerar_orcamento/'
+        # Bytes conhecidos: o teste não depende do WeasyPrint instalado
+        with mock.patch.object(pdf_service, '_html_para_pdf', return_value=b'%PDF-teste') as renderizar:
+            # Sem PDF pronto, o GET não renderiza no worker web: vai para a fila
+            with self.captureOnCommitCallbacks() as callbacks:
+                pendente = self.client.get(url)
+            self.assertEqual(pendente.status_code, 202)
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(renderizar.call_count, 0)
+            renderizar_pdf(pendente.data['id'])
+
+            primeira = self.client.get(url)
+            self.assertEqual(b''.join(primeira.streaming_content), b'%PDF-teste')
+            etag = primeira['ETag']
+
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            segunda = self.client.get(url)
+            segunda.close()
+            self.assertEqual(segunda['ETag'], etag)
+
+            # POST com a OS inalterada já responde com o PDF pronto, sem fila
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['status'], 'CONCLUIDO')
+            self.assertEqual(len(callbacks), 0)
+            self.assertEqual(renderizar.call_count, 1)
+
+            self.os.valor_mao_de_obra = 300
+            self.os.save()
+            alterada = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(alterada.status_code, 202)
+            self.assertEqual(renderizar.call_count, 1)
@@ -1,7 +1,13 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Empresa
-from .serializers import EmpresaSerializer
+from .models import Empresa, TarefaPDF
+from .serializers import EmpresaSerializer, TarefaPDFSerializer
+from .services import metricas_pdf
 from equipe.permissions import IsSocio
 
 class EmpresaViewSet(viewsets.ModelViewSet):
@@ -17,4 +23,26 @@ class EmpresaViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         else:
             permission_classes = [IsSocio]
-        return [permission() for permission in permission_classes]
\ No newline at end of file
+        return [permission() for permission in permission_classes]
+
+
+class TarefaPDFViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status das renderizações de PDF em background (polling do front)."""
+    serializer_class = TarefaPDFSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        qs = TarefaPDF.objects.order_by('-created_at')
+        if not self.request.user.is_staff:
+            qs = qs.filter(solicitado_por=self.request.user)
+        return qs
+
+    @action(detail=False, methods=['get'], permission_classes=[IsSocio])
+    def metricas(self, request):
+        """Tempo médio/máximo de renderização por documento (?dias=7)."""
+        try:
+            dias = max(int(request.query_params.get('dias', 7)), 1)
+        except ValueError:
+            dias = 7
+        return Response(metricas_pdf(timezone.now() - timedelta(days=dias)))
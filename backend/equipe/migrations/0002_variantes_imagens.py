@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipe',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
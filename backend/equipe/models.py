@@ -12,6 +12,8 @@ class Equipe(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     nome = models.CharField(max_length=100)
     foto = models.ImageField(upload_to='fotos_equipe/', null=True, blank=True)
+    # Thumb/médio em WebP e JPEG, gerados em background (core.tasks.gerar_variantes_imagem)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     cargo = models.CharField(
         max_length=50, 
         choices=Cargo.choices, 
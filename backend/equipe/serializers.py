@@ -1,14 +1,16 @@
 from rest_framework import serializers
+from utils.imagens import VariantesImagemField
 from .models import Equipe
 from .services import criar_membro_equipe
 
 class EquipeSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='usuario.username', read_only=True)
     usuario_id = serializers.IntegerField(source='usuario.id', read_only=True)
+    foto_variantes = VariantesImagemField('foto')
 
     class Meta:
         model = Equipe
-        fields = ['id', 'nome', 'cargo', 'custo_hora', 'username', 'foto', 'usuario_id']
+        fields = ['id', 'nome', 'cargo', 'custo_hora', 'username', 'foto', 'foto_variantes', 'usuario_id']
         read_only_fields = ['usuario', 'username', 'usuario_id']
         
     def create(self, validated_data):
@@ -52,12 +52,15 @@ class EquipeViewSet(viewsets.ModelViewSet):
             return Response({"erro": "Usuário logado sem perfil de equipe."}, status=403)
 
         if request.method == 'GET':
-            hoje = timezone.now()
+            from chamados.services import intervalo_mes
+            hoje = timezone.localdate()
             Chamado = apps.get_model('chamados', 'Chamado')
+            inicio_mes, fim_mes = intervalo_mes(hoje.year, hoje.month)
             
             stats = Chamado.objects.filter(
                 chamadotecnico__tecnico=membro,
-                created_at__month=hoje.month
+                created_at__gte=inicio_mes,
+                created_at__lt=fim_mes,
             ).aggregate(
                 total=Count('id'),
                 finalizados=Count('id', filter=Q(status='FINALIZADO'))
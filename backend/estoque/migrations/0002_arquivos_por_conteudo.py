@@ -0,0 +1,24 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:10
+
+import utils.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimentacaoestoque',
+            name='arquivo_1',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='docs_estoque/'),
+        ),
+        migrations.AlterField(
+            model_name='movimentacaoestoque',
+            name='arquivo_2',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='docs_estoque/'),
+        ),
+    ]
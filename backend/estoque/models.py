@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from utils.armazenamento import armazenamento_conteudo
 from django.core.exceptions import ValidationError
 
 class TimeStampedModel(models.Model):
@@ -63,8 +64,8 @@ class MovimentacaoEstoque(models.Model):
     numero_serial = models.CharField(max_length=100, null=True, blank=True)
     observacao = models.TextField(null=True, blank=True, verbose_name="Observação/Motivo")
     
-    arquivo_1 = models.FileField(upload_to='docs_estoque/', null=True, blank=True)
-    arquivo_2 = models.FileField(upload_to='docs_estoque/', null=True, blank=True)
+    arquivo_1 = models.FileField(upload_to='docs_estoque/', storage=armazenamento_conteudo, null=True, blank=True)
+    arquivo_2 = models.FileField(upload_to='docs_estoque/', storage=armazenamento_conteudo, null=True, blank=True)
     
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
 
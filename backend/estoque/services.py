@@ -1,11 +1,14 @@
 from django.db import transaction
+from django.db.models import F, Case, When, Value, DecimalField
 from django.core.exceptions import ValidationError
 from django.apps import apps
 from django.utils import timezone
 import uuid
+from collections import defaultdict
 from datetime import date
 from decimal import Decimal, InvalidOperation 
-from .models import MovimentacaoEstoque
+from utils.armazenamento import compartilhar_arquivo
+from .models import MovimentacaoEstoque, Produto
 
 def add_months(sourcedate, months):
     import calendar
@@ -22,6 +25,53 @@ def to_decimal(valor):
     except:
         return Decimal('0.00')
 
+@transaction.atomic
+def baixar_estoque(itens, observacao, usuario=None, cliente=None, empresa=None):
+    """
+    Baixa de estoque em lote (finalização de OS, aprovação de venda).
+
+    itens: [(produto_id, quantidade), ...] — produtos repetidos são somados.
+    Trava todos os produtos numa única query, em ordem de id (duas baixas
+    concorrentes sempre travam na mesma ordem: sem deadlock), valida tudo antes
+    de alterar qualquer saldo, aplica os decrementos com F() e grava as
+    movimentações de SAIDA num único bulk_create.
+    Rodar dentro da transação do chamador (a trava vale até o commit dela).
+    """
+    quantidades = defaultdict(Decimal)
+    for produto_id, quantidade in itens:
+        quantidades[produto_id] += to_decimal(quantidade)
+    if not quantidades:
+        return []
+
+    produtos = list(Produto.objects.select_for_update().filter(pk__in=quantidades).order_by('pk'))
+
+    faltas = [
+        f"'{produto.nome}' (necessário: {quantidades[produto.pk]}, disponível: {produto.estoque_atual})"
+        for produto in produtos if produto.estoque_atual < quantidades[produto.pk]
+    ]
+    if faltas:
+        raise ValidationError(f"Estoque insuficiente para {'; '.join(faltas)}.")
+
+    baixa = Case(
+        *[When(pk=produto.pk, then=Value(quantidades[produto.pk])) for produto in produtos],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    Produto.objects.filter(pk__in=[produto.pk for produto in produtos]).update(estoque_atual=F('estoque_atual') - baixa)
+
+    return MovimentacaoEstoque.objects.bulk_create([
+        MovimentacaoEstoque(
+            produto=produto,
+            quantidade=quantidades[produto.pk],
+            tipo_movimento='SAIDA',
+            usuario=usuario,
+            cliente=cliente,
+            observacao=observacao,
+            empresa=empresa,
+        )
+        for produto in produtos
+    ])
+
+
 @transaction.atomic
 def processar_movimentacao_estoque(
     produto, quantidade, tipo_movimento, usuario, 
@@ -35,7 +85,8 @@ def processar_movimentacao_estoque(
     qtd_decimal = to_decimal(quantidade)
     preco_decimal = to_decimal(preco_unitario)
     
-    produto.refresh_from_db() 
+    # Trava a linha: baixas concorrentes (baixar_estoque) esperam este commit
+    produto.refresh_from_db(from_queryset=Produto.objects.select_for_update())
     estoque_atual_decimal = to_decimal(produto.estoque_atual)
 
     # 1. Atualiza Saldo
@@ -102,8 +153,9 @@ def processar_movimentacao_estoque(
                     parcela_atual=i+1,
                     total_parcelas=total_parcelas,
                     **entidade_kw,
-                    arquivo_1=movimentacao.arquivo_1,
-                    arquivo_2=movimentacao.arquivo_2,
+                    # Mesmo blob da movimentação em todas as parcelas (só o nome é copiado)
+                    arquivo_1=compartilhar_arquivo(movimentacao.arquivo_1),
+                    arquivo_2=compartilhar_arquivo(movimentacao.arquivo_2),
                     
                     # AQUI A MÁGICA ACONTECE: O financeiro nasce na empresa certa
                     empresa_id=empresa_id
@@ -1,3 +1,38 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .models import Produto, MovimentacaoEstoque
+from .services import baixar_estoque
+
+
+class BaixaEstoqueEmLoteTest(TestCase):
+    def setUp(self):
+        self.ssd = Produto.objects.create(nome='SSD', estoque_atual=5, preco_venda_sugerido=Decimal('250.00'))
+        self.cabo = Produto.objects.create(nome='Cabo', estoque_atual=3, preco_venda_sugerido=Decimal('19.90'))
+
+    def _saldos(self):
+        return dict(Produto.objects.values_list('nome', 'estoque_atual'))
+
+    def test_baixa_tudo_em_poucas_queries(self):
+        itens = [(self.ssd.pk, 2), (self.cabo.pk, 1), (self.ssd.pk, 1)]
+        with CaptureQueriesContext(connection) as ctx:
+            movimentacoes = baixar_estoque(itens, observacao='Baixa teste')
+
+        queries = [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(queries), 3)  # trava + UPDATE com F() + bulk_create
+        self.assertEqual(self._saldos(), {'SSD': Decimal('2.00'), 'Cabo': Decimal('2.00')})
+        self.assertEqual(len(movimentacoes), 2)
+        self.assertEqual(
+            MovimentacaoEstoque.objects.get(produto=self.ssd).quantidade, Decimal('3.00')
+        )
+
+    def test_falta_em_um_item_nao_baixa_nenhum(self):
+        with self.assertRaisesMessage(ValidationError, "'Cabo' (necessário: 4"):
+            baixar_estoque([(self.ssd.pk, 1), (self.cabo.pk, 4)], observacao='Baixa teste')
 
-# Create your tests here.
+        self.assertEqual(self._saldos(), {'SSD': Decimal('5.00'), 'Cabo': Decimal('3.00')})
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
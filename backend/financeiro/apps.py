@@ -1,4 +1,7 @@
 from django.apps import AppConfig
 class FinanceiroConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'financeiro'
\ No newline at end of file
+    name = 'financeiro'
+
+    def ready(self):
+        import financeiro.signals
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:10
+
+import utils.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0002_lancamento_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lancamentofinanceiro',
+            name='arquivo_1',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='financeiro/comprovantes/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='lancamentofinanceiro',
+            name='arquivo_2',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='financeiro/comprovantes/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='lancamentofinanceiro',
+            name='comprovante',
+            field=models.FileField(blank=True, null=True, storage=utils.armazenamento.ArmazenamentoPorConteudo(), upload_to='financeiro/comprovantes/%Y/%m/'),
+        ),
+    ]
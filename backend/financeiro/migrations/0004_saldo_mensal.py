@@ -0,0 +1,30 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_tarefapdf_duracao'),
+        ('financeiro', '0003_arquivos_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+            ],
+            options={
+                'db_table': 'TB_SALDO_MENSAL',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('empresa__isnull', False)), fields=('empresa', 'ano', 'mes'), name='uniq_saldo_mensal_empresa'), models.UniqueConstraint(condition=models.Q(('empresa__isnull', True)), fields=('ano', 'mes'), name='uniq_saldo_mensal_consolidado')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_ultima_atividade_em'),
+        ('core', '0005_tarefapdf_duracao'),
+        ('equipe', '0002_variantes_imagens'),
+        ('estoque', '0002_arquivos_por_conteudo'),
+        ('financeiro', '0004_saldo_mensal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(fields=['empresa', 'data_vencimento', 'status', 'tipo_lancamento'], name='idx_lancamento_empresa_venc'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofinanceiro',
+            index=models.Index(fields=['cliente', 'categoria', 'data_vencimento'], name='idx_lancamento_cliente_cat'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from utils.armazenamento import armazenamento_conteudo
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
@@ -75,9 +76,9 @@ class LancamentoFinanceiro(TimeStampedModel):
     observacao = models.TextField(blank=True, null=True)
     
     # Arquivos
-    arquivo_1 = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', null=True, blank=True)
-    arquivo_2 = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', null=True, blank=True)
-    comprovante = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', null=True, blank=True)
+    arquivo_1 = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', storage=armazenamento_conteudo, null=True, blank=True)
+    arquivo_2 = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', storage=armazenamento_conteudo, null=True, blank=True)
+    comprovante = models.FileField(upload_to='financeiro/comprovantes/%Y/%m/', storage=armazenamento_conteudo, null=True, blank=True)
 
     # Parcelamento
     forma_pagamento = models.CharField(max_length=20, choices=FORMA_PAGAMENTO_CHOICES, default='DINHEIRO')
@@ -89,6 +90,14 @@ class LancamentoFinanceiro(TimeStampedModel):
         db_table = 'TB_LANCAMENTO_FINANCEIRO'
         verbose_name = 'Lançamento Financeiro'
         ordering = ['-data_vencimento']
+        indexes = [
+            # Paginação por cursor (utils.pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='idx_lancamento_keyset'),
+            # Dashboard (mês por faixa de data_vencimento) e saldo depois do último SaldoMensal
+            models.Index(fields=['empresa', 'data_vencimento', 'status', 'tipo_lancamento'], name='idx_lancamento_empresa_venc'),
+            # Mensalidade já gerada no mês? (gerar_faturas_mensalidade)
+            models.Index(fields=['cliente', 'categoria', 'data_vencimento'], name='idx_lancamento_cliente_cat'),
+        ]
 
     def clean(self):
         # Passamos a empresa para validar o fechamento correto
@@ -141,4 +150,27 @@ class FechamentoFinanceiro(models.Model):
     class Meta: 
         db_table = 'TB_FECHAMENTO_FINANCEIRO'
         # Agora o unique together inclui a empresa
-        unique_together = ('ano', 'mes', 'empresa')
\ No newline at end of file
+        unique_together = ('ano', 'mes', 'empresa')
+
+class SaldoMensal(models.Model):
+    """
+    Saldo de caixa acumulado até o fim do mês: lançamentos PAGO (entradas - saídas)
+    com vencimento até o último dia do mês. empresa=None é o consolidado (todos os lançamentos).
+    Gravado ao fechar o mês (FechamentoFinanceiro) e por financeiro.tasks.atualizar_saldos_mensais;
+    alterar um lançamento pago apaga os saldos daquele mês em diante (financeiro.signals).
+    """
+    empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, null=True, blank=True)
+    ano = models.PositiveIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    saldo = models.DecimalField(max_digits=14, decimal_places=2)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'TB_SALDO_MENSAL'
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'ano', 'mes'], condition=models.Q(empresa__isnull=False), name='uniq_saldo_mensal_empresa'),
+            models.UniqueConstraint(fields=['ano', 'mes'], condition=models.Q(empresa__isnull=True), name='uniq_saldo_mensal_consolidado'),
+        ]
+
+    def __str__(self):
+        return f"Saldo {self.mes:02d}/{self.ano} ({self.empresa or 'Consolidado'}): {self.saldo}"
@@ -1,15 +1,150 @@
+from django.db import connection, transaction
 from django.db.models import Sum, Count, Q
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from django.apps import apps
 import datetime
 import calendar
-from .models import LancamentoFinanceiro
+import logging
+from django.core.cache import cache
+from .models import LancamentoFinanceiro, SaldoMensal
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# SALDO ACUMULADO (último SaldoMensal + movimento depois dele)
+# ==========================================================
+def _fim_do_mes(ano, mes):
+    return datetime.date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+
+def _intervalo_mes(ano, mes):
+    """[primeiro dia do mês, primeiro dia do mês seguinte): filtro por faixa usa os índices de data_vencimento."""
+    inicio = datetime.date(ano, mes, 1)
+    fim = datetime.date(ano + 1, 1, 1) if mes == 12 else datetime.date(ano, mes + 1, 1)
+    return inicio, fim
+
+
+def _saldos_do_escopo(empresa_id):
+    # empresa_id=None: consolidado
+    return SaldoMensal.objects.filter(empresa_id=empresa_id) if empresa_id else SaldoMensal.objects.filter(empresa__isnull=True)
+
+
+def _movimento_pago(**filtros):
+    mov = LancamentoFinanceiro.objects.filter(status='PAGO', **filtros).aggregate(
+        entradas=Sum('valor', filter=Q(tipo_lancamento='ENTRADA')),
+        saidas=Sum('valor', filter=Q(tipo_lancamento='SAIDA')),
+    )
+    return (mov['entradas'] or 0) - (mov['saidas'] or 0)
+
+
+def calcular_saldo_acumulado(empresa_id=None):
+    """Saldo de caixa (todos os PAGO): duas queries, qualquer que seja o tamanho do histórico."""
+    filtros = {'empresa_id': empresa_id} if empresa_id else {}
+    ultimo = _saldos_do_escopo(empresa_id).order_by('-ano', '-mes').first()
+    if not ultimo:
+        return _movimento_pago(**filtros)
+    return ultimo.saldo + _movimento_pago(data_vencimento__gt=_fim_do_mes(ultimo.ano, ultimo.mes), **filtros)
+
+
+def _travar_saldos_mensais():
+    # Regravação e invalidação dos snapshots em série: sem isso um atualizar_saldo_mensal
+    # que leu o razão antes de uma baixa regrava o mês depois do delete da invalidação.
+    # Uma trava só (e não por empresa/mês): toda invalidação apaga também o consolidado
+    # de vários meses, e travas por fatia tomadas em ordens diferentes dariam deadlock.
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('financeiro:saldo_mensal'))")
+
+
+@transaction.atomic
+def atualizar_saldo_mensal(ano, mes, empresa_id=None):
+    """(Re)grava o SaldoMensal do mês a partir do último anterior a ele (só soma o intervalo)."""
+    _travar_saldos_mensais()  # antes das leituras: quem esperou lê o razão já com a baixa
+    filtros = {'empresa_id': empresa_id} if empresa_id else {}
+    anterior = _saldos_do_escopo(empresa_id).filter(
+        Q(ano__lt=ano) | Q(ano=ano, mes__lt=mes)
+    ).order_by('-ano', '-mes').first()
+
+    saldo = 0
+    if anterior:
+        saldo = anterior.saldo
+        filtros['data_vencimento__gt'] = _fim_do_mes(anterior.ano, anterior.mes)
+    saldo += _movimento_pago(data_vencimento__lte=_fim_do_mes(ano, mes), **filtros)
+
+    SaldoMensal.objects.update_or_create(
+        empresa_id=empresa_id or None, ano=ano, mes=mes, defaults={'saldo': saldo}
+    )
+    return saldo
+
+
+@transaction.atomic
+def invalidar_saldos_mensais(empresa_id, data):
+    """Lançamento pago do mês de `data` mudou: descarta os saldos da empresa e do consolidado dali em diante."""
+    _travar_saldos_mensais()
+    escopo = Q(empresa__isnull=True)
+    if empresa_id:
+        escopo |= Q(empresa_id=empresa_id)
+    SaldoMensal.objects.filter(escopo).filter(
+        Q(ano__gt=data.year) | Q(ano=data.year, mes__gte=data.month)
+    ).delete()
+
+
+def baixar_lancamentos_em_lote(ids):
+    """Marca os lançamentos como PAGO num UPDATE (sem signals: invalida saldos e dashboard aqui)."""
+    qs = LancamentoFinanceiro.objects.filter(id__in=ids)
+    meses = set(
+        qs.annotate(mes=TruncMonth('data_vencimento')).values_list('empresa_id', 'mes').distinct()
+    )
+    desde = {}
+    for empresa_id, mes in meses:
+        desde[empresa_id] = min(mes, desde.get(empresa_id, mes))
+    for empresa_id, data in desde.items():
+        invalidar_saldos_mensais(empresa_id, data)
+
+    total = qs.update(status='PAGO', data_pagamento=timezone.now().date())
+    transaction.on_commit(lambda: invalidar_estatisticas_financeiras(
+        (empresa_id, mes.year, mes.month) for empresa_id, mes in meses
+    ))
+    return total
+
+
+# ==========================================================
+# DASHBOARD FINANCEIRO (cache por empresa/ano/mês)
+# ==========================================================
+CACHE_ESTATISTICAS = 'financeiro:estatisticas:{}:{}:{}'
+CACHE_ESTATISTICAS_TIMEOUT = 60 * 60  # rede de segurança (ex.: cliente renomeado); a invalidação é feita pelos signals
+
+
+def _chave_estatisticas(empresa_id, ano, mes):
+    return CACHE_ESTATISTICAS.format(empresa_id or 'todas', ano, mes)
+
+
+def invalidar_estatisticas_financeiras(meses):
+    """meses: pares (empresa_id, ano, mes) alterados; o consolidado ('todas') do mês cai junto."""
+    chaves = set()
+    for empresa_id, ano, mes in meses:
+        chaves.add(_chave_estatisticas(empresa_id, ano, mes))
+        chaves.add(_chave_estatisticas(None, ano, mes))
+    if not chaves:
+        return
+    try:
+        cache.delete_many(list(chaves))
+    except Exception as erro:
+        # Roda após o commit: não derruba a gravação; o TTL limita o dado velho
+        logger.warning(f"Cache do dashboard financeiro não invalidado: {erro}")
+
 
 def calcular_estatisticas_financeiras(mes=None, ano=None, empresa_id=None):
-    Chamado = apps.get_model('chamados', 'Chamado') # Lazy load
+    """
+    KPIs do dashboard. A parte do mês vem do cache (invalidada por financeiro.signals);
+    saldo e contratos ativos não dependem do mês e são lidos na hora (baratos).
+    """
     Cliente = apps.get_model('clientes', 'Cliente')
-    
-    hoje = timezone.now().date()
+
+    hoje = timezone.localdate()
     
     if not mes or not ano:
         mes = hoje.month
@@ -18,96 +153,104 @@ def calcular_estatisticas_financeiras(mes=None, ano=None, empresa_id=None):
     mes = int(mes)
     ano = int(ano)
 
+    chave = _chave_estatisticas(empresa_id, ano, mes)
+    try:
+        dados_mes = cache.get(chave)
+    except Exception as erro:
+        logger.warning(f"Cache do dashboard financeiro indisponível: {erro}")
+        dados_mes = None
+    if dados_mes is None:
+        dados_mes = _estatisticas_do_mes(mes, ano, empresa_id)
+        try:
+            cache.set(chave, dados_mes, CACHE_ESTATISTICAS_TIMEOUT)
+        except Exception as erro:
+            logger.warning(f"Cache do dashboard financeiro não gravado: {erro}")
+
+    # Contratos Ativos (Se o cliente tiver vínculo com empresa no futuro, filtrar aqui tb)
+    contratos_ativos = Cliente.objects.filter(tipo_cliente='CONTRATO', ativo=True).count()
+
+    return {
+        # Saldo global (respeitando a empresa): último SaldoMensal + delta
+        "saldo": float(calcular_saldo_acumulado(empresa_id)),
+        "contratosAtivos": contratos_ativos,
+        **dados_mes,
+    }
+
+
+def _estatisticas_do_mes(mes, ano, empresa_id=None):
+    from chamados.services import intervalo_mes
+    Chamado = apps.get_model('chamados', 'Chamado') # Lazy load
+
     # === FILTRO BASE (FINANCEIRO) ===
     filtros_fin = {}
     if empresa_id:
         filtros_fin['empresa_id'] = empresa_id
 
     # ==========================================================
-    # 1. SALDO GLOBAL (Respeitando a empresa)
-    # ==========================================================
-    global_entradas = LancamentoFinanceiro.objects.filter(
-        tipo_lancamento='ENTRADA', status='PAGO', **filtros_fin
-    ).aggregate(t=Sum('valor'))['t'] or 0
-    
-    global_saidas = LancamentoFinanceiro.objects.filter(
-        tipo_lancamento='SAIDA', status='PAGO', **filtros_fin
-    ).aggregate(t=Sum('valor'))['t'] or 0
-    
-    saldo_acumulado = float(global_entradas) - float(global_saidas)
-
-    # ==========================================================
-    # 2. ESTATÍSTICAS DO MÊS
+    # 1. ESTATÍSTICAS DO MÊS
     # ==========================================================
+    inicio_mes, fim_mes = _intervalo_mes(ano, mes)
     qs_mes = LancamentoFinanceiro.objects.filter(
-        data_vencimento__month=mes, 
-        data_vencimento__year=ano,
+        data_vencimento__gte=inicio_mes,
+        data_vencimento__lt=fim_mes,
         **filtros_fin
     )
     
-    stats_fin = qs_mes.filter(status='PAGO').aggregate(
-        receita_periodo=Sum('valor', filter=Q(tipo_lancamento='ENTRADA')), 
-        despesa_periodo=Sum('valor', filter=Q(tipo_lancamento='SAIDA')),
-        receita_contrato=Sum('valor', filter=Q(tipo_lancamento='ENTRADA', categoria='CONTRATO')),
-        receita_avulsa=Sum('valor', filter=Q(tipo_lancamento='ENTRADA', categoria='SERVICO')),
-        receita_hardware=Sum('valor', filter=Q(tipo_lancamento='ENTRADA', categoria='VENDA')),
+    # Um único aggregate para o mês (pagos por tipo/categoria + inadimplência)
+    stats_fin = qs_mes.aggregate(
+        receita_periodo=Sum('valor', filter=Q(status='PAGO', tipo_lancamento='ENTRADA')), 
+        despesa_periodo=Sum('valor', filter=Q(status='PAGO', tipo_lancamento='SAIDA')),
+        receita_contrato=Sum('valor', filter=Q(status='PAGO', tipo_lancamento='ENTRADA', categoria='CONTRATO')),
+        receita_avulsa=Sum('valor', filter=Q(status='PAGO', tipo_lancamento='ENTRADA', categoria='SERVICO')),
+        receita_hardware=Sum('valor', filter=Q(status='PAGO', tipo_lancamento='ENTRADA', categoria='VENDA')),
+        inadimplencia=Sum('valor', filter=Q(status='ATRASADO', tipo_lancamento='ENTRADA')),
     )
 
-    inadimplencia = qs_mes.filter(tipo_lancamento='ENTRADA', status='ATRASADO').aggregate(t=Sum('valor'))['t'] or 0
+    inadimplencia = stats_fin['inadimplencia'] or 0
 
     receita_periodo = float(stats_fin['receita_periodo'] or 0)
     despesa_periodo = float(stats_fin['despesa_periodo'] or 0)
     resultado_periodo = receita_periodo - despesa_periodo
 
     # ==========================================================
-    # 3. DADOS OPERACIONAIS (CHAMADOS)
+    # 2. DADOS OPERACIONAIS (CHAMADOS)
     # ==========================================================
     # IMPORTANTE: Filtrar chamados pela empresa também
     filtros_chamado = {'status': 'FINALIZADO'}
     if empresa_id:
         filtros_chamado['empresa_id'] = empresa_id
 
+    inicio_fechamento, fim_fechamento = intervalo_mes(ano, mes)
     qs_chamados_mes = Chamado.objects.filter(
-        data_fechamento__month=mes, 
-        data_fechamento__year=ano,
+        data_fechamento__gte=inicio_fechamento,
+        data_fechamento__lt=fim_fechamento,
         **filtros_chamado
     )
 
     custo_transporte = qs_chamados_mes.aggregate(total=Sum('custo_transporte'))['total'] or 0
     
-    # Contratos Ativos (Se o cliente tiver vínculo com empresa no futuro, filtrar aqui tb)
-    contratos_ativos = Cliente.objects.filter(tipo_cliente='CONTRATO', ativo=True).count()
-
+    # Nome do cliente na própria query do agrupamento (sem um get por linha)
     raw_ranking = (
         qs_chamados_mes.filter(tipo_atendimento='VISITA')
-        .values('cliente')
+        .values('cliente', 'cliente__nome', 'cliente__razao_social')
         .annotate(qtd=Count('id'), custo=Sum('custo_transporte'))
         .order_by('-qtd')[:5]
     )
 
-    lista_ranking_processada = []
-    for item in raw_ranking:
-        cliente_id = item['cliente']
-        nome_exibicao = "Cliente Desconhecido"
-        if cliente_id:
-            try:
-                cli = Cliente.objects.get(id=cliente_id)
-                nome_exibicao = cli.nome if cli.nome else cli.razao_social
-            except: pass
-        
-        lista_ranking_processada.append({
-            "nome_cliente": nome_exibicao, 
+    lista_ranking_processada = [
+        {
+            "nome_cliente": item['cliente__nome'] or item['cliente__razao_social'] or "Cliente Desconhecido",
             "qtd": item['qtd'],
             "custo": float(item['custo'] or 0)
-        })
+        }
+        for item in raw_ranking
+    ]
 
     return {
-        "saldo": saldo_acumulado,
         "resultadoPeriodo": resultado_periodo,
         "receitaPeriodo": receita_periodo,
         "despesaPeriodo": despesa_periodo,
         "inadimplencia": float(inadimplencia),
-        "contratosAtivos": contratos_ativos,
         "custoTransporte": float(custo_transporte),
         "graficoReceita": [
             {"name": "Contratos", "value": float(stats_fin['receita_contrato'] or 0)},
@@ -130,14 +273,15 @@ def gerar_faturas_mensalidade(usuario_executou, empresa_id=None):
     
     gerados = 0
     erros = []
+    inicio_mes, fim_mes = _intervalo_mes(ano, mes)
     
     for cliente in clientes:
         # Verifica se já existe fatura deste cliente, neste mês, PARA ESTA EMPRESA (ou qualquer se None)
         filtro_duplicidade = {
             'cliente_id': cliente.id, 
             'categoria': 'CONTRATO',
-            'data_vencimento__month': mes, 
-            'data_vencimento__year': ano
+            'data_vencimento__gte': inicio_mes,
+            'data_vencimento__lt': fim_mes,
         }
         if empresa_id:
             filtro_duplicidade['empresa_id'] = empresa_id
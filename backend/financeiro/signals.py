@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_init
+from django.dispatch import receiver
+
+from chamados.models import Chamado
+from chamados.services import mes_local
+from .models import LancamentoFinanceiro, FechamentoFinanceiro
+from .services import invalidar_saldos_mensais, atualizar_saldo_mensal, invalidar_estatisticas_financeiras
+
+
+# =====================================================
+# SALDO MENSAL (snapshots do saldo acumulado)
+# =====================================================
+def _estado_saldo(instance):
+    # __dict__ para não disparar query em campos adiados (.only/.defer)
+    return {
+        campo: instance.__dict__.get(campo)
+        for campo in ('empresa_id', 'status', 'data_vencimento', 'valor', 'tipo_lancamento', 'categoria')
+    }
+
+
+@receiver(post_init, sender=LancamentoFinanceiro)
+def guardar_estado_saldo(sender, instance, **kwargs):
+    instance._estado_saldo = _estado_saldo(instance)
+
+
+def _invalidar(estado):
+    # Só lançamento pago entra no saldo
+    if estado and estado['status'] == 'PAGO' and estado['data_vencimento']:
+        invalidar_saldos_mensais(estado['empresa_id'], estado['data_vencimento'])
+
+
+@receiver(post_save, sender=LancamentoFinanceiro)
+def invalidar_saldos_lancamento_salvo(sender, instance, created, **kwargs):
+    antes = None if created else getattr(instance, '_estado_saldo', None)
+    depois = _estado_saldo(instance)
+    instance._estado_saldo = depois
+    if antes != depois:
+        _invalidar(antes)
+        _invalidar(depois)
+        _invalidar_dashboard([_mes_lancamento(antes), _mes_lancamento(depois)])
+
+
+@receiver(post_delete, sender=LancamentoFinanceiro)
+def invalidar_saldos_lancamento_removido(sender, instance, **kwargs):
+    estado = _estado_saldo(instance)
+    _invalidar(estado)
+    _invalidar_dashboard([_mes_lancamento(estado)])
+
+
+@receiver(post_save, sender=FechamentoFinanceiro)
+def gravar_saldo_do_fechamento(sender, instance, created, **kwargs):
+    if created:
+        if instance.empresa_id:
+            atualizar_saldo_mensal(instance.ano, instance.mes, instance.empresa_id)
+        atualizar_saldo_mensal(instance.ano, instance.mes)  # consolidado
+
+
+# =====================================================
+# DASHBOARD FINANCEIRO (cache por empresa/ano/mês)
+# =====================================================
+def _invalidar_dashboard(meses):
+    meses = {mes for mes in meses if mes}
+    if meses:
+        # Após o commit, para nenhuma leitura concorrente recolocar dados antigos no cache
+        transaction.on_commit(lambda: invalidar_estatisticas_financeiras(meses))
+
+
+def _mes_lancamento(estado):
+    if estado and estado['data_vencimento']:
+        return estado['empresa_id'], estado['data_vencimento'].year, estado['data_vencimento'].month
+
+
+def _mes_chamado(estado):
+    # Custo de transporte e ranking de visitas contam só chamados FINALIZADOS, pelo mês do fechamento
+    if estado and estado['status'] == 'FINALIZADO' and estado['data_fechamento']:
+        return (estado['empresa_id'], *mes_local(estado['data_fechamento']))
+
+
+def _estado_dashboard_chamado(instance):
+    return {
+        campo: instance.__dict__.get(campo)
+        for campo in ('empresa_id', 'status', 'data_fechamento', 'custo_transporte', 'tipo_atendimento', 'cliente_id')
+    }
+
+
+@receiver(post_init, sender=Chamado)
+def guardar_estado_dashboard_chamado(sender, instance, **kwargs):
+    instance._estado_dashboard = _estado_dashboard_chamado(instance)
+
+
+@receiver(post_save, sender=Chamado)
+def invalidar_dashboard_chamado_salvo(sender, instance, created, **kwargs):
+    antes = None if created else getattr(instance, '_estado_dashboard', None)
+    depois = _estado_dashboard_chamado(instance)
+    instance._estado_dashboard = depois
+    if antes != depois:
+        _invalidar_dashboard([_mes_chamado(antes), _mes_chamado(depois)])
+
+
+@receiver(post_delete, sender=Chamado)
+def invalidar_dashboard_chamado_removido(sender, instance, **kwargs):
+    _invalidar_dashboard([_mes_chamado(_estado_dashboard_chamado(instance))])
@@ -0,0 +1,19 @@
+from celery import shared_task
+from django.utils import timezone
+
+from core.models import Empresa
+from .services import atualizar_saldo_mensal
+
+
+@shared_task(ignore_result=True)
+def atualizar_saldos_mensais():
+    """
+    Regrava o SaldoMensal do mês anterior (cada empresa + consolidado), fechado ou não,
+    para o saldo do dashboard só somar o mês corrente. Agendar no beat (ex.: diariamente);
+    é incremental: parte do último saldo gravado.
+    """
+    hoje = timezone.localdate()
+    ano, mes = (hoje.year - 1, 12) if hoje.month == 1 else (hoje.year, hoje.month - 1)
+    for empresa_id in Empresa.objects.values_list('id', flat=True):
+        atualizar_saldo_mensal(ano, mes, empresa_id)
+    atualizar_saldo_mensal(ano, mes)
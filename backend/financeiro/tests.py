@@ -1,3 +1,213 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chamados.models import Chamado
+from clientes.models import Cliente
+from core.models import Empresa
+from .models import LancamentoFinanceiro, FechamentoFinanceiro, SaldoMensal
+from .services import (
+    calcular_saldo_acumulado, baixar_lancamentos_em_lote, calcular_estatisticas_financeiras, gerar_faturas_mensalidade,
+)
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'financeiro-testes'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SaldoMensalTest(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(razao_social='Empresa Teste', nome_fantasia='Empresa', cnpj='00000000000100')
+        self.outra = Empresa.objects.create(razao_social='Outra', nome_fantasia='Outra', cnpj='00000000000200')
+        self.gestor = User.objects.create_user(username='gestor', password='x')
+
+    def _lancamento(self, valor, data, tipo='ENTRADA', status='PAGO', empresa=None):
+        return LancamentoFinanceiro.objects.create(
+            descricao='L', valor=Decimal(valor), tipo_lancamento=tipo, status=status,
+            data_vencimento=data, empresa=empresa or self.empresa,
+        )
+
+    def test_fechamento_grava_saldo_e_dashboard_soma_so_o_delta(self):
+        self._lancamento('1000', datetime.date(2024, 1, 10))
+        self._lancamento('300', datetime.date(2024, 1, 20), tipo='SAIDA')
+        self._lancamento('50', datetime.date(2024, 1, 5), empresa=self.outra)
+        self._lancamento('999', datetime.date(2024, 1, 15), status='PENDENTE')
+        FechamentoFinanceiro.objects.create(empresa=self.empresa, ano=2024, mes=1, fechado_por=self.gestor)
+
+        saldo = SaldoMensal.objects.get(empresa=self.empresa, ano=2024, mes=1)
+        self.assertEqual(saldo.saldo, Decimal('700'))
+        self.assertEqual(SaldoMensal.objects.get(empresa__isnull=True, ano=2024, mes=1).saldo, Decimal('750'))
+
+        self._lancamento('200', datetime.date(2024, 2, 10))
+        with self.assertNumQueries(2):  # último saldo + movimento depois dele
+            self.assertEqual(calcular_saldo_acumulado(self.empresa.id), Decimal('900'))
+        self.assertEqual(calcular_saldo_acumulado(), Decimal('950'))
+
+    def test_lancamento_pago_no_periodo_invalida_os_saldos(self):
+        self._lancamento('1000', datetime.date(2024, 1, 10))
+        FechamentoFinanceiro.objects.create(empresa=self.empresa, ano=2024, mes=1, fechado_por=self.gestor)
+        FechamentoFinanceiro.objects.create(empresa=self.empresa, ano=2024, mes=2, fechado_por=self.gestor)
+        self.assertEqual(SaldoMensal.objects.count(), 4)
+
+        # Pendente não entra no saldo: não mexe nos snapshots
+        pendente = self._lancamento('80', datetime.date(2024, 3, 10), status='PENDENTE')
+        self.assertEqual(SaldoMensal.objects.count(), 4)
+
+        # Baixa em lote (UPDATE sem signals) de um lançamento de fevereiro... de outra empresa
+        fevereiro = self._lancamento('40', datetime.date(2024, 2, 10), status='PENDENTE', empresa=self.outra)
+        baixar_lancamentos_em_lote([fevereiro.id, pendente.id])
+        self.assertEqual(
+            set(SaldoMensal.objects.values_list('empresa_id', 'mes')),
+            {(self.empresa.id, 1), (self.empresa.id, 2), (None, 1)},  # consolidado perde fevereiro
+        )
+        self.assertEqual(calcular_saldo_acumulado(self.empresa.id), Decimal('1080'))
+        self.assertEqual(calcular_saldo_acumulado(), Decimal('1120'))
+
+    def test_trava_dos_saldos_vem_antes_das_leituras(self):
+        self._lancamento('1000', datetime.date(2024, 1, 10))
+        leituras_antes_da_trava = []
+
+        with CaptureQueriesContext(connection) as ctx, mock.patch(
+            'financeiro.services._travar_saldos_mensais',
+            side_effect=lambda: leituras_antes_da_trava.append(
+                [q['sql'] for q in ctx.captured_queries if 'TB_' in q['sql']]
+            ),
+        ):
+            FechamentoFinanceiro.objects.create(empresa=self.empresa, ano=2024, mes=1, fechado_por=self.gestor)
+            self._lancamento('10', datetime.date(2024, 2, 12))
+
+        # fechamento (empresa + consolidado) e a invalidação do lançamento pago
+        self.assertEqual(len(leituras_antes_da_trava), 3)
+        self.assertFalse([sql for sql in leituras_antes_da_trava[0] if 'TB_SALDO_MENSAL' in sql or 'SUM(' in sql])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class IndicesLancamentoTest(TestCase):
+    """As queries quentes do razão não podem cair em varredura completa de TB_LANCAMENTO_FINANCEIRO."""
+    TABELA = 'TB_LANCAMENTO_FINANCEIRO'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = [
+            Empresa.objects.create(razao_social=f'Empresa {i}', nome_fantasia=f'E{i}', cnpj=f'0000000000{i}00')
+            for i in range(3)
+        ]
+        clientes = [
+            Cliente.objects.create(
+                razao_social=f'Cliente {i}', nome=f'Cliente {i}', tipo_cliente='CONTRATO',
+                valor_contrato_mensal=Decimal('100'),
+            )
+            for i in range(10)
+        ]
+        # bulk_create: massa sem passar pelo save()/signals
+        LancamentoFinanceiro.objects.bulk_create([
+            LancamentoFinanceiro(
+                empresa=cls.empresas[i % 3], cliente=clientes[i % 10], descricao='L', valor=Decimal('10'),
+                tipo_lancamento='ENTRADA' if i % 2 else 'SAIDA', status='PAGO' if i % 3 else 'PENDENTE',
+                categoria='CONTRATO' if i % 4 else 'DESPESA',
+                data_vencimento=datetime.date(2022, 1, 1) + datetime.timedelta(days=i % 1000),
+            )
+            for i in range(3000)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def _plano(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Sem seq scan "por ser barato" na massa pequena: só cai nele se não houver índice usável
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute('ANALYZE')
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(linha[-1]) for linha in cursor.fetchall())
+
+    def _queries_do_razao(self, funcao, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            funcao(*args)
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and f'FROM "{self.TABELA}"' in q['sql']
+        ]
+
+    def assertSemSeqScan(self, sqls):
+        self.assertTrue(sqls)
+        for sql in sqls:
+            plano = self._plano(sql)
+            self.assertNotRegex(plano, rf'Seq Scan on "?{self.TABELA}|SCAN {self.TABELA}(?! USING)', f'{sql}\n{plano}')
+            # Faixa de data resolvida no índice (EXTRACT de __month ficaria de fora)
+            self.assertRegex(plano, r'(Index Cond|USING (COVERING )?INDEX).*data_vencimento', f'{sql}\n{plano}')
+
+    def test_dashboard_da_empresa_usa_indice(self):
+        FechamentoFinanceiro.objects.create(empresa=self.empresas[0], ano=2023, mes=6)
+        self.assertSemSeqScan(self._queries_do_razao(calcular_estatisticas_financeiras, 3, 2023, self.empresas[0].id))
+
+    def test_verificacao_de_mensalidade_usa_indice(self):
+        self.assertSemSeqScan(self._queries_do_razao(gerar_faturas_mensalidade, None, self.empresas[1].id))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardFinanceiroCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(razao_social='Empresa Teste', nome_fantasia='Empresa', cnpj='00000000000100')
+        self.cliente = Cliente.objects.create(razao_social='Cliente Razão', nome='')
+        self.hoje = datetime.date.today()
+
+    def _lancamento(self, valor, data):
+        return LancamentoFinanceiro.objects.create(
+            descricao='L', valor=Decimal(valor), tipo_lancamento='ENTRADA', status='PAGO',
+            data_vencimento=data, empresa=self.empresa,
+        )
+
+    def _estatisticas(self, data):
+        return calcular_estatisticas_financeiras(data.month, data.year, str(self.empresa.id))
+
+    def test_cache_por_mes_invalidado_so_no_mes_alterado(self):
+        mes_passado = self.hoje.replace(day=1) - datetime.timedelta(days=1)
+        lancamento = self._lancamento('100', self.hoje)
+        self._lancamento('40', mes_passado)
+        self.assertEqual(self._estatisticas(self.hoje)['receitaPeriodo'], 100)
+        self.assertEqual(self._estatisticas(mes_passado)['receitaPeriodo'], 40)
+
+        with self.assertNumQueries(3):  # só saldo (2) e contratos ativos: o mês veio do cache
+            dados = self._estatisticas(self.hoje)
+        self.assertEqual(dados['saldo'], 140)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lancamento.valor = Decimal('250')
+            lancamento.save()
+        self.assertEqual(self._estatisticas(self.hoje)['receitaPeriodo'], 250)
+        with self.assertNumQueries(3):  # mês passado não foi tocado
+            self.assertEqual(self._estatisticas(mes_passado)['saldo'], 290)
+
+    def test_chamado_finalizado_invalida_e_ranking_resolve_nomes_na_query(self):
+        self.assertEqual(self._estatisticas(self.hoje)['rankingVisitas'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Chamado.objects.create(
+                cliente=self.cliente, empresa=self.empresa, descricao_detalhada='x', status='FINALIZADO',
+                tipo_atendimento='VISITA', custo_ida=Decimal('20'), data_fechamento=timezone.now(),
+            )
+
+        with self.assertNumQueries(6):  # aggregate do razão + custo + ranking (com nomes) + saldo + contratos
+            dados = self._estatisticas(self.hoje)
+        self.assertEqual(dados['custoTransporte'], 20)
+        self.assertEqual(dados['rankingVisitas'], [{'nome_cliente': 'Cliente Razão', 'qtd': 1, 'custo': 20.0}])
+
+    def test_cache_fora_do_ar_nao_derruba_gravacao_nem_dashboard(self):
+        fora_do_ar = mock.Mock(**{
+            f'{metodo}.side_effect': ConnectionError('redis indisponível') for metodo in ('get', 'set', 'delete_many')
+        })
+        with mock.patch('financeiro.services.cache', fora_do_ar):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._lancamento('100', self.hoje)
+            self.assertEqual(self._estatisticas(self.hoje)['receitaPeriodo'], 100)  # calculado na hora
@@ -9,8 +9,9 @@ import calendar
 from .models import LancamentoFinanceiro, DespesaRecorrente
 from .serializers import LancamentoFinanceiroSerializer, DespesaRecorrenteSerializer
 # Importamos a função de cálculo corrigida
-from .services import gerar_faturas_mensalidade, calcular_estatisticas_financeiras
+from .services import gerar_faturas_mensalidade, calcular_estatisticas_financeiras, baixar_lancamentos_em_lote
 from equipe.permissions import IsGestor
+from utils.pagination import KeysetPagination
 
 
 def add_months(sourcedate, months):
@@ -24,6 +25,7 @@ class LancamentoFinanceiroViewSet(viewsets.ModelViewSet):
     queryset = LancamentoFinanceiro.objects.all().select_related('cliente', 'empresa') # Otimizado
     serializer_class = LancamentoFinanceiroSerializer
     permission_classes = [IsGestor]
+    pagination_class = KeysetPagination  # opt-in: ?paginacao=cursor
 
     def get_queryset(self):
         """ Filtra os lançamentos pela empresa selecionada no Frontend """
@@ -100,8 +102,8 @@ class LancamentoFinanceiroViewSet(viewsets.ModelViewSet):
         mes = request.query_params.get('mes', hoje.month)
         ano = request.query_params.get('ano', hoje.year)
         
-        # Chama a inteligência centralizada no services.py
-        dados = calcular_estatisticas_financeiras(mes, ano)
+        # Chama a inteligência centralizada no services.py (em cache por empresa/ano/mês)
+        dados = calcular_estatisticas_financeiras(mes, ano, request.query_params.get('empresa'))
         
         return Response(dados)
 
@@ -112,10 +114,7 @@ class LancamentoFinanceiroViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='baixar-lote')
     def baixar_lote(self, request):
         ids = request.data.get('ids', [])
-        LancamentoFinanceiro.objects.filter(id__in=ids).update(
-            status='PAGO', 
-            data_pagamento=timezone.now().date()
-        )
+        baixar_lancamentos_em_lote(ids)
         return Response({'mensagem': 'Lançamentos baixados com sucesso!'})
 
     @action(detail=False, methods=['post'], url_path='processar-recorrencias')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import OrdemServico, ItemServico, AnexoServico, Notificacao, ComentarioOrdemServico
+from .models import OrdemServico, ItemServico, AnexoServico, Notificacao, NotificacaoPendente, ComentarioOrdemServico
 
 # --- INLINES (Tabelas dentro da OS) ---
 
@@ -96,4 +96,11 @@ class NotificacaoAdmin(admin.ModelAdmin):
     list_display = ('titulo', 'destinatario', 'tipo', 'lida', 'data_criacao')
     list_filter = ('tipo', 'lida', 'data_criacao')
     search_fields = ('titulo', 'mensagem', 'destinatario__username')
-    readonly_fields = ('data_criacao',)
\ No newline at end of file
+    readonly_fields = ('data_criacao',)
+
+
+@admin.register(NotificacaoPendente)
+class NotificacaoPendenteAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'link', 'incluir_gestores', 'criado_em', 'processado_em')
+    list_filter = ('processado_em',)
+    readonly_fields = ('criado_em', 'processado_em')
@@ -1,26 +1,176 @@
 import json
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils.comentarios import grupo_comentarios
+from .services import (
+    registrar_conexao, registrar_desconexao, renovar_presenca, notificacoes_para_reenvio, contar_nao_lidas,
+)
+from .signals import _payload_notificacao
+
+
+def _usuario_do_token(token):
+    """Usuário ativo dono do JWT (mesmo do REST), ou None."""
+    try:
+        user_id = AccessToken(token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    return get_user_model().objects.filter(pk=user_id, is_active=True).select_related('equipe').first()
+
+
+def _pode_ver_comentarios(usuario, tipo, objeto_id):
+    """Mesma regra das actions de comentários: chamado para autenticados, OS só para a equipe."""
+    from chamados.models import Chamado
+    from .models import OrdemServico
+
+    if tipo == 'os':
+        if not (usuario.is_superuser or hasattr(usuario, 'equipe')):
+            return False
+        return OrdemServico.objects.filter(pk=objeto_id).exists()
+    return Chamado.objects.filter(pk=objeto_id).exists()
+
 
 class NotificacaoConsumer(AsyncWebsocketConsumer):
+    """
+    Canal de notificações do usuário (grupo user_<id>). Frames do cliente (JSON):
+
+    {"token": "<JWT>", "ultimo_id": <último recebido>}
+        reconexão: reenvia o que foi criado nesse meio tempo (só com token válido
+        do próprio usuário; vai no frame, não na URL, para não cair nos logs de acesso)
+    {"tipo": "ping"}
+        mantém a presença (qualquer frame renova, ver services.renovar_presenca);
+        responde {"tipo": "pong"}
+    """
+
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.group_name = f'user_{self.user_id}'
 
+        # Entra no grupo antes de qualquer reenvio: nada criado no meio se perde
+        # (pode chegar repetido; o front descarta pelo id)
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
 
         await self.accept()
+        await database_sync_to_async(registrar_conexao)(self.user_id)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
+        await database_sync_to_async(registrar_desconexao)(self.user_id)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        await database_sync_to_async(renovar_presenca)(self.user_id)
+        try:
+            dados = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        if not isinstance(dados, dict):
+            return
+        if dados.get('tipo') == 'ping':
+            await self.send(text_data=json.dumps({'tipo': 'pong'}))
+        elif dados.get('token'):
+            await self.reenviar_pendentes(dados['token'], str(dados.get('ultimo_id', '')))
+
+    async def reenviar_pendentes(self, token, ultimo_id):
+        if not ultimo_id.isdigit() or not await database_sync_to_async(self._token_valido)(token):
+            return
+
+        mensagens, nao_lidas = await database_sync_to_async(self._buscar_reenvio)(int(ultimo_id))
+        # Mesmo formato de frame do envio em tempo real
+        for message in mensagens:
+            await self.send(text_data=json.dumps({
+                'message': message,
+                'nao_lidas': nao_lidas,
+            }))
+
+    def _token_valido(self, token):
+        usuario = _usuario_do_token(token) if isinstance(token, str) else None
+        return usuario is not None and str(usuario.pk) == str(self.user_id)
+
+    def _buscar_reenvio(self, ultimo_id):
+        notificacoes = notificacoes_para_reenvio(self.user_id, ultimo_id)
+        if not notificacoes:
+            return [], None
+        return [_payload_notificacao(n) for n in notificacoes], contar_nao_lidas(self.user_id)
 
     async def send_notification(self, event):
         message = event['message']
         await self.send(text_data=json.dumps({
-            'message': message
+            'message': message,
+            'nao_lidas': event.get('nao_lidas'),
+        }))
+
+    async def send_notifications(self, event):
+        # Lote da outbox (servicos.tasks.processar_notificacoes_pendentes):
+        # mesmo formato de frame do envio individual
+        for message in event['messages']:
+            await self.send(text_data=json.dumps({
+                'message': message,
+                'nao_lidas': event.get('nao_lidas'),
+            }))
+
+    async def pdf_pronto(self, event):
+        # Fim de uma TarefaPDF (core.tasks.renderizar_pdf)
+        await self.send(text_data=json.dumps({
+            'pdf': event['tarefa']
+        }))
+
+
+class ComentariosConsumer(AsyncWebsocketConsumer):
+    """
+    Comentários novos de um chamado/OS em tempo real (tela de detalhes aberta).
+    O primeiro frame autentica: {"token": "<JWT>"}. Só depois de validar o token
+    e a permissão sobre o chamado/OS o socket entra no grupo e recebe
+    {"autenticado": true}; senão fecha (4403).
+    """
+    group_name = None
+
+    async def connect(self):
+        self.tipo = self.scope['url_route']['kwargs']['tipo']
+        self.objeto_id = self.scope['url_route']['kwargs']['objeto_id']
+        await self.accept()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.group_name:
+            return
+        try:
+            token = json.loads(text_data or '{}').get('token', '')
+        except (ValueError, AttributeError):
+            token = ''
+        if not await database_sync_to_async(self._autorizado)(token):
+            await self.close(code=4403)
+            return
+
+        self.group_name = grupo_comentarios(self.tipo, self.objeto_id)
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.send(text_data=json.dumps({'autenticado': True}))
+
+    def _autorizado(self, token):
+        usuario = _usuario_do_token(token) if isinstance(token, str) else None
+        return usuario is not None and _pode_ver_comentarios(usuario, self.tipo, self.objeto_id)
+
+    async def disconnect(self, close_code):
+        if not self.group_name:
+            return
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    async def novo_comentario(self, event):
+        await self.send(text_data=json.dumps({
+            'comentario': event['comentario']
         }))
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from servicos.models import OrdemServico, ItemServico
+
+
+class Command(BaseCommand):
+    help = 'Confere total_pecas/valor_total_geral persistidos da OS contra a soma real dos itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help='Grava os valores corretos nas OS divergentes')
+
+    def handle(self, *args, **options):
+        soma = ItemServico.objects.filter(os_id=OuterRef('pk')).values('os_id').annotate(
+            total=Sum(F('quantidade') * F('preco_venda'))
+        ).values('total')
+        decimal = DecimalField(max_digits=12, decimal_places=2)
+
+        divergentes = OrdemServico.objects.annotate(
+            pecas_real=Coalesce(Subquery(soma), Value(Decimal('0.00')), output_field=decimal),
+        ).annotate(
+            geral_real=F('pecas_real') + F('valor_mao_de_obra') - F('desconto'),
+        ).filter(
+            ~Q(total_pecas=F('pecas_real')) | ~Q(valor_total_geral=F('geral_real'))
+        ).values_list('id', 'total_pecas', 'pecas_real', 'valor_total_geral', 'geral_real')
+
+        total = 0
+        with transaction.atomic():
+            for os_id, pecas, pecas_real, geral, geral_real in divergentes:
+                total += 1
+                self.stdout.write(
+                    f"  -> OS #{os_id}: peças {pecas} != {pecas_real} | total {geral} != {geral_real}"
+                )
+                if options['corrigir']:
+                    OrdemServico.objects.filter(pk=os_id).update(total_pecas=pecas_real, valor_total_geral=geral_real)
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Totais de todas as OS conferem.'))
+        elif options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f'{total} OS corrigida(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{total} OS divergente(s). Rode com --corrigir para ajustar.'))
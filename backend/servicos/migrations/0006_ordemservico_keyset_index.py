@@ -0,0 +1,21 @@
+# Generated by Django 6.0.3 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_emailgestao'),
+        ('core', '0001_initial'),
+        ('equipe', '0001_initial'),
+        ('infra', '0001_initial'),
+        ('servicos', '0005_ordemservico_arquivo_orcamento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['-created_at', '-id'], name='idx_os_keyset'),
+        ),
+    ]
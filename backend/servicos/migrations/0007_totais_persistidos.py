@@ -0,0 +1,39 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:15
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_totais(apps, schema_editor):
+    OrdemServico = apps.get_model('servicos', 'OrdemServico')
+    ItemServico = apps.get_model('servicos', 'ItemServico')
+    soma = ItemServico.objects.filter(os_id=OuterRef('pk')).values('os_id').annotate(
+        total=Sum(F('quantidade') * F('preco_venda'))
+    ).values('total')
+    pecas = Coalesce(Subquery(soma), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2))
+    OrdemServico.objects.update(total_pecas=pecas)
+    OrdemServico.objects.update(valor_total_geral=F('total_pecas') + F('valor_mao_de_obra') - F('desconto'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0006_ordemservico_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordemservico',
+            name='total_pecas',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ordemservico',
+            name='valor_total_geral',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0007_totais_persistidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=100)),
+                ('mensagem', models.TextField()),
+                ('tipo', models.CharField(choices=[('VISITA', 'Visita Técnica'), ('CHURN', 'Risco de Cancelamento'), ('SISTEMA', 'Sistema')], default='SISTEMA', max_length=20)),
+                ('link', models.CharField(blank=True, max_length=200, null=True)),
+                ('destinatarios', models.JSONField(blank=True, default=list, help_text='IDs de usuário')),
+                ('incluir_gestores', models.BooleanField(default=False, help_text='Gestores/sócios ativos, resolvidos no processamento')),
+                ('unica', models.BooleanField(default=False, help_text='Ignorar se já existe notificação com o mesmo link e título')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Notificação Pendente',
+                'verbose_name_plural': 'Notificações Pendentes',
+                'db_table': 'TB_NOTIFICACAO_PENDENTE',
+                'indexes': [models.Index(condition=models.Q(('processado_em__isnull', True)), fields=['id'], name='idx_notificacao_outbox')],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_chaves(apps, schema_editor):
+    """
+    Dá chave às notificações antigas que já eram deduplicadas por texto
+    (churn por cliente, chamado finalizado), para não serem reenviadas.
+    Só a mais recente de cada (destinatário, chave) recebe a chave.
+    """
+    Notificacao = apps.get_model('servicos', 'Notificacao')
+    regras = [
+        ({'tipo': 'CHURN', 'link__startswith': '/clientes/'}, '/clientes/', 'churn'),
+        ({'titulo': 'Chamado Finalizado', 'link__startswith': '/chamados/'}, '/chamados/', 'chamado_finalizado'),
+    ]
+    for filtro, prefixo, nome in regras:
+        vistos = set()
+        atualizar = []
+        for notificacao in Notificacao.objects.filter(**filtro).order_by('-data_criacao', '-id').only('id', 'destinatario_id', 'link').iterator():
+            objeto_id = notificacao.link[len(prefixo):].strip('/')
+            if not objeto_id.isdigit():
+                continue
+            chave = f"{nome}:{objeto_id}"
+            if (notificacao.destinatario_id, chave) in vistos:
+                continue
+            vistos.add((notificacao.destinatario_id, chave))
+            notificacao.chave_deduplicacao = chave
+            atualizar.append(notificacao)
+        Notificacao.objects.bulk_update(atualizar, ['chave_deduplicacao'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0008_notificacao_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoArquivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notificacao_id', models.BigIntegerField()),
+                ('destinatario_id', models.BigIntegerField(db_index=True)),
+                ('titulo', models.CharField(max_length=100)),
+                ('mensagem', models.TextField()),
+                ('tipo', models.CharField(max_length=20)),
+                ('link', models.CharField(blank=True, max_length=200, null=True)),
+                ('data_criacao', models.DateTimeField()),
+                ('arquivada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notificação Arquivada',
+                'verbose_name_plural': 'Notificações Arquivadas',
+                'db_table': 'TB_NOTIFICACAO_ARQUIVADA',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='notificacaopendente',
+            name='unica',
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='chave_deduplicacao',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacaopendente',
+            name='chave_deduplicacao',
+            field=models.CharField(blank=True, help_text='Ver Notificacao.chave_deduplicacao', max_length=100, null=True),
+        ),
+        migrations.RunPython(preencher_chaves, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['destinatario', 'lida', 'data_criacao'], name='idx_notificacao_caixa'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', True)), fields=['data_criacao'], name='idx_notificacao_lidas'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacao',
+            constraint=models.UniqueConstraint(fields=('destinatario', 'chave_deduplicacao'), name='uniq_notificacao_chave'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.db.models import Sum, F
 from django.utils import timezone
 from django.conf import settings 
+from decimal import Decimal
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -59,32 +60,51 @@ class OrdemServico(TimeStampedModel):
     valor_mao_de_obra = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     desconto = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     arquivo_orcamento = models.FileField(upload_to='servicos/orcamentos/', null=True, blank=True)
+
+    # Totais persistidos (antes eram propriedades com aggregate a cada leitura).
+    # Recalculados no save() e ajustados por delta a cada ItemServico (servicos.signals).
+    # Conferência: manage.py verificar_totais_os
+    total_pecas = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    valor_total_geral = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     
     class Meta:
         db_table = 'TB_ORDEM_SERVICO'
         verbose_name = 'Ordem de Serviço'
         verbose_name_plural = 'Ordens de Serviço'
         ordering = ['-created_at']
+        indexes = [
+            # Paginação por cursor (utils.pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='idx_os_keyset'),
+        ]
 
     def __str__(self):
         return f"OS #{self.pk} - {self.titulo}"
 
     def save(self, *args, **kwargs):
+        # Relê a soma das peças do banco: a cópia em memória pode estar
+        # defasada se itens mudaram depois que esta OS foi carregada.
+        self.total_pecas = self.calcular_total_pecas() if self.pk else Decimal('0.00')
+        self.valor_total_geral = (
+            self.total_pecas + para_decimal(self.valor_mao_de_obra) - para_decimal(self.desconto)
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'total_pecas', 'valor_total_geral'}
+
         super().save(*args, **kwargs) 
         if self.tecnico_responsavel:
             self.tecnicos.add(self.tecnico_responsavel)
 
+    def calcular_total_pecas(self):
+        total = ItemServico.objects.filter(os_id=self.pk).aggregate(
+            total=Sum(F('quantidade') * F('preco_venda'))
+        )['total']
+        return para_decimal(total)
 
-    @property
-    def total_pecas(self):
-        return self.itens.aggregate(total=Sum(models.F('quantidade') * models.F('preco_venda')))['total'] or 0
 
-    @property
-    def valor_total_geral(self):
-        pecas = self.total_pecas
-        mo = self.valor_mao_de_obra
-        desc = self.desconto
-        return (float(pecas) + float(mo)) - float(desc)
+def para_decimal(valor):
+    # Campos podem chegar como string/float antes de irem ao banco (setattr vindo do request)
+    return Decimal(str(valor or 0)).quantize(Decimal('0.01'))
 
 class ItemServico(models.Model):
     os = models.ForeignKey(OrdemServico, on_delete=models.CASCADE, related_name='itens')
@@ -134,14 +154,73 @@ class Notificacao(models.Model):
     lida = models.BooleanField(default=False)
     data_criacao = models.DateTimeField(auto_now_add=True)
     link = models.CharField(max_length=200, null=True, blank=True)
+    # Ex.: "churn:12", "chamado_finalizado:40". Mesmo destinatário + mesma chave = uma notificação só
+    chave_deduplicacao = models.CharField(max_length=100, null=True, blank=True)
 
     class Meta:
         ordering = ['-data_criacao']
         db_table = 'TB_NOTIFICACAO'
+        constraints = [
+            models.UniqueConstraint(fields=['destinatario', 'chave_deduplicacao'], name='uniq_notificacao_chave'),
+        ]
+        indexes = [
+            # Caixa do usuário (lista, não lidas) e limpeza das lidas antigas
+            models.Index(fields=['destinatario', 'lida', 'data_criacao'], name='idx_notificacao_caixa'),
+            models.Index(fields=['data_criacao'], condition=models.Q(lida=True), name='idx_notificacao_lidas'),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.destinatario.username}"
 
+class NotificacaoPendente(models.Model):
+    """
+    Outbox de notificações: gravada na mesma transação do evento (save do
+    chamado/OS). O Celery (servicos.tasks.processar_notificacoes_pendentes)
+    cria as Notificacao em lote e faz os envios por WebSocket depois do commit,
+    então rollback não gera notificação fantasma.
+    """
+    titulo = models.CharField(max_length=100)
+    mensagem = models.TextField()
+    tipo = models.CharField(max_length=20, choices=Notificacao.TIPO_CHOICES, default='SISTEMA')
+    link = models.CharField(max_length=200, null=True, blank=True)
+    destinatarios = models.JSONField(default=list, blank=True, help_text="IDs de usuário")
+    incluir_gestores = models.BooleanField(default=False, help_text="Gestores/sócios ativos, resolvidos no processamento")
+    chave_deduplicacao = models.CharField(max_length=100, null=True, blank=True, help_text="Ver Notificacao.chave_deduplicacao")
+    criado_em = models.DateTimeField(auto_now_add=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'TB_NOTIFICACAO_PENDENTE'
+        verbose_name = "Notificação Pendente"
+        verbose_name_plural = "Notificações Pendentes"
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processado_em__isnull=True), name='idx_notificacao_outbox'),
+        ]
+
+    def __str__(self):
+        return f"{self.titulo} ({'processada' if self.processado_em else 'pendente'})"
+
+
+class NotificacaoArquivada(models.Model):
+    """Notificações lidas antigas, movidas pela retenção (servicos.tasks.limpar_notificacoes_antigas)."""
+    notificacao_id = models.BigIntegerField()
+    destinatario_id = models.BigIntegerField(db_index=True)
+    titulo = models.CharField(max_length=100)
+    mensagem = models.TextField()
+    tipo = models.CharField(max_length=20)
+    link = models.CharField(max_length=200, null=True, blank=True)
+    data_criacao = models.DateTimeField()
+    arquivada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'TB_NOTIFICACAO_ARQUIVADA'
+        verbose_name = "Notificação Arquivada"
+        verbose_name_plural = "Notificações Arquivadas"
+
+    def __str__(self):
+        return f"{self.titulo} (arquivada)"
+
+
 class ComentarioOrdemServico(models.Model):
     ordem_servico = models.ForeignKey(OrdemServico, related_name='comentarios', on_delete=models.CASCADE)
     autor = models.ForeignKey('equipe.Equipe', on_delete=models.SET_NULL, null=True)
@@ -1,8 +1,17 @@
-from django.db import transaction
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.apps import apps 
 from decimal import Decimal, ROUND_HALF_UP
+import os
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 def limpar_decimal(valor):
     if valor is None:
@@ -70,15 +79,13 @@ def atualizar_ordem_servico(os_id, dados_atualizacao):
 
 @transaction.atomic
 def finalizar_ordem_servico(os, usuario_responsavel):
+    from estoque.services import baixar_estoque
+
     LancamentoFinanceiro = apps.get_model('financeiro', 'LancamentoFinanceiro')
-    
-    # Importação segura
-    try:
-        MovimentacaoEstoque = apps.get_model('estoque', 'MovimentacaoEstoque')
-    except LookupError:
-        MovimentacaoEstoque = None
 
-    if os.status in ['FINALIZADO', 'CONCLUIDO']:
+    # Trava a OS e relê o status: duas finalizações simultâneas não baixam o estoque duas vezes
+    status_atual = type(os).objects.select_for_update().values_list('status', flat=True).get(pk=os.pk)
+    if os.status in ['FINALIZADO', 'CONCLUIDO'] or status_atual in ['FINALIZADO', 'CONCLUIDO']:
         raise ValidationError("OS já finalizada.")
 
     # Define quem recebe a comissão/crédito
@@ -86,29 +93,13 @@ def finalizar_ordem_servico(os, usuario_responsavel):
     if not tecnico_para_financeiro and os.tecnicos.exists():
         tecnico_para_financeiro = os.tecnicos.first()
 
-    # 1. BAIXA DE ESTOQUE
-    for item in os.itens.select_related('produto').all():
-        item.produto.refresh_from_db()
-        
-        if item.produto.estoque_atual < item.quantidade:
-            raise ValidationError(
-                f"Estoque insuficiente para '{item.produto.nome}'. "
-                f"Necessário: {item.quantidade}, Disponível: {item.produto.estoque_atual}."
-            )
-
-        item.produto.estoque_atual -= item.quantidade
-        item.produto.save()
-        
-        if MovimentacaoEstoque:
-            # Cria a movimentação de saída vinculada à empresa da OS
-            MovimentacaoEstoque.objects.create(
-                produto=item.produto,
-                quantidade=item.quantidade,
-                tipo_movimento='SAIDA',
-                usuario=usuario_responsavel,
-                observacao=f"Baixa OS #{os.pk} (Cliente: {os.cliente.razao_social})",
-                empresa=os.empresa 
-            )
+    # 1. BAIXA DE ESTOQUE (todas as peças de uma vez, com os produtos travados)
+    baixar_estoque(
+        os.itens.values_list('produto_id', 'quantidade'),
+        observacao=f"Baixa OS #{os.pk} (Cliente: {os.cliente.razao_social})",
+        usuario=usuario_responsavel,
+        empresa=os.empresa,
+    )
 
     # 2. FINANCEIRO: RECEITA
     valor_receita = limpar_decimal(os.valor_total_geral)
@@ -158,4 +149,294 @@ def finalizar_ordem_servico(os, usuario_responsavel):
     os.data_finalizacao = timezone.now()
     os.save()
 
-    return os
\ No newline at end of file
+    return os
+
+# =====================================================
+# ORÇAMENTO EM PDF (renderizado pelo Celery: core.tasks.renderizar_pdf)
+# =====================================================
+
+def montar_contexto_orcamento_os(os_obj):
+    itens_list = list(os_obj.itens.select_related('produto'))
+    num_itens = len(itens_list)
+    # Calculate how many empty rows are needed to reach a minimum of 5
+    empty_rows = range(5 - num_itens) if num_itens < 5 else []
+
+    return {
+        'os': os_obj,
+        'cliente': os_obj.cliente,
+        'itens': itens_list,
+        'empty_rows': empty_rows,
+        'mao_de_obra': os_obj.valor_mao_de_obra,
+        'desconto': os_obj.desconto,
+        'valor_final': os_obj.valor_total_geral,
+        'data_hoje': timezone.now(),
+        'observacoes': os_obj.descricao_problema or "Observações do serviço...",
+        'logo_path': f"file://{os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')}"
+    }
+
+
+TEMPLATE_ORCAMENTO_OS = 'utils/pdfs/orcamento.html'
+PASTA_ORCAMENTOS_OS = 'servicos/orcamentos'
+
+
+def _os_para_orcamento(os_id):
+    OrdemServico = apps.get_model('servicos', 'OrdemServico')
+    return OrdemServico.objects.select_related('cliente', 'solicitante').get(pk=os_id)
+
+
+def _anexar_orcamento_os(os_obj, nome):
+    if os_obj.arquivo_orcamento.name != nome:
+        os_obj.arquivo_orcamento.name = nome
+        os_obj.save(update_fields=['arquivo_orcamento'])
+    return os_obj.arquivo_orcamento
+
+
+def orcamento_os_pdf(os_obj):
+    """(nome no storage, chave) do orçamento; só renderiza se a OS mudou desde o último PDF."""
+    from utils.pdf_service import obter_pdf
+    return obter_pdf(TEMPLATE_ORCAMENTO_OS, montar_contexto_orcamento_os(os_obj), PASTA_ORCAMENTOS_OS)
+
+
+def orcamento_os_pdf_pronto(os_obj):
+    """(nome ou None, chave) do orçamento já renderizado para o estado atual da OS; nunca renderiza."""
+    from utils.pdf_service import pdf_pronto
+    return pdf_pronto(TEMPLATE_ORCAMENTO_OS, montar_contexto_orcamento_os(os_obj), PASTA_ORCAMENTOS_OS)
+
+
+def salvar_orcamento_os_pdf(os_id):
+    """Gera (ou reaproveita) o orçamento da OS e anexa em arquivo_orcamento."""
+    os_obj = _os_para_orcamento(os_id)
+    nome, _ = orcamento_os_pdf(os_obj)
+    return _anexar_orcamento_os(os_obj, nome)
+
+
+def orcamento_os_pdf_em_cache(os_id):
+    """Anexa e devolve o orçamento se um PDF idêntico já existe; None se precisa renderizar."""
+    from utils.pdf_service import pdf_em_cache
+
+    os_obj = _os_para_orcamento(os_id)
+    nome = pdf_em_cache(TEMPLATE_ORCAMENTO_OS, montar_contexto_orcamento_os(os_obj), PASTA_ORCAMENTOS_OS)
+    return _anexar_orcamento_os(os_obj, nome) if nome else None
+
+
+# =====================================================
+# NOTIFICAÇÕES (outbox)
+# =====================================================
+
+def enfileirar_notificacao(titulo, mensagem, link=None, destinatarios=(), incluir_gestores=False, tipo='SISTEMA', chave_deduplicacao=None):
+    """
+    Registra a notificação na outbox dentro da transação atual e agenda a
+    entrega (tasks.processar_notificacoes_pendentes) para depois do commit.
+    Sem query de destinatários nem WebSocket no caminho do save.
+    Com chave_deduplicacao, quem já recebeu uma notificação com a mesma chave não recebe de novo.
+    """
+    NotificacaoPendente = apps.get_model('servicos', 'NotificacaoPendente')
+    pendente = NotificacaoPendente.objects.create(
+        titulo=titulo, mensagem=mensagem, tipo=tipo, link=link,
+        destinatarios=sorted(set(destinatarios)), incluir_gestores=incluir_gestores,
+        chave_deduplicacao=chave_deduplicacao,
+    )
+    transaction.on_commit(_agendar_processamento_notificacoes)
+    return pendente
+
+
+def _agendar_processamento_notificacoes():
+    from .tasks import processar_notificacoes_pendentes
+    try:
+        processar_notificacoes_pendentes.apply_async(retry=False)
+    except Exception:
+        # Broker fora: a notificação continua na outbox e o beat entrega depois
+        logger.warning("Falha ao agendar o processamento da outbox de notificações", exc_info=True)
+
+
+def criar_notificacoes(notificacoes):
+    """
+    bulk_create das Notificacao, pulando as que o destinatário já tem com a
+    mesma chave_deduplicacao (uma query para o lote todo). Retorna as criadas;
+    quem perder a corrida pela mesma chave para outro worker fica de fora.
+    """
+    Notificacao = apps.get_model('servicos', 'Notificacao')
+
+    com_chave = [n for n in notificacoes if n.chave_deduplicacao]
+    existentes = set()
+    if com_chave:
+        existentes = set(Notificacao.objects.filter(
+            destinatario_id__in={n.destinatario_id for n in com_chave},
+            chave_deduplicacao__in={n.chave_deduplicacao for n in com_chave},
+        ).values_list('destinatario_id', 'chave_deduplicacao'))
+
+    novas = []
+    for notificacao in notificacoes:
+        if notificacao.chave_deduplicacao:
+            chave = (notificacao.destinatario_id, notificacao.chave_deduplicacao)
+            if chave in existentes:
+                continue
+            existentes.add(chave)
+        novas.append(notificacao)
+    try:
+        with transaction.atomic():
+            criadas = Notificacao.objects.bulk_create(novas)
+    except IntegrityError:
+        # Outro worker inseriu a mesma chave entre a checagem e o insert (ex.: lembretes
+        # da mesma visita de varreduras diferentes): refaz uma a uma e pula a duplicada
+        criadas = []
+        for notificacao in novas:
+            try:
+                with transaction.atomic():
+                    criadas += Notificacao.objects.bulk_create([notificacao])
+            except IntegrityError:
+                continue
+    ajustar_nao_lidas(Counter(n.destinatario_id for n in criadas if not n.lida))
+    return criadas
+
+
+# =====================================================
+# CONTADOR DE NÃO LIDAS (cache/Redis)
+# =====================================================
+CACHE_NAO_LIDAS = 'notificacoes:nao_lidas:{}'
+# Expira mesmo sem uso: qualquer desvio se corrige na próxima contagem no banco
+CACHE_NAO_LIDAS_TIMEOUT = 60 * 60 * 24
+
+
+def contar_nao_lidas(user_id):
+    """Não lidas do usuário: lê do cache; na falta (ou sem cache), conta no banco (índice da caixa) e guarda."""
+    chave = CACHE_NAO_LIDAS.format(user_id)
+    try:
+        total = cache.get(chave)
+    except Exception as erro:
+        logger.warning(f"Contador de não lidas de user_{user_id} indisponível: {erro}")
+        total = None
+    if total is None or total < 0:
+        Notificacao = apps.get_model('servicos', 'Notificacao')
+        total = Notificacao.objects.filter(destinatario_id=user_id, lida=False).count()
+        try:
+            cache.set(chave, total, CACHE_NAO_LIDAS_TIMEOUT)
+        except Exception as erro:
+            logger.warning(f"Contador de não lidas de user_{user_id} não gravado: {erro}")
+    return total
+
+
+def ajustar_nao_lidas(deltas):
+    """
+    Soma {user_id: delta} nos contadores após o commit (INCRBY atômico no Redis).
+    Contador ausente fica ausente: a próxima leitura recalcula pelo banco.
+    Falha no cache só é logada: o commit já aconteceu e o contador expira sozinho.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def aplicar():
+        for user_id, delta in deltas.items():
+            try:
+                cache.incr(CACHE_NAO_LIDAS.format(user_id), delta)
+            except ValueError:
+                pass
+            except Exception as erro:
+                logger.warning(f"Contador de não lidas de user_{user_id} não ajustado: {erro}")
+    transaction.on_commit(aplicar)
+
+
+def zerar_nao_lidas(user_id):
+    def zerar():
+        try:
+            cache.set(CACHE_NAO_LIDAS.format(user_id), 0, CACHE_NAO_LIDAS_TIMEOUT)
+        except Exception as erro:
+            logger.warning(f"Contador de não lidas de user_{user_id} não zerado: {erro}")
+    transaction.on_commit(zerar)
+
+
+# =====================================================
+# LEMBRETE DE VISITA (task com ETA, agendada ao marcar/remarcar a visita)
+# =====================================================
+LEMBRETE_VISITA_ANTECEDENCIA = timedelta(hours=2)
+# Só vira task com ETA o lembrete que dispara dentro do horizonte: ETA longa fica
+# presa no worker e o broker Redis a re-entrega a cada visibility_timeout
+# (ver CELERY_BROKER_TRANSPORT_OPTIONS). O resto é agendado por
+# tasks.verificar_visitas_proximas, que roda a cada poucas horas.
+LEMBRETE_VISITA_HORIZONTE = timedelta(hours=12)
+
+
+def agendar_lembrete_visita(chamado):
+    """
+    Agenda (após o commit) o lembrete da visita do chamado para a data atual.
+    Remarcou ou cancelou? O lembrete antigo confere a data ao disparar e não faz nada.
+    """
+    if chamado.status != 'AGENDADO' or not chamado.data_agendamento:
+        return
+    agora = timezone.now()
+    if chamado.data_agendamento <= agora:
+        return
+    disparo = max(chamado.data_agendamento - LEMBRETE_VISITA_ANTECEDENCIA, agora)
+    if disparo > agora + LEMBRETE_VISITA_HORIZONTE:
+        return
+
+    chamado_id, data_agendamento = chamado.id, chamado.data_agendamento.isoformat()
+
+    def agendar():
+        from .tasks import lembrar_visita
+        try:
+            lembrar_visita.apply_async((chamado_id, data_agendamento), eta=disparo, retry=False)
+        except Exception:
+            logger.warning(f"Falha ao agendar o lembrete da visita do chamado {chamado_id}", exc_info=True)
+    transaction.on_commit(agendar)
+
+
+# =====================================================
+# PRESENÇA NO WEBSOCKET (quantas abas/conexões cada usuário tem abertas)
+# =====================================================
+CACHE_PRESENCA = 'notificacoes:presenca:{}'
+# Renovado na conexão e a cada ping do front (NotificationBell, a cada 5 min): aba
+# aberta não expira; se um processo morrer sem disconnect, a contagem some sozinha
+CACHE_PRESENCA_TIMEOUT = 60 * 15
+# Máximo de notificações reenviadas ao reconectar (as mais recentes)
+REENVIO_MAX = 50
+
+
+def registrar_conexao(user_id):
+    chave = CACHE_PRESENCA.format(user_id)
+    try:
+        cache.add(chave, 0, CACHE_PRESENCA_TIMEOUT)
+        cache.incr(chave)
+        cache.touch(chave, CACHE_PRESENCA_TIMEOUT)
+    except Exception as erro:
+        logger.warning(f"Presença de user_{user_id} não registrada: {erro}")
+
+
+def renovar_presenca(user_id):
+    """
+    Ping de uma conexão aberta: renova o TTL. Se a chave sumiu (flush/eviction do
+    Redis), volta a marcar o usuário como online; a contagem se acerta nos pings.
+    """
+    chave = CACHE_PRESENCA.format(user_id)
+    try:
+        if not cache.touch(chave, CACHE_PRESENCA_TIMEOUT):
+            cache.add(chave, 1, CACHE_PRESENCA_TIMEOUT)
+    except Exception as erro:
+        logger.warning(f"Presença de user_{user_id} não renovada: {erro}")
+
+
+def registrar_desconexao(user_id):
+    chave = CACHE_PRESENCA.format(user_id)
+    try:
+        if cache.decr(chave) <= 0:
+            cache.delete(chave)
+    except ValueError:
+        pass  # já expirou
+    except Exception as erro:
+        logger.warning(f"Presença de user_{user_id} não atualizada: {erro}")
+
+
+def usuario_online(user_id):
+    """Tem alguma conexão aberta? Sem cache disponível, assume que sim (melhor enviar à toa que perder)."""
+    try:
+        return (cache.get(CACHE_PRESENCA.format(user_id)) or 0) > 0
+    except Exception:
+        return True
+
+
+def notificacoes_para_reenvio(user_id, ultimo_id, limite=REENVIO_MAX):
+    """Notificações criadas depois da última que o cliente recebeu (id > ultimo_id), em ordem."""
+    Notificacao = apps.get_model('servicos', 'Notificacao')
+    recentes = Notificacao.objects.filter(destinatario_id=user_id, id__gt=ultimo_id).order_by('-id')[:limite]
+    return list(reversed(recentes))
@@ -1,152 +1,239 @@
-from django.db.models.signals import post_save
+from collections import defaultdict
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
 from chamados.models import Chamado
-from .models import OrdemServico, Notificacao
-from equipe.models import Equipe
+from .models import OrdemServico, ItemServico, Notificacao, para_decimal
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_ws_notification(user_id, notificacao):
-    """Helper to send WebSocket notification."""
-    channel_layer = get_channel_layer()
-    message_payload = {
+def _payload_notificacao(notificacao):
+    return {
         "id": notificacao.id,
         "titulo": notificacao.titulo,
         "mensagem": notificacao.mensagem,
-        "lida": False,
+        "lida": notificacao.lida,
         "tipo": notificacao.tipo,
         "data_criacao": notificacao.data_criacao.isoformat()
     }
+
+def send_ws_notification(user_id, notificacao):
+    """Helper to send WebSocket notification."""
+    from .services import contar_nao_lidas, usuario_online
+
+    # Offline: nada a enviar; o cliente recupera no reenvio ao reconectar
+    if not usuario_online(user_id):
+        return
+
+    channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         f"user_{user_id}",
         {
             "type": "send_notification",
-            "message": message_payload
+            "message": _payload_notificacao(notificacao),
+            "nao_lidas": contar_nao_lidas(user_id),
         }
     )
 
-from django.contrib.auth import get_user_model
+def enviar_notificacoes_ws(notificacoes):
+    """
+    Envio em lote: uma mensagem no channel layer por usuário, todas no mesmo event loop.
+    Só para quem está conectado; os demais recebem no reenvio ao reconectar.
+    """
+    from .services import contar_nao_lidas, usuario_online
+
+    por_usuario = defaultdict(list)
+    online = {}
+    for notificacao in notificacoes:
+        user_id = notificacao.destinatario_id
+        if user_id not in online:
+            online[user_id] = usuario_online(user_id)
+        if online[user_id]:
+            por_usuario[user_id].append(_payload_notificacao(notificacao))
+    if not por_usuario:
+        return
 
-@receiver(post_save, sender=Chamado)
-def notificacao_chamado(sender, instance, created, **kwargs):
-    """Notifies the correct parties when a Chamado is created or finalized."""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-
-    try:
-        recipients = set()
-        should_notify = False
-        titulo = ""
-        mensagem = ""
-
-        # 1. Base Recipients (Gestores)
-        gestores = User.objects.filter(is_active=True, equipe__cargo__in=['GESTOR', 'SOCIO'])
-        for g in gestores:
-            recipients.add(g)
-
-        # 2. Add Technician (BULLETPROOF FIX)
-        if getattr(instance, 'tecnico', None):
-            tecnico_user = None
-            # Safely try common relation names
-            if hasattr(instance.tecnico, 'usuario'):
-                tecnico_user = instance.tecnico.usuario
-            elif hasattr(instance.tecnico, 'user'):
-                tecnico_user = instance.tecnico.user
-                
-            if tecnico_user and getattr(tecnico_user, 'is_active', True):
-                logger.info(f"✅ Técnico encontrado! Adicionando User ID {tecnico_user.id} aos destinatários.")
-                recipients.add(tecnico_user)
-            else:
-                logger.warning(f"⚠️ O técnico {instance.tecnico} não possui uma conta de Usuário (User) vinculada ou está inativo!")
-
-        # 3. Determine Messages
-        if created:
-            should_notify = True
-            titulo = "Novo Chamado Aberto"
-            mensagem = f"Chamado #{instance.protocolo} aberto para o cliente {getattr(instance.cliente, 'nome', instance.cliente)}."
-        elif instance.status in ['CONCLUIDO', 'FINALIZADO', 'RESOLVIDO']:
-            # Only notify if not already notified
-            if not Notificacao.objects.filter(link=f"/chamados/{instance.id}", titulo="Chamado Finalizado").exists():
-                should_notify = True
-                titulo = "Chamado Finalizado"
-                nome_tecnico = instance.tecnico.nome if getattr(instance, 'tecnico', None) else "um técnico"
-                mensagem = f"O chamado #{instance.protocolo} foi finalizado pelo técnico {nome_tecnico}."
-
-        if not should_notify:
-            return
-
-        channel_layer = get_channel_layer()
-        for user in recipients:
-            # 1. Create in Database
-            notificacao = Notificacao.objects.create(
-                destinatario=user,
-                titulo=titulo,
-                mensagem=mensagem,
-                tipo='SISTEMA',
-                lida=False,
-                link=f"/chamados/{instance.id}"
-            )
+    channel_layer = get_channel_layer()
+    nao_lidas = {user_id: contar_nao_lidas(user_id) for user_id in por_usuario}
 
-            # 2. Broadcast via WebSocket
-            room_group_name = f'user_{user.id}'
-            
+    async def enviar_todas():
+        for user_id, mensagens in por_usuario.items():
             try:
-                message_payload = {
-                    "id": notificacao.id,
-                    "titulo": notificacao.titulo,
-                    "mensagem": notificacao.mensagem,
-                    "lida": notificacao.lida,
-                    "tipo": notificacao.tipo,
-                    "data_criacao": notificacao.data_criacao.isoformat()
-                }
-                async_to_sync(channel_layer.group_send)(
-                    room_group_name,
-                    {
-                        "type": "send_notification",
-                        "message": message_payload
-                    }
-                )
-                logger.info(f"✅ WebSocket push enviado com sucesso para {room_group_name}")
+                await channel_layer.group_send(f"user_{user_id}", {
+                    "type": "send_notifications",
+                    "messages": mensagens,
+                    "nao_lidas": nao_lidas[user_id],
+                })
             except Exception as ws_err:
-                logger.error(f"❌ Falha ao enviar WS para {room_group_name}: {ws_err}")
+                logger.error(f"❌ Falha ao enviar WS para user_{user_id}: {ws_err}")
+
+    async_to_sync(enviar_todas)()
+
+# =====================================================
+# NOTIFICAÇÕES (outbox: gravadas na transação, entregues pelo Celery)
+# =====================================================
+STATUS_CHAMADO_FINALIZADO = ['CONCLUIDO', 'FINALIZADO', 'RESOLVIDO']
+STATUS_OS_FINALIZADA = [OrdemServico.Status.CONCLUIDO, OrdemServico.Status.FINALIZADO]
+
+
+@receiver(post_init, sender=Chamado)
+@receiver(post_init, sender=OrdemServico)
+def guardar_status_notificacao(sender, instance, **kwargs):
+    instance._status_notificacao = instance.__dict__.get('status')
+
 
-    except Exception as e:
-        logger.error(f"Error processing Chamado notification for {instance.id}: {e}", exc_info=True)
+def _mudou_para(instance, status_finais):
+    anterior = getattr(instance, '_status_notificacao', None)
+    instance._status_notificacao = instance.status
+    return instance.status in status_finais and anterior not in status_finais
+
+
+@receiver(post_save, sender=Chamado)
+def notificacao_chamado(sender, instance, created, **kwargs):
+    """Notifies the correct parties when a Chamado is created or finalized."""
+    from .services import enfileirar_notificacao
+
+    finalizado = _mudou_para(instance, STATUS_CHAMADO_FINALIZADO)
+    if not created and not finalizado:
+        return
+
+    # Técnico entra junto com os gestores (resolvidos só no processamento)
+    destinatarios = []
+    if instance.tecnico_id:
+        tecnico_user_id = getattr(instance.tecnico, 'usuario_id', None)
+        if tecnico_user_id:
+            destinatarios.append(tecnico_user_id)
+        else:
+            logger.warning(f"⚠️ O técnico {instance.tecnico} não possui uma conta de Usuário (User) vinculada ou está inativo!")
+
+    if created:
+        enfileirar_notificacao(
+            titulo="Novo Chamado Aberto",
+            mensagem=f"Chamado #{instance.protocolo} aberto para o cliente {getattr(instance.cliente, 'nome', instance.cliente)}.",
+            link=f"/chamados/{instance.id}",
+            destinatarios=destinatarios, incluir_gestores=True,
+        )
+    else:
+        nome_tecnico = instance.tecnico.nome if instance.tecnico_id else "um técnico"
+        enfileirar_notificacao(
+            titulo="Chamado Finalizado",
+            mensagem=f"O chamado #{instance.protocolo} foi finalizado pelo técnico {nome_tecnico}.",
+            link=f"/chamados/{instance.id}",
+            destinatarios=destinatarios, incluir_gestores=True,
+            chave_deduplicacao=f"chamado_finalizado:{instance.id}",  # só a primeira finalização notifica
+        )
 
 
 @receiver(post_save, sender=OrdemServico)
 def notificacao_ordem_servico(sender, instance, created, **kwargs):
-    try:
-        if created:
-            titulo = "Nova Ordem de Serviço Criada"
-            mensagem = f"OS #{instance.id} criada para o cliente {instance.cliente}."
-            
-            if instance.tecnico_responsavel and instance.tecnico_responsavel.usuario:
-                notificacao = Notificacao.objects.create(
-                    destinatario=instance.tecnico_responsavel.usuario,
-                    titulo=titulo,
-                    mensagem=mensagem,
-                    link=f"/ordens-servico/{instance.id}"
-                )
-                send_ws_notification(instance.tecnico_responsavel.usuario.id, notificacao)
-
-        elif instance.status in [OrdemServico.Status.CONCLUIDO, OrdemServico.Status.FINALIZADO]:
-            titulo = f"Ordem de Serviço {instance.status.capitalize()}"
-            mensagem = f"A OS #{instance.id} foi {instance.status.lower()}."
-
-            solicitante_user = getattr(instance.solicitante, 'usuario', None) if instance.solicitante else None
-            if solicitante_user:
-                notificacao = Notificacao.objects.create(
-                    destinatario=solicitante_user,
-                    titulo=titulo,
-                    mensagem=mensagem,
-                    link=f"/ordens-servico/{instance.id}"
-                )
-                send_ws_notification(solicitante_user.id, notificacao)
-                
-    except Exception as e:
-        logger.error(f"Error sending WebSocket notification for OrdemServico {instance.id}: {e}", exc_info=True)
+    from .services import enfileirar_notificacao
+
+    finalizada = _mudou_para(instance, STATUS_OS_FINALIZADA)
+    if created:
+        usuario_id = getattr(instance.tecnico_responsavel, 'usuario_id', None)
+        if usuario_id:
+            enfileirar_notificacao(
+                titulo="Nova Ordem de Serviço Criada",
+                mensagem=f"OS #{instance.id} criada para o cliente {instance.cliente}.",
+                link=f"/ordens-servico/{instance.id}",
+                destinatarios=[usuario_id],
+            )
+    elif finalizada:
+        usuario_id = getattr(instance.solicitante, 'usuario_id', None) if instance.solicitante_id else None
+        if usuario_id:
+            enfileirar_notificacao(
+                titulo=f"Ordem de Serviço {instance.status.capitalize()}",
+                mensagem=f"A OS #{instance.id} foi {instance.status.lower()}.",
+                link=f"/ordens-servico/{instance.id}",
+                destinatarios=[usuario_id],
+            )
+
+
+# =====================================================
+# LEMBRETE DE VISITA (agendado ao marcar/remarcar, sem polling)
+# =====================================================
+def _agenda_visita(instance):
+    return instance.__dict__.get('status'), instance.__dict__.get('data_agendamento')
+
+
+@receiver(post_init, sender=Chamado)
+def guardar_agenda_visita(sender, instance, **kwargs):
+    instance._agenda_visita = _agenda_visita(instance)
+
+
+@receiver(post_save, sender=Chamado)
+def agendar_lembrete_visita_chamado(sender, instance, created, **kwargs):
+    from .services import agendar_lembrete_visita
+
+    anterior = None if created else getattr(instance, '_agenda_visita', None)
+    instance._agenda_visita = _agenda_visita(instance)
+    if instance._agenda_visita != anterior:
+        agendar_lembrete_visita(instance)
+
+
+# =====================================================
+# CONTADOR DE NÃO LIDAS (saves individuais; bulk/update são tratados nos services/views)
+# =====================================================
+@receiver(post_init, sender=Notificacao)
+def guardar_lida_inicial(sender, instance, **kwargs):
+    instance._lida_inicial = instance.__dict__.get('lida')
+
+
+@receiver(post_save, sender=Notificacao)
+def atualizar_contador_nao_lidas(sender, instance, created, **kwargs):
+    from .services import ajustar_nao_lidas
+
+    antes = False if created else not getattr(instance, '_lida_inicial', True)
+    instance._lida_inicial = instance.lida
+    delta = int(not instance.lida) - int(antes)
+    ajustar_nao_lidas({instance.destinatario_id: delta})
+
+
+# =====================================================
+# TOTAIS PERSISTIDOS DA OS (total_pecas / valor_total_geral)
+# =====================================================
+def _contribuicao_item(estado):
+    if not estado or not estado.get('os_id'):
+        return None, 0
+    return estado['os_id'], para_decimal(estado['quantidade']) * para_decimal(estado['preco_venda'])
+
+
+def _estado_item(instance):
+    return {campo: instance.__dict__.get(campo) for campo in ('os_id', 'quantidade', 'preco_venda')}
+
+
+def _aplicar_delta_os(os_id, delta):
+    # UPDATE atômico com F(): dois itens salvos ao mesmo tempo não se sobrescrevem
+    if os_id and delta:
+        OrdemServico.objects.filter(pk=os_id).update(
+            total_pecas=F('total_pecas') + delta,
+            valor_total_geral=F('valor_total_geral') + delta,
+        )
+
+
+@receiver(post_init, sender=ItemServico)
+def guardar_estado_item(sender, instance, **kwargs):
+    instance._estado_total = _estado_item(instance)
+
+
+@receiver(post_save, sender=ItemServico)
+def atualizar_totais_os_item_salvo(sender, instance, created, **kwargs):
+    os_antes, valor_antes = _contribuicao_item(None if created else getattr(instance, '_estado_total', None))
+    instance._estado_total = _estado_item(instance)
+    os_depois, valor_depois = _contribuicao_item(instance._estado_total)
+
+    if os_antes == os_depois:
+        _aplicar_delta_os(os_depois, valor_depois - valor_antes)
+    else:
+        _aplicar_delta_os(os_antes, -valor_antes)
+        _aplicar_delta_os(os_depois, valor_depois)
+
 
+@receiver(post_delete, sender=ItemServico)
+def atualizar_totais_os_item_removido(sender, instance, **kwargs):
+    os_id, valor = _contribuicao_item(_estado_item(instance))
+    _aplicar_delta_os(os_id, -valor)
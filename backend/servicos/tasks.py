@@ -1,12 +1,90 @@
+import logging
+
 from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from vendas.models import Venda
-from clientes.models import Cliente
+from clientes.services import clientes_sem_atividade
 from chamados.models import Chamado
-from .models import Notificacao
+from .models import Notificacao, NotificacaoPendente
 from equipe.models import Equipe
-from .signals import send_ws_notification
+from .signals import send_ws_notification, enviar_notificacoes_ws
+from .services import (
+    criar_notificacoes, agendar_lembrete_visita, LEMBRETE_VISITA_ANTECEDENCIA, LEMBRETE_VISITA_HORIZONTE,
+)
+
+logger = logging.getLogger(__name__)
+
+LOTE_NOTIFICACOES = 500
+# Linhas já processadas da outbox ficam esse tempo (diagnóstico) e saem na retenção diária
+OUTBOX_RETENCAO = timedelta(days=7)
+
+
+def _notificacoes_da_outbox(pendentes, gestores, usuarios):
+    """Notificacao de cada pendente; destinatário removido antes do processamento fica de fora."""
+    notificacoes = []
+    for pendente in pendentes:
+        destinatarios = set(pendente.destinatarios) | (gestores if pendente.incluir_gestores else set())
+        notificacoes.extend(
+            Notificacao(
+                destinatario_id=user_id, titulo=pendente.titulo, mensagem=pendente.mensagem,
+                tipo=pendente.tipo, link=pendente.link, lida=False,
+                chave_deduplicacao=pendente.chave_deduplicacao,
+            )
+            for user_id in sorted(destinatarios & usuarios)
+        )
+    return notificacoes
+
+
+@shared_task(ignore_result=True)
+def processar_notificacoes_pendentes(limite=LOTE_NOTIFICACOES):
+    """
+    Consome a outbox (NotificacaoPendente): cria as Notificacao com um
+    bulk_create e envia os WebSockets agrupados por usuário após o commit.
+    Disparada no on_commit de quem enfileira; agendar também no beat
+    (ex.: a cada minuto) para reprocessar o que ficou para trás.
+    """
+    with transaction.atomic():
+        # skip_locked: workers em paralelo pegam lotes diferentes
+        pendentes = list(
+            NotificacaoPendente.objects.select_for_update(skip_locked=True)
+            .filter(processado_em__isnull=True).order_by('id')[:limite]
+        )
+        if not pendentes:
+            return 0
+
+        gestores = set()
+        if any(p.incluir_gestores for p in pendentes):
+            gestores = set(get_user_model().objects.filter(
+                is_active=True, equipe__cargo__in=[Equipe.Cargo.GESTOR, Equipe.Cargo.SOCIO]
+            ).values_list('id', flat=True))
+
+        usuarios = set(get_user_model().objects.filter(
+            pk__in=set().union(gestores, *(p.destinatarios for p in pendentes))
+        ).values_list('id', flat=True))
+
+        try:
+            with transaction.atomic():
+                notificacoes = criar_notificacoes(_notificacoes_da_outbox(pendentes, gestores, usuarios))
+        except DatabaseError:
+            # Uma linha ruim não pode travar a fila: refaz uma a uma e descarta só a que falhar
+            logger.exception("Falha no lote da outbox de notificações; processando uma a uma")
+            notificacoes = []
+            for pendente in pendentes:
+                try:
+                    with transaction.atomic():
+                        notificacoes += criar_notificacoes(_notificacoes_da_outbox([pendente], gestores, usuarios))
+                except DatabaseError:
+                    logger.exception(f"Notificação pendente {pendente.pk} descartada")
+
+        NotificacaoPendente.objects.filter(pk__in=[p.pk for p in pendentes]).update(processado_em=timezone.now())
+        transaction.on_commit(lambda: enviar_notificacoes_ws(notificacoes))
+
+    return len(notificacoes)
+
 
 @shared_task
 def verificar_orcamentos_vencendo():
@@ -38,59 +116,134 @@ def verificar_orcamentos_vencendo():
 
 @shared_task
 def verificar_clientes_inativos():
+    """
+    Risco de churn: clientes sem chamado/OS/venda há 30 dias (Cliente.ultima_atividade_em).
+    Uma query para os clientes, uma para os gestores e um bulk_create no fim;
+    a chave churn:<id> evita repetir o aviso para o mesmo gestor.
+    """
     thirty_days_ago = timezone.now() - timedelta(days=30)
-    
-    active_clients_ids = Chamado.objects.filter(
-        created_at__gte=thirty_days_ago
-    ).values_list('cliente_id', flat=True).distinct()
-    
-    inactive_clients = Cliente.objects.exclude(id__in=active_clients_ids)
-    
-    recipients = Equipe.objects.filter(
+
+    recipients = list(Equipe.objects.filter(
         cargo__in=[Equipe.Cargo.GESTOR, Equipe.Cargo.SOCIO],
         usuario__isnull=False
+    ).values_list('usuario_id', flat=True))
+    if not recipients:
+        return
+
+    inactive_clients = clientes_sem_atividade(thirty_days_ago).only('id', 'nome', 'razao_social')
+
+    notificacoes = [
+        Notificacao(
+            destinatario_id=usuario_id,
+            titulo="Cliente Inativo (Risco de Churn)",
+            mensagem=f"O cliente {cliente} não abre chamado, OS ou venda há mais de 30 dias.",
+            tipo='CHURN',
+            link=f"/clientes/{cliente.id}",
+            chave_deduplicacao=f"churn:{cliente.id}",
+        )
+        for cliente in inactive_clients
+        for usuario_id in recipients
+    ]
+
+    enviar_notificacoes_ws(criar_notificacoes(notificacoes))
+
+@shared_task(ignore_result=True)
+def lembrar_visita(chamado_id, data_agendamento):
+    """
+    Lembrete da visita para o técnico (agendado por services.agendar_lembrete_visita).
+    Só envia se o chamado continua AGENDADO para a mesma data; a chave de
+    deduplicação garante um único lembrete mesmo com a task entregue mais de uma vez.
+    """
+    data_agendamento = parse_datetime(data_agendamento)
+    chamado = Chamado.objects.select_related('cliente', 'tecnico').filter(pk=chamado_id).first()
+    if not chamado or chamado.status != 'AGENDADO' or chamado.data_agendamento != data_agendamento:
+        return  # cancelado ou remarcado: o lembrete da nova data é outro
+    usuario_id = chamado.tecnico.usuario_id if chamado.tecnico_id else None
+    if not usuario_id:
+        return
+
+    notificacao = Notificacao(
+        destinatario_id=usuario_id,
+        titulo="Alerta de Visita Técnica",
+        mensagem=f"Visita para o cliente {chamado.cliente} agendada para as {timezone.localtime(data_agendamento).strftime('%H:%M')}.",
+        tipo='VISITA',
+        link=f"/chamados/{chamado.id}",
+        chave_deduplicacao=f"visita:{chamado.id}:{int(data_agendamento.timestamp())}",
     )
-    
-    for cliente in inactive_clients:
-        titulo = "Cliente Inativo (Risco de Churn)"
-        mensagem = f"O cliente {cliente} não abre um chamado há mais de 30 dias."
-        
-        for member in recipients:
-            # Evitar duplicar a notificação de churn para o mesmo cliente
-            if not Notificacao.objects.filter(titulo=titulo, mensagem=mensagem, destinatario=member.usuario).exists():
-                notificacao = Notificacao.objects.create(
-                    destinatario=member.usuario,
-                    titulo=titulo,
-                    mensagem=mensagem,
-                    tipo='CHURN',
-                    link=f"/clientes/{cliente.id}" # Ajuste o link
-                )
-                send_ws_notification(member.usuario.id, notificacao)
+    enviar_notificacoes_ws(criar_notificacoes([notificacao]))
 
-@shared_task
+
+@shared_task(ignore_result=True)
 def verificar_visitas_proximas():
-    now = timezone.now()
-    start_window = now + timedelta(hours=1, minutes=30)
-    end_window = now + timedelta(hours=2)
-    
-    chamados_com_visita = Chamado.objects.filter(
+    """
+    Rede de segurança dos lembretes: agenda os que disparam dentro de
+    LEMBRETE_VISITA_HORIZONTE (visitas marcadas com mais antecedência, ou
+    tasks perdidas num restart do broker). Agendar no beat com intervalo
+    menor que o horizonte (ex.: a cada 6 horas); repetir não duplica o aviso.
+    """
+    agora = timezone.now()
+    chamados = Chamado.objects.filter(
         status='AGENDADO',
-        data_agendamento__gte=start_window,
-        data_agendamento__lte=end_window,
-        tecnico__isnull=False,
-        tecnico__usuario__isnull=False
-    )
-    
-    for chamado in chamados_com_visita:
-        tecnico_user = chamado.tecnico.usuario
-        titulo = "Alerta de Visita Técnica"
-        mensagem = f"Visita para o cliente {chamado.cliente} agendada para as {chamado.data_agendamento.strftime('%H:%M')}."
-        
-        notificacao = Notificacao.objects.create(
-            destinatario=tecnico_user,
-            titulo=titulo,
-            mensagem=mensagem,
-            tipo='VISITA',
-            link=f"/chamados/{chamado.id}"
+        data_agendamento__gt=agora,
+        data_agendamento__lte=agora + LEMBRETE_VISITA_ANTECEDENCIA + LEMBRETE_VISITA_HORIZONTE,
+        tecnico__usuario__isnull=False,
+    ).only('id', 'status', 'data_agendamento')
+    for chamado in chamados:
+        agendar_lembrete_visita(chamado)
+
+
+LOTE_RETENCAO_NOTIFICACOES = 1000
+
+
+@shared_task(ignore_result=True)
+def limpar_notificacoes_antigas(dias=None, arquivar=None, lote=LOTE_RETENCAO_NOTIFICACOES, max_lotes=50):
+    """
+    Retenção de TB_NOTIFICACAO: notificações LIDAS com mais de
+    NOTIFICACOES_RETENCAO_DIAS são movidas para TB_NOTIFICACAO_ARQUIVADA
+    (NOTIFICACOES_ARQUIVAR=True) ou apagadas. Lotes pequenos, cada um na sua
+    transação, para não segurar locks; no máximo max_lotes por execução
+    (o que sobrar fica para a próxima). Agendar no beat (ex.: diariamente).
+    """
+    from django.conf import settings
+    from .models import NotificacaoArquivada
+
+    dias = settings.NOTIFICACOES_RETENCAO_DIAS if dias is None else dias
+    arquivar = settings.NOTIFICACOES_ARQUIVAR if arquivar is None else arquivar
+    limite = timezone.now() - timedelta(days=dias)
+
+    total = 0
+    for _ in range(max_lotes):
+        with transaction.atomic():
+            antigas = list(
+                Notificacao.objects.filter(lida=True, data_criacao__lt=limite)
+                .order_by('data_criacao')
+                .values('id', 'destinatario_id', 'titulo', 'mensagem', 'tipo', 'link', 'data_criacao')[:lote]
+            )
+            if not antigas:
+                break
+            if arquivar:
+                NotificacaoArquivada.objects.bulk_create([
+                    NotificacaoArquivada(
+                        notificacao_id=n['id'], destinatario_id=n['destinatario_id'], titulo=n['titulo'],
+                        mensagem=n['mensagem'], tipo=n['tipo'], link=n['link'], data_criacao=n['data_criacao'],
+                    )
+                    for n in antigas
+                ])
+            Notificacao.objects.filter(pk__in=[n['id'] for n in antigas]).delete()
+        total += len(antigas)
+        if len(antigas) < lote:
+            break
+
+    # Outbox já processada: sem isso TB_NOTIFICACAO_PENDENTE cresce um registro por evento
+    limite_outbox = timezone.now() - OUTBOX_RETENCAO
+    for _ in range(max_lotes):
+        processadas = list(
+            NotificacaoPendente.objects.filter(processado_em__lt=limite_outbox)
+            .order_by('id').values_list('id', flat=True)[:lote]
         )
-        send_ws_notification(tecnico_user.id, notificacao)
+        if not processadas:
+            break
+        NotificacaoPendente.objects.filter(pk__in=processadas).delete()
+        if len(processadas) < lote:
+            break
+    return total
@@ -1,3 +1,536 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from channels.layers import get_channel_layer
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chamados.models import Chamado
+from clientes.models import Cliente
+from config.routing import websocket_urlpatterns
+from equipe.models import Equipe
+from estoque.models import Produto, MovimentacaoEstoque
+from .models import OrdemServico, ItemServico, Notificacao, NotificacaoPendente, NotificacaoArquivada
+from .services import (
+    adicionar_peca_os, atualizar_ordem_servico, finalizar_ordem_servico, contar_nao_lidas,
+    _agendar_processamento_notificacoes, registrar_conexao, usuario_online, criar_notificacoes,
+)
+from .tasks import (
+    processar_notificacoes_pendentes, verificar_clientes_inativos, limpar_notificacoes_antigas,
+    lembrar_visita, verificar_visitas_proximas,
+)
+
+TEST_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'servicos-testes'}}
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class TotaisPersistidosOSTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        cls.ssd = Produto.objects.create(nome='SSD', estoque_atual=10, preco_venda_sugerido=Decimal('250.00'))
+        cls.cabo = Produto.objects.create(nome='Cabo', estoque_atual=10, preco_venda_sugerido=Decimal('19.90'))
+
+    def setUp(self):
+        self.os = OrdemServico.objects.create(
+            cliente=self.cliente, titulo='Troca de SSD', descricao_problema='x',
+            valor_mao_de_obra=Decimal('120.00'), desconto=Decimal('10.00'),
+        )
+
+    def _totais(self):
+        return OrdemServico.objects.values_list('total_pecas', 'valor_total_geral').get(pk=self.os.pk)
+
+    def test_itens_e_campos_da_os_mantem_os_totais(self):
+        self.assertEqual(self._totais(), (Decimal('0.00'), Decimal('110.00')))
+
+        adicionar_peca_os(self.os.id, self.ssd.id, 1)
+        item_cabo = adicionar_peca_os(self.os.id, self.cabo.id, 2)
+        self.assertEqual(self._totais(), (Decimal('289.80'), Decimal('399.80')))
+
+        adicionar_peca_os(self.os.id, self.cabo.id, 1)
+        self.assertEqual(self._totais(), (Decimal('309.70'), Decimal('419.70')))
+
+        atualizar_ordem_servico(self.os.id, {'valor_mao_de_obra': '200', 'desconto': '0'})
+        self.assertEqual(self._totais(), (Decimal('309.70'), Decimal('509.70')))
+
+        ItemServico.objects.get(pk=item_cabo.pk).delete()
+        self.assertEqual(self._totais(), (Decimal('250.00'), Decimal('450.00')))
+
+    def test_save_com_instancia_antiga_nao_perde_os_itens(self):
+        antiga = OrdemServico.objects.get(pk=self.os.pk)
+        adicionar_peca_os(self.os.id, self.ssd.id, 2)
+        antiga.titulo = 'Outro título'
+        antiga.save()
+        self.assertEqual(self._totais(), (Decimal('500.00'), Decimal('610.00')))
+
+    def test_comando_de_conferencia_corrige_divergencias(self):
+        adicionar_peca_os(self.os.id, self.ssd.id, 1)
+        OrdemServico.objects.filter(pk=self.os.pk).update(total_pecas=0, valor_total_geral=0)
+
+        saida = StringIO()
+        call_command('verificar_totais_os', stdout=saida)
+        self.assertIn(f'OS #{self.os.pk}', saida.getvalue())
+        self.assertEqual(self._totais(), (Decimal('0.00'), Decimal('0.00')))
+
+        call_command('verificar_totais_os', '--corrigir', stdout=StringIO())
+        self.assertEqual(self._totais(), (Decimal('250.00'), Decimal('360.00')))
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class FinalizacaoOSEstoqueTest(TestCase):
+    def test_finalizacao_baixa_estoque_uma_unica_vez(self):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        ssd = Produto.objects.create(nome='SSD', estoque_atual=3, preco_venda_sugerido=Decimal('250.00'))
+        os_obj = OrdemServico.objects.create(cliente=cliente, titulo='Troca', descricao_problema='x')
+        adicionar_peca_os(os_obj.id, ssd.id, 2)
+
+        # Instância antiga (ainda ABERTA) não finaliza de novo depois da primeira
+        antiga = OrdemServico.objects.get(pk=os_obj.pk)
+        finalizar_ordem_servico(OrdemServico.objects.get(pk=os_obj.pk), user)
+        with self.assertRaisesMessage(ValidationError, 'OS já finalizada.'):
+            finalizar_ordem_servico(antiga, user)
+
+        ssd.refresh_from_db()
+        self.assertEqual(ssd.estoque_atual, Decimal('1.00'))
+        movimentacao = MovimentacaoEstoque.objects.get()
+        self.assertEqual((movimentacao.tipo_movimento, movimentacao.quantidade), ('SAIDA', Decimal('2.00')))
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ListagemOSSemAgregadosTest(APITestCase):
+    def test_listagem_nao_soma_itens_por_linha(self):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        Equipe.objects.create(usuario=user, nome='Test User', cargo='TECNICO')
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        for i in range(3):
+            OrdemServico.objects.create(cliente=cliente, titulo=f'OS {i}', descricao_problema='x')
+
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/servicos/', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'SUM(' in q['sql'].upper()])
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, CACHES=TEST_CACHES)
+class OutboxNotificacoesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        self.gestores = [User.objects.create_user(username=f'gestor{i}', password='x') for i in range(2)]
+        for user in self.gestores:
+            Equipe.objects.create(usuario=user, nome=user.username, cargo='GESTOR')
+        tecnico_user = User.objects.create_user(username='tecnico', password='x')
+        self.tecnico = Equipe.objects.create(usuario=tecnico_user, nome='Técnico', cargo='TECNICO')
+
+    def _novo_chamado(self, **kwargs):
+        return Chamado.objects.create(cliente=self.cliente, descricao_detalhada='x', tecnico=self.tecnico, **kwargs)
+
+    def test_rollback_nao_gera_notificacao(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self._novo_chamado()
+            raise RuntimeError('falha depois do save')
+
+        self.assertFalse(NotificacaoPendente.objects.exists())
+        processar_notificacoes_pendentes()
+        self.assertFalse(Notificacao.objects.exists())
+
+    def test_save_so_grava_outbox_e_consumidor_entrega_em_lote(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            chamado = self._novo_chamado()
+        self.assertIn(_agendar_processamento_notificacoes, callbacks)
+        self.assertEqual(NotificacaoPendente.objects.count(), 1)
+        self.assertFalse(Notificacao.objects.exists())
+
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'user_{self.gestores[0].id}', canal)
+        registrar_conexao(self.gestores[0].id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(processar_notificacoes_pendentes(), 3)  # 2 gestores + técnico
+
+        self.assertEqual(
+            set(Notificacao.objects.values_list('destinatario__username', flat=True)),
+            {'gestor0', 'gestor1', 'tecnico'},
+        )
+        self.assertFalse(NotificacaoPendente.objects.filter(processado_em__isnull=True).exists())
+        mensagem = async_to_sync(layer.receive)(canal)
+        self.assertEqual(mensagem['type'], 'send_notifications')
+        self.assertEqual(mensagem['messages'][0]['titulo'], 'Novo Chamado Aberto')
+        self.assertEqual(mensagem['messages'][0]['mensagem'], f'Chamado #{chamado.protocolo} aberto para o cliente Cliente.')
+
+    def test_finalizacao_notifica_uma_vez(self):
+        chamado = self._novo_chamado()
+        processar_notificacoes_pendentes()
+
+        chamado.status = 'FINALIZADO'
+        chamado.save()
+        chamado.save()  # continua finalizado: não enfileira de novo
+        self.assertEqual(NotificacaoPendente.objects.filter(titulo='Chamado Finalizado').count(), 1)
+
+        chamado.status = 'ABERTO'
+        chamado.save()
+        chamado.status = 'FINALIZADO'
+        chamado.save()
+        processar_notificacoes_pendentes()
+        self.assertEqual(Notificacao.objects.filter(titulo='Chamado Finalizado').count(), 3)
+
+    def test_linha_ruim_nao_trava_a_fila(self):
+        removido = User.objects.create_user(username='removido', password='x')
+        NotificacaoPendente.objects.create(titulo='Removido', mensagem='m', destinatarios=[removido.id, self.gestores[0].id])
+        NotificacaoPendente.objects.create(titulo='Ruim', mensagem='m', destinatarios=[self.gestores[0].id])
+        NotificacaoPendente.objects.create(titulo='Boa', mensagem='m', destinatarios=[self.gestores[1].id])
+        removido.delete()  # saiu antes do processamento
+
+        def criar(notificacoes):
+            if any(n.titulo == 'Ruim' for n in notificacoes):
+                raise DatabaseError('linha ruim')
+            return criar_notificacoes(notificacoes)
+
+        with mock.patch('servicos.tasks.criar_notificacoes', side_effect=criar):
+            self.assertEqual(processar_notificacoes_pendentes(), 2)
+        self.assertEqual(
+            set(Notificacao.objects.values_list('titulo', 'destinatario_id')),
+            {('Removido', self.gestores[0].id), ('Boa', self.gestores[1].id)},
+        )
+        self.assertFalse(NotificacaoPendente.objects.filter(processado_em__isnull=True).exists())
+
+    def test_retencao_apaga_outbox_processada_antiga(self):
+        NotificacaoPendente.objects.create(titulo='A', mensagem='m', processado_em=timezone.now() - timedelta(days=8))
+        recente = NotificacaoPendente.objects.create(titulo='B', mensagem='m', processado_em=timezone.now())
+        pendente = NotificacaoPendente.objects.create(titulo='C', mensagem='m')
+        limpar_notificacoes_antigas()
+        self.assertEqual(set(NotificacaoPendente.objects.values_list('id', flat=True)), {recente.id, pendente.id})
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, CACHES=TEST_CACHES, NOTIFICACOES_RETENCAO_DIAS=30, NOTIFICACOES_ARQUIVAR=True)
+class CicloDeVidaNotificacoesTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gestor', password='x')
+        Equipe.objects.create(usuario=self.user, nome='Gestor', cargo='GESTOR')
+
+    def _notificacao(self, dias_atras=0, **kwargs):
+        notificacao = Notificacao.objects.create(destinatario=self.user, titulo='T', mensagem='M', **kwargs)
+        Notificacao.objects.filter(pk=notificacao.pk).update(data_criacao=timezone.now() - timedelta(days=dias_atras))
+        return notificacao
+
+    def test_churn_usa_chave_de_deduplicacao(self):
+        cliente = Cliente.objects.create(razao_social='Sumido', nome='Sumido')
+        verificar_clientes_inativos()
+        cliente.razao_social = 'Sumido Renomeado'
+        cliente.save()
+        verificar_clientes_inativos()
+
+        self.assertEqual(
+            list(Notificacao.objects.values_list('chave_deduplicacao', flat=True)), [f'churn:{cliente.id}']
+        )
+
+    def test_churn_pela_ultima_atividade_em_queries_constantes(self):
+        ativo = Cliente.objects.create(razao_social='Ativo', nome='Ativo')
+        Chamado.objects.create(cliente=ativo, descricao_detalhada='x')
+        OrdemServico.objects.create(cliente=ativo, titulo='OS')
+        ativo.refresh_from_db()
+        self.assertIsNotNone(ativo.ultima_atividade_em)
+
+        sumidos = [Cliente.objects.create(razao_social=f'Sumido {i}', nome=f'Sumido {i}') for i in range(5)]
+        Cliente.objects.filter(pk=sumidos[0].pk).update(ultima_atividade_em=timezone.now() - timedelta(days=40))
+        outro_gestor = User.objects.create_user(username='socio', password='x')
+        Equipe.objects.create(usuario=outro_gestor, nome='Sócio', cargo='SOCIO')
+
+        # gestores + clientes + chaves existentes + bulk_create (num savepoint: 2 a mais)
+        with self.assertNumQueries(6):
+            verificar_clientes_inativos()
+
+        self.assertEqual(
+            set(Notificacao.objects.values_list('chave_deduplicacao', flat=True)),
+            {f'churn:{c.id}' for c in sumidos},
+        )
+        self.assertEqual(Notificacao.objects.count(), 10)  # 5 clientes x 2 gestores
+
+    def test_lista_paginada_e_filtrada(self):
+        for i in range(25):
+            self._notificacao(dias_atras=i, lida=(i % 2 == 0))
+        self.client.force_authenticate(user=self.user)
+
+        primeira = self.client.get('/api/notificacoes/').data
+        self.assertEqual(len(primeira['results']), 20)
+        segunda = self.client.get(primeira['next']).data
+        self.assertEqual(len(segunda['results']), 5)
+        self.assertIsNone(segunda['next'])
+
+        nao_lidas = self.client.get('/api/notificacoes/?lida=false').data['results']
+        self.assertEqual(len(nao_lidas), 12)
+        self.assertTrue(all(not n['lida'] for n in nao_lidas))
+
+    def test_retencao_arquiva_lidas_antigas_em_lotes(self):
+        antigas = [self._notificacao(dias_atras=40, lida=True) for _ in range(5)]
+        nao_lida = self._notificacao(dias_atras=40, lida=False)
+        recente = self._notificacao(dias_atras=1, lida=True)
+
+        self.assertEqual(limpar_notificacoes_antigas(lote=2), 5)
+        self.assertEqual(set(Notificacao.objects.values_list('id', flat=True)), {nao_lida.id, recente.id})
+        self.assertEqual(
+            set(NotificacaoArquivada.objects.values_list('notificacao_id', flat=True)), {n.id for n in antigas}
+        )
+
+        self._notificacao(dias_atras=40, lida=True)
+        self.assertEqual(limpar_notificacoes_antigas(arquivar=False), 1)
+        self.assertEqual(NotificacaoArquivada.objects.count(), 5)
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, CACHES=TEST_CACHES)
+class ContadorNaoLidasTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='gestor', password='x')
+        Equipe.objects.create(usuario=self.user, nome='Gestor', cargo='GESTOR')
+        self.client.force_authenticate(user=self.user)
+
+    def _contador(self):
+        return self.client.get('/api/notificacoes/contador/').data['nao_lidas']
+
+    def test_contador_acompanha_criacao_e_leitura(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primeira = Notificacao.objects.create(destinatario=self.user, titulo='A', mensagem='a')
+        self.assertEqual(self._contador(), 1)  # cache vazio: contou no banco
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacao.objects.create(destinatario=self.user, titulo='B', mensagem='b')
+            NotificacaoPendente.objects.create(titulo='C', mensagem='c', destinatarios=[self.user.id])
+            processar_notificacoes_pendentes()
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_nao_lidas(self.user.id), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/notificacoes/{primeira.id}/marcar_como_lida/')
+        self.assertEqual(self._contador(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/notificacoes/marcar_todas_lidas/')
+        self.assertEqual(self._contador(), 0)
+
+    def test_cache_fora_do_ar_nao_derruba_a_gravacao(self):
+        notificacao = Notificacao.objects.create(destinatario=self.user, titulo='A', mensagem='a')
+        fora_do_ar = mock.Mock(**{
+            f'{metodo}.side_effect': ConnectionError('redis indisponível') for metodo in ('get', 'set', 'incr')
+        })
+        with mock.patch('servicos.services.cache', fora_do_ar):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notificacao.objects.create(destinatario=self.user, titulo='B', mensagem='b')
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/notificacoes/{notificacao.id}/marcar_como_lida/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['nao_lidas'], 1)  # contou no banco
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.patch('/api/notificacoes/marcar_todas_lidas/').status_code, 200)
+
+    def test_ws_leva_o_total_de_nao_lidas(self):
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'user_{self.user.id}', canal)
+        registrar_conexao(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificacaoPendente.objects.create(titulo='C', mensagem='c', destinatarios=[self.user.id])
+            processar_notificacoes_pendentes()
+
+        self.assertEqual(async_to_sync(layer.receive)(canal)['nao_lidas'], 1)
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, CACHES=TEST_CACHES)
+class PresencaEReenvioWSTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='gestor', password='x')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def _notificacao(self, titulo):
+        return Notificacao.objects.create(destinatario=self.user, titulo=titulo, mensagem='m')
+
+    async def _conectar(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/notificacoes/{self.user.id}/'
+        )
+        conectado, _ = await communicator.connect()
+        self.assertTrue(conectado)
+        return communicator
+
+    def test_offline_nao_envia_e_reconexao_reenvia(self):
+        recebida = self._notificacao('Recebida')
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'user_{self.user.id}', canal)
+
+        # Ninguém conectado: nem passa pelo channel layer
+        NotificacaoPendente.objects.create(titulo='Perdida', mensagem='m', destinatarios=[self.user.id])
+        processar_notificacoes_pendentes()
+        self.assertFalse(usuario_online(self.user.id))
+        self.assertNotIn(canal, layer.channels)
+
+        async def reconectar():
+            communicator = await self._conectar()
+            # Token no primeiro frame, não na URL (logs de acesso)
+            await communicator.send_json_to({'token': self.token, 'ultimo_id': recebida.id})
+            frame = await communicator.receive_json_from()
+            self.assertTrue(await communicator.receive_nothing())
+            online = await sync_to_async(usuario_online)(self.user.id)
+            await communicator.disconnect()
+            return frame, online
+
+        frame, online = async_to_sync(reconectar)()
+        self.assertTrue(online)
+        self.assertFalse(usuario_online(self.user.id))
+        self.assertEqual(frame['message']['titulo'], 'Perdida')
+        self.assertEqual(frame['nao_lidas'], 2)
+
+    def test_primeira_conexao_com_ultimo_id_zero_reenvia_recentes(self):
+        # Notificação criada antes de o histórico REST chegar ao cliente
+        self._notificacao('Antes do REST')
+
+        async def conectar():
+            communicator = await self._conectar()
+            await communicator.send_json_to({'token': self.token, 'ultimo_id': 0})
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        self.assertEqual(async_to_sync(conectar)()['message']['titulo'], 'Antes do REST')
+
+    def test_reenvio_exige_token_do_proprio_usuario(self):
+        ultima = self._notificacao('Antiga')
+        self._notificacao('Nova')
+        outro = User.objects.create_user(username='outro', password='x')
+
+        async def conectar(frame):
+            communicator = await self._conectar()
+            await communicator.send_json_to(frame)
+            vazio = await communicator.receive_nothing(timeout=0.5)
+            await communicator.disconnect()
+            return vazio
+
+        self.assertTrue(async_to_sync(conectar)({'ultimo_id': ultima.id}))
+        self.assertTrue(async_to_sync(conectar)({'ultimo_id': ultima.id, 'token': str(AccessToken.for_user(outro))}))
+
+    def test_ping_mantem_online_mesmo_apos_perder_a_chave(self):
+        async def sessao():
+            communicator = await self._conectar()
+            await sync_to_async(cache.clear)()  # TTL vencido / flush do Redis com a aba aberta
+            offline = not await sync_to_async(usuario_online)(self.user.id)
+            await communicator.send_json_to({'tipo': 'ping'})
+            self.assertEqual(await communicator.receive_json_from(), {'tipo': 'pong'})
+            online = await sync_to_async(usuario_online)(self.user.id)
+            await communicator.disconnect()
+            return offline, online
+
+        self.assertEqual(async_to_sync(sessao)(), (True, True))
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ComentariosWSTest(TransactionTestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        self.os = OrdemServico.objects.create(cliente=cliente, titulo='OS', descricao_problema='x')
+        self.tecnico = User.objects.create_user(username='tecnico', password='x')
+        Equipe.objects.create(usuario=self.tecnico, nome='Técnico', cargo='TECNICO')
+        self.externo = User.objects.create_user(username='externo', password='x')
+
+    def _autenticar(self, token):
+        async def conectar():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/comentarios/os/{self.os.id}/')
+            conectado, _ = await communicator.connect()
+            self.assertTrue(conectado)
+            await communicator.send_json_to({'token': token})
+            resposta = await communicator.receive_output()
+            if resposta['type'] == 'websocket.close':
+                return resposta['code'], None
+            await get_channel_layer().group_send(
+                f'comentarios_os_{self.os.id}', {'type': 'novo_comentario', 'comentario': {'id': 1}}
+            )
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return 'ok', frame
+
+        return async_to_sync(conectar)()
+
+    def test_so_entra_no_grupo_com_token_de_quem_pode_ver(self):
+        self.assertEqual(self._autenticar('invalido'), (4403, None))
+        # Sem perfil na equipe não vê OS
+        self.assertEqual(self._autenticar(str(AccessToken.for_user(self.externo))), (4403, None))
+        self.assertEqual(self._autenticar(str(AccessToken.for_user(self.tecnico))), ('ok', {'comentario': {'id': 1}}))
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, CACHES=TEST_CACHES)
+class LembreteVisitaTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+        self.user = User.objects.create_user(username='tecnico', password='x')
+        self.tecnico = Equipe.objects.create(usuario=self.user, nome='Técnico', cargo='TECNICO')
+        self.chamado = Chamado.objects.create(cliente=self.cliente, descricao_detalhada='x', tecnico=self.tecnico)
+
+    def _agendar(self, data):
+        with mock.patch.object(lembrar_visita, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chamado.status = 'AGENDADO'
+                self.chamado.data_agendamento = data
+                self.chamado.save()
+        return apply_async
+
+    def test_agenda_com_eta_e_so_dispara_para_a_data_vigente(self):
+        primeira = timezone.now() + timedelta(hours=5)
+        apply_async = self._agendar(primeira)
+        args, kwargs = apply_async.call_args
+        self.assertEqual(kwargs['eta'], primeira - timedelta(hours=2))
+
+        segunda = primeira + timedelta(hours=1)
+        self._agendar(segunda)
+        lembrar_visita(*args[0])  # lembrete da data antiga: remarcado, não envia
+        self.assertFalse(Notificacao.objects.filter(tipo='VISITA').exists())
+
+        lembrar_visita(self.chamado.id, segunda.isoformat())
+        lembrar_visita(self.chamado.id, segunda.isoformat())  # re-entrega do broker
+        self.assertEqual(Notificacao.objects.filter(tipo='VISITA', destinatario=self.user).count(), 1)
+
+    def test_lembretes_concorrentes_da_mesma_visita_nao_falham(self):
+        data = timezone.now() + timedelta(hours=1)
+        self._agendar(data)
+        lembrar_visita(self.chamado.id, data.isoformat())
+
+        # O outro worker checou antes do insert do primeiro: a checagem não vê a linha
+        with mock.patch.object(Notificacao.objects, 'filter', return_value=Notificacao.objects.none()):
+            lembrar_visita(self.chamado.id, data.isoformat())
+        self.assertEqual(Notificacao.objects.filter(tipo='VISITA', destinatario=self.user).count(), 1)
+
+    def test_salvar_sem_mudar_a_agenda_nao_reagenda(self):
+        self._agendar(timezone.now() + timedelta(hours=5))
+        with mock.patch.object(lembrar_visita, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chamado.titulo = 'Outro título'
+                self.chamado.save()
+        apply_async.assert_not_called()
+
+    def test_visita_distante_fica_para_a_varredura(self):
+        apply_async = self._agendar(timezone.now() + timedelta(days=3))
+        apply_async.assert_not_called()
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=2, hours=12)), \
+                mock.patch.object(lembrar_visita, 'apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            verificar_visitas_proximas()
+        self.assertEqual(apply_async.call_count, 1)
 
-# Create your tests here.
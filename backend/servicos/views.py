@@ -3,23 +3,28 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.utils import timezone
 import traceback
-import os
-from django.conf import settings
 
-from utils.pdf_service import gerar_pdf_from_html
+from core.models import TarefaPDF
+from core.serializers import TarefaPDFSerializer
+from core.services import solicitar_pdf
+from utils.pdf_service import responder_pdf
 
 from utils.permissions import IsFuncionario
+from utils.pagination import KeysetPagination
+from utils.comentarios import feed_comentarios, publicar_comentario, grupo_comentarios
 from .models import OrdemServico, ItemServico, AnexoServico, Notificacao, ComentarioOrdemServico
 from .serializers import OrdemServicoSerializer, ItemServicoSerializer, AnexoServicoSerializer, NotificacaoSerializer, ComentarioOrdemServicoSerializer
 
 # Importa a lógica de negócio
-from .services import finalizar_ordem_servico, adicionar_peca_os, atualizar_ordem_servico
+from .services import (
+    finalizar_ordem_servico, adicionar_peca_os, atualizar_ordem_servico, orcamento_os_pdf_pronto,
+    contar_nao_lidas, ajustar_nao_lidas, zerar_nao_lidas,
+)
 
 class OrdemServicoViewSet(viewsets.ModelViewSet):
     serializer_class = OrdemServicoSerializer
+    pagination_class = KeysetPagination  # opt-in: ?paginacao=cursor
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -131,9 +136,8 @@ class OrdemServicoViewSet(viewsets.ModelViewSet):
     def comentarios(self, request, pk=None):
         ordem_servico = self.get_object()
         if request.method == 'GET':
-            comentarios = ordem_servico.comentarios.all()
-            serializer = ComentarioOrdemServicoSerializer(comentarios, many=True, context={'request': request})
-            return Response(serializer.data)
+            # Incremental: ?since_id= / ?since=, paginado (?limite=)
+            return feed_comentarios(ordem_servico.comentarios.all(), request, ComentarioOrdemServicoSerializer)
         
         if request.method == 'POST':
             autor = getattr(request.user, 'equipe', None)
@@ -143,41 +147,27 @@ class OrdemServicoViewSet(viewsets.ModelViewSet):
             serializer = ComentarioOrdemServicoSerializer(data=request.data, context={'request': request})
             if serializer.is_valid():
                 serializer.save(ordem_servico=ordem_servico, autor=autor)
+                publicar_comentario(grupo_comentarios('os', ordem_servico.id), dict(serializer.data))
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=True, methods=['post'], url_path='gerar_orcamento')
+    @action(detail=True, methods=['get', 'post'], url_path='gerar_orcamento')
     def gerar_orcamento(self, request, pk=None):
+        """
+        POST: enfileira o PDF do orçamento; acompanhar em /api/tarefas-pdf/<id>/ (ou evento 'pdf_pronto').
+        GET: download direto com ETag se o PDF da OS atual já existe; senão, como o POST
+        (202 + tarefa): o WeasyPrint nunca roda no worker web.
+        """
         os_obj = self.get_object()
-        
-        itens_list = list(os_obj.itens.all()) if hasattr(os_obj, 'itens') else []
-        num_itens = len(itens_list)
-        # Calculate how many empty rows are needed to reach a minimum of 5
-        empty_rows = range(5 - num_itens) if num_itens < 5 else []
-
-        context = {
-            'os': os_obj,
-            'cliente': os_obj.cliente,
-            'itens': itens_list,
-            'empty_rows': empty_rows,
-            'mao_de_obra': os_obj.valor_mao_de_obra,
-            'desconto': os_obj.desconto,
-            'valor_final': os_obj.valor_total_geral,
-            'data_hoje': timezone.now(),
-            'observacoes': os_obj.descricao_problema or "Observações do serviço...",
-            'logo_path': f"file://{os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')}"
-        }
-        
-        try:
-            pdf_file = gerar_pdf_from_html('utils/pdfs/orcamento.html', context)
-            
-            file_name = f"Orcamento_OS_{os_obj.id}_{timezone.now().strftime('%Y%m%d')}.pdf"
-            os_obj.arquivo_orcamento.save(file_name, pdf_file, save=True)
-            
-            return Response({"mensagem": "Orçamento gerado com sucesso", "url": request.build_absolute_uri(os_obj.arquivo_orcamento.url)})
-        except Exception as e:
-            traceback.print_exc()
-            return Response({"erro": f"Erro ao gerar PDF: {str(e)}"}, status=500)
+        if request.method == 'GET':
+            nome, chave = orcamento_os_pdf_pronto(os_obj)
+            if nome:
+                return responder_pdf(request, nome, chave, f"Orcamento_OS_{os_obj.id}.pdf")
+
+        tarefa = solicitar_pdf(TarefaPDF.Documento.ORCAMENTO_OS, os_obj.id, request.user)
+        # 200 quando o PDF já existia (cache por conteúdo); 202 quando foi para a fila
+        codigo = status.HTTP_200_OK if tarefa.status == TarefaPDF.Status.CONCLUIDO else status.HTTP_202_ACCEPTED
+        return Response(TarefaPDFSerializer(tarefa, context={'request': request}).data, status=codigo)
 
     def _format_validation_error(self, e):
         if hasattr(e, 'message_dict'):
@@ -206,21 +196,43 @@ class AnexoServicoViewSet(viewsets.ModelViewSet):
             raise ValidationError("Operação bloqueada: A Ordem de Serviço já foi concluída.")
         instance.delete()
 
+class NotificacaoPagination(KeysetPagination):
+    """Caixa de notificações sempre paginada (mais recentes primeiro), via índice (destinatario, lida, data_criacao)."""
+    campo_ordem = 'data_criacao'
+    sempre_ativo = True
+
+
 class NotificacaoViewSet(viewsets.ModelViewSet):
     serializer_class = NotificacaoSerializer
     permission_classes = [IsFuncionario]
+    pagination_class = NotificacaoPagination
 
     def get_queryset(self):
-        return Notificacao.objects.filter(destinatario=self.request.user)
+        qs = Notificacao.objects.filter(destinatario=self.request.user)
+        lida = self.request.query_params.get('lida')
+        if lida in ('true', 'false'):
+            qs = qs.filter(lida=(lida == 'true'))
+        return qs
 
     @action(detail=True, methods=['patch'])
     def marcar_como_lida(self, request, pk=None):
         notificacao = self.get_object()
         notificacao.lida = True
-        notificacao.save()
-        return Response({'status': 'ok'})
+        notificacao.save(update_fields=['lida'])  # contador: signal do post_save
+        return Response({'status': 'ok', 'nao_lidas': contar_nao_lidas(request.user.id)})
         
     @action(detail=False, methods=['patch'])
     def marcar_todas_lidas(self, request):
-        self.get_queryset().update(lida=True)
-        return Response({'status': 'ok'})
\ No newline at end of file
+        Notificacao.objects.filter(destinatario=request.user, lida=False).update(lida=True)
+        zerar_nao_lidas(request.user.id)
+        return Response({'status': 'ok', 'nao_lidas': 0})
+
+    @action(detail=False, methods=['get'])
+    def contador(self, request):
+        """Badge do sino: só o número de não lidas (cache; recalcula do banco se faltar)."""
+        return Response({'nao_lidas': contar_nao_lidas(request.user.id)})
+
+    def perform_destroy(self, instance):
+        if not instance.lida:
+            ajustar_nao_lidas({instance.destinatario_id: -1})
+        instance.delete()
\ No newline at end of file
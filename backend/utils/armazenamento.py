@@ -0,0 +1,67 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PREFIXO_BLOBS = 'blobs/'
+
+
+@deconstructible(path='utils.armazenamento.ArmazenamentoPorConteudo')
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """
+    Storage endereçado por conteúdo (SHA-256) dentro do MEDIA_ROOT.
+
+    Cada arquivo é gravado em blobs/ab/cd/<sha256><ext>: o mesmo conteúdo
+    enviado duas vezes (ou por módulos diferentes) ocupa um único arquivo.
+    "Copiar" um anexo entre chamados, financeiro e estoque é só atribuir o
+    mesmo nome ao outro FileField (ver compartilhar_arquivo).
+
+    O upload_to dos campos é ignorado para arquivos novos; nomes antigos
+    (fora de blobs/) continuam sendo servidos normalmente.
+    As referências são contadas em core.BlobArquivo (core.signals).
+    """
+
+    def _save(self, name, content):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        extensao = os.path.splitext(name)[1].lower()
+        nome = f'{PREFIXO_BLOBS}{digest[:2]}/{digest[2:4]}/{digest}{extensao}'
+        if self.exists(nome):
+            return nome
+        # Grava num nome temporário e renomeia: o blob só aparece completo e dois
+        # uploads simultâneos do mesmo conteúdo terminam no mesmo arquivo (o rename
+        # sobrescreve bytes idênticos) em vez de cair no get_available_name (<sha>_XXXX)
+        temporario = super()._save(f'{nome}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporario), self.path(nome))
+        return nome
+
+
+armazenamento_conteudo = ArmazenamentoPorConteudo()
+
+
+def eh_blob(nome):
+    return bool(nome) and nome.startswith(PREFIXO_BLOBS)
+
+
+def sha256_do_nome(nome):
+    return os.path.splitext(os.path.basename(nome))[0]
+
+
+def compartilhar_arquivo(arquivo):
+    """
+    Nome persistido de um FieldFile, para ser atribuído a outro FileField
+    sem copiar bytes. Se o arquivo ainda não foi gravado (upload pendente
+    no mesmo request), grava agora no storage.
+    """
+    if not arquivo:
+        return None
+    if not arquivo._committed:
+        arquivo.save(arquivo.name, arquivo.file, save=False)
+    return arquivo.name
@@ -0,0 +1,73 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+LIMITE_COMENTARIOS = 50
+LIMITE_MAXIMO_COMENTARIOS = 200
+
+
+def grupo_comentarios(tipo, objeto_id):
+    """Grupo do channels com quem está com o chamado/OS aberto (ver ComentariosConsumer)."""
+    return f"comentarios_{tipo}_{objeto_id}"
+
+
+def feed_comentarios(queryset, request, serializer_class):
+    """
+    Lista incremental de comentários (ordem de criação).
+
+    ?since_id=<id>      só comentários depois deste id (tela aberta buscando novos)
+    ?since=<iso>        só comentários criados depois desta data/hora
+    ?limite=<n>         tamanho da página (padrão 50, máx. 200)
+
+    Sem nenhum desses parâmetros devolve a lista completa (telas de detalhe
+    atuais). Com eles, pagina: o corpo continua sendo uma lista e o header
+    X-Tem-Mais indica se há mais páginas (continuar com since_id = id do último item).
+    """
+    params = request.query_params
+    paginado = any(params.get(p) for p in ('since_id', 'since', 'limite'))
+    queryset = queryset.select_related('autor').order_by('id')
+
+    since_id = params.get('since_id')
+    if since_id:
+        if not since_id.isdigit():
+            raise ValidationError({'since_id': 'Informe um id numérico.'})
+        queryset = queryset.filter(id__gt=int(since_id))
+
+    since = params.get('since')
+    if since:
+        try:
+            momento = parse_datetime(since)
+        except ValueError:
+            momento = None
+        if momento is None:
+            raise ValidationError({'since': 'Data/hora inválida (use ISO 8601).'})
+        queryset = queryset.filter(created_at__gt=momento)
+
+    if paginado:
+        try:
+            limite = min(max(int(params.get('limite', LIMITE_COMENTARIOS)), 1), LIMITE_MAXIMO_COMENTARIOS)
+        except ValueError:
+            limite = LIMITE_COMENTARIOS
+        comentarios = list(queryset[:limite + 1])
+        tem_mais = len(comentarios) > limite
+        comentarios = comentarios[:limite]
+    else:
+        comentarios, tem_mais = list(queryset), False
+    serializer = serializer_class(comentarios, many=True, context={'request': request})
+
+    response = Response(serializer.data)
+    response['X-Tem-Mais'] = 'true' if tem_mais else 'false'
+    return response
+
+
+def publicar_comentario(grupo, dados):
+    """Envia o comentário novo para quem está na tela, depois do commit."""
+    def enviar():
+        async_to_sync(get_channel_layer().group_send)(grupo, {
+            "type": "novo_comentario",
+            "comentario": dados,
+        })
+    transaction.on_commit(enviar)
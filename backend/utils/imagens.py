@@ -0,0 +1,97 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+# Lado maior (px) de cada variante e formatos gerados para cada uma
+TAMANHOS_VARIANTES = {'thumb': 256, 'medio': 1024}
+FORMATOS_VARIANTES = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _pasta_variantes(nome_original):
+    # Nome determinístico: a mesma origem sempre gera os mesmos caminhos
+    # (blobs iguais compartilham as variantes; reprocessar é idempotente).
+    return f"variantes/{hashlib.sha256(nome_original.encode()).hexdigest()[:40]}"
+
+
+def gerar_variantes(arquivo):
+    """
+    Gera thumb/medio em WebP e JPEG para a imagem de um FieldFile, sem EXIF
+    (a orientação é aplicada antes), e grava no default_storage.
+    Retorna {'origem': nome, 'thumb': {'webp': caminho, 'jpeg': caminho}, 'medio': {...}}.
+    """
+    from PIL import Image, ImageOps
+
+    pasta = _pasta_variantes(arquivo.name)
+    variantes = {'origem': arquivo.name}
+
+    with arquivo.open('rb'):
+        imagem = Image.open(arquivo)
+        # JPEG grande: decodifica já reduzido (bem mais rápido que abrir inteiro)
+        imagem.draft('RGB', (max(TAMANHOS_VARIANTES.values()),) * 2)
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.load()
+
+    icc_profile = imagem.info.get('icc_profile')
+    if imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if imagem.mode in ('LA', 'P', 'PA') else 'RGB')
+    imagem.info = {}
+
+    for variante, lado in TAMANHOS_VARIANTES.items():
+        reduzida = imagem.copy()
+        reduzida.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        variantes[variante] = {}
+
+        for extensao, (formato, opcoes) in FORMATOS_VARIANTES.items():
+            nome = f"{pasta}/{variante}.{extensao}"
+            variantes[variante][extensao] = nome
+            if default_storage.exists(nome):
+                continue
+
+            saida = reduzida
+            if formato == 'JPEG' and saida.mode == 'RGBA':
+                fundo = Image.new('RGB', saida.size, (255, 255, 255))
+                fundo.paste(saida, mask=saida.getchannel('A'))
+                saida = fundo
+
+            buffer = BytesIO()
+            # Sem exif=...: o Pillow não copia metadados para a saída
+            saida.save(buffer, formato, icc_profile=icc_profile, **opcoes)
+            default_storage.save(nome, ContentFile(buffer.getvalue()))
+
+    return variantes
+
+
+def urls_variantes(instance, campo, request=None):
+    """URLs das variantes do campo, ou None se ainda não foram geradas para a imagem atual."""
+    arquivo = getattr(instance, campo)
+    dados = (instance.variantes_imagens or {}).get(campo)
+    if not arquivo or not dados or dados.get('origem') != arquivo.name:
+        return None
+
+    def absoluta(nome):
+        url = default_storage.url(nome)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        variante: {extensao: absoluta(nome) for extensao, nome in dados[variante].items()}
+        for variante in TAMANHOS_VARIANTES if variante in dados
+    }
+
+
+class VariantesImagemField(serializers.Field):
+    """Campo somente leitura com as URLs das variantes (thumb/medio, WebP/JPEG) de uma ImageField."""
+
+    def __init__(self, campo, **kwargs):
+        self.campo = campo
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return urls_variantes(instance, self.campo, self.context.get('request'))
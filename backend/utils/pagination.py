@@ -0,0 +1,163 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+def contagem_aproximada(queryset):
+    """
+    Total aproximado de linhas do queryset.
+    No PostgreSQL usa a estimativa do planner (EXPLAIN), sem varrer a tabela.
+    Em outros bancos (ex: SQLite dos testes) cai para um COUNT(*) normal.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plano = cursor.fetchone()[0]
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) em (campo_ordem, id), opt-in.
+
+    Ativada com ?paginacao=cursor (ou quando o cliente já manda um ?cursor=).
+    Não roda COUNT(*) nem OFFSET: cada página é um "WHERE (created_at, id) < cursor".
+    O total aproximado só é calculado com ?com_total=1.
+
+    Sem o opt-in, delega para `fallback_class` (ou não pagina, se for None),
+    mantendo o comportamento atual dos endpoints.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    modo_query_param = 'paginacao'
+    total_query_param = 'com_total'
+    fallback_class = None
+    campo_ordem = 'created_at'
+    sempre_ativo = False  # True: pagina sempre, sem precisar do ?paginacao=cursor
+
+    def __init__(self):
+        self._fallback = self.fallback_class() if self.fallback_class else None
+        self.ativo = False
+
+    # ------------------------------------------------------------------
+    # Opt-in
+    # ------------------------------------------------------------------
+    def _modo_cursor(self, request):
+        return (
+            self.sempre_ativo
+            or request.query_params.get(self.modo_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ativo = self._modo_cursor(request)
+        if not self.ativo:
+            if self._fallback:
+                return self._fallback.paginate_queryset(queryset, request, view)
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.total = None
+        if request.query_params.get(self.total_query_param) in ('1', 'true'):
+            self.total = contagem_aproximada(queryset)
+
+        posicao = self.decode_cursor(request)
+        reverso = bool(posicao and posicao['reverso'])
+
+        campo = self.campo_ordem
+        if posicao:
+            valor = posicao['created_at']
+            antes = Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'id__lt': posicao['id']})
+            depois = Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'id__gt': posicao['id']})
+            queryset = queryset.filter(depois if reverso else antes)
+
+        ordem = (campo, 'id') if reverso else (f'-{campo}', '-id')
+        resultados = list(queryset.order_by(*ordem)[:self.page_size + 1])
+        tem_mais = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+
+        if reverso:
+            resultados.reverse()
+            self.has_next = True
+            self.has_previous = tem_mais
+        else:
+            self.has_next = tem_mais
+            self.has_previous = posicao is not None
+
+        self.page = resultados
+        return resultados
+
+    def get_paginated_response(self, data):
+        if not self.ativo:
+            return self._fallback.get_paginated_response(data)
+
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total is not None:
+            payload['count_aproximado'] = self.total
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+            if tamanho > 0:
+                return min(tamanho, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    # ------------------------------------------------------------------
+    # Cursor
+    # ------------------------------------------------------------------
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created_at = parse_datetime(tokens['c'][0])
+            pk = int(tokens['i'][0])
+            reverso = tokens.get('r', ['0'])[0] == '1'
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound('Cursor inválido.')
+        if created_at is None:
+            raise NotFound('Cursor inválido.')
+        return {'created_at': created_at, 'id': pk, 'reverso': reverso}
+
+    def encode_cursor(self, obj, reverso=False):
+        tokens = {'c': getattr(obj, self.campo_ordem).isoformat(), 'i': obj.pk}
+        if reverso:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverso=True)
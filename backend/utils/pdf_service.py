@@ -1,10 +1,149 @@
-from django.template.loader import render_to_string
+import hashlib
+import logging
+import os
+import time
+from functools import lru_cache
+
+from django.template.loader import get_template, render_to_string
 from django.core.files.base import ContentFile
-from weasyprint import HTML
+from django.core.files.storage import default_storage
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+# Templates aquecidos ao subir o worker (ver config/celery.py)
+TEMPLATES_PDF = [
+    'utils/pdfs/orcamento.html',
+    'utils/pdfs/orcamento_venda.html',
+]
+
+# Mudou algo no motor de renderização que altera o PDF sem mudar HTML/CSS? Incrementar.
+VERSAO_CACHE_PDF = 1
+
+
+@lru_cache(maxsize=None)
+def _fontes():
+    # Descoberta de fontes (fontconfig) é cara: uma vez por processo
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _caminho_css(template_name):
+    caminho_template = get_template(template_name).origin.name
+    pasta, arquivo = os.path.split(caminho_template)
+    caminho_css = os.path.join(pasta, 'css', os.path.splitext(arquivo)[0] + '.css')
+    return caminho_css if os.path.exists(caminho_css) else None
+
+
+@lru_cache(maxsize=None)
+def _estilos(template_name):
+    """
+    CSS do template já parseado. Convenção: utils/pdfs/x.html -> utils/pdfs/css/x.css
+    (mesma pasta do template). Sem arquivo de CSS, devolve lista vazia.
+    """
+    caminho_css = _caminho_css(template_name)
+    if not caminho_css:
+        return []
+    return [CSS(filename=caminho_css, font_config=_fontes())]
+
+
+def aquecer_renderizador():
+    """Pré-carrega fontes, CSS e templates para o primeiro PDF não pagar o custo."""
+    inicio = time.perf_counter()
+    _fontes()
+    for template_name in TEMPLATES_PDF:
+        _estilos(template_name)
+    logger.info("Renderizador de PDF aquecido em %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+
+def _html_para_pdf(template_name, html_string):
+    inicio = time.perf_counter()
+    # Generate PDF bytes (fontes e CSS reaproveitados entre chamadas)
+    pdf_bytes = HTML(string=html_string).write_pdf(
+        stylesheets=_estilos(template_name), font_config=_fontes()
+    )
+    logger.info("PDF %s renderizado em %.0f ms", template_name, (time.perf_counter() - inicio) * 1000)
+    return pdf_bytes
+
 
 def gerar_pdf_from_html(template_name, context):
     # Render HTML string
     html_string = render_to_string(template_name, context)
-    # Generate PDF bytes
-    pdf_bytes = HTML(string=html_string).write_pdf()
-    return ContentFile(pdf_bytes)
\ No newline at end of file
+    return ContentFile(_html_para_pdf(template_name, html_string))
+
+
+def _versao_arquivo(caminho):
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return ''
+    return f"{info.st_mtime_ns}:{info.st_size}"
+
+
+def chave_pdf(template_name, context):
+    """
+    Hash do que define o PDF: versão do cache, HTML final (dados da OS/venda já
+    renderizados no template), CSS e arquivos locais referenciados (logo).
+    Renderizar o HTML custa milissegundos; o caro é o WeasyPrint.
+    Retorna (html, chave).
+    """
+    html_string = render_to_string(template_name, context)
+    hasher = hashlib.sha256(f"v{VERSAO_CACHE_PDF}\0{template_name}\0".encode())
+    hasher.update(html_string.encode())
+    caminho_css = _caminho_css(template_name)
+    if caminho_css:
+        hasher.update(_versao_arquivo(caminho_css).encode())
+    for valor in context.values():
+        if isinstance(valor, str) and valor.startswith('file://'):
+            hasher.update(_versao_arquivo(valor[len('file://'):]).encode())
+    return html_string, hasher.hexdigest()
+
+
+def nome_pdf_em_cache(pasta, chave):
+    return f"{pasta.rstrip('/')}/{chave}.pdf"
+
+
+def pdf_pronto(template_name, context, pasta):
+    """(nome do PDF já renderizado ou None, chave), sem chamar o WeasyPrint."""
+    _, chave = chave_pdf(template_name, context)
+    nome = nome_pdf_em_cache(pasta, chave)
+    return (nome if default_storage.exists(nome) else None), chave
+
+
+def pdf_em_cache(template_name, context, pasta):
+    """Nome do PDF já renderizado para este contexto (ou None), sem chamar o WeasyPrint."""
+    return pdf_pronto(template_name, context, pasta)[0]
+
+
+def obter_pdf(template_name, context, pasta):
+    """
+    PDF do contexto, renderizado só se ainda não existir no storage com a mesma chave.
+    Retorna (nome no default_storage, chave).
+    """
+    html_string, chave = chave_pdf(template_name, context)
+    nome = nome_pdf_em_cache(pasta, chave)
+    if not default_storage.exists(nome):
+        salvo = default_storage.save(nome, ContentFile(_html_para_pdf(template_name, html_string)))
+        if salvo != nome:
+            # Outro processo gravou o mesmo PDF no meio tempo: fica o dele
+            default_storage.delete(salvo)
+    return nome, chave
+
+
+def responder_pdf(request, nome, chave, filename):
+    """Download do PDF em cache com ETag; If-None-Match igual devolve 304 sem ler o arquivo."""
+    etag = f'"{chave}"'
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        nao_modificado['ETag'] = etag
+        return nao_modificado
+
+    response = FileResponse(
+        default_storage.open(nome, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf'
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
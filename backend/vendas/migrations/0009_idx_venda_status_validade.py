@@ -0,0 +1,20 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_ultima_atividade_em'),
+        ('core', '0005_tarefapdf_duracao'),
+        ('equipe', '0002_variantes_imagens'),
+        ('vendas', '0008_alter_venda_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['status', 'validade_orcamento'], name='idx_venda_status_validade'),
+        ),
+    ]
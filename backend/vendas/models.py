@@ -38,6 +38,12 @@ class Venda(models.Model):
     arquivo_orcamento = models.FileField(upload_to='orcamentos_vendas/', null=True, blank=True)
     comprovante_pagamento = models.FileField(upload_to='comprovantes_vendas/', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Varredura diária dos orçamentos vencidos (tasks.verificar_orcamentos_vencidos)
+            models.Index(fields=['status', 'validade_orcamento'], name='idx_venda_status_validade'),
+        ]
+
     def __str__(self):
         return f"Venda #{self.id} para {self.cliente}"
 
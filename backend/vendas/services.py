@@ -6,8 +6,11 @@ from django.utils import timezone
 import uuid
 import calendar
 import datetime
+import os
+from django.conf import settings
+from django.utils.text import slugify
 
-from estoque.models import MovimentacaoEstoque, Produto
+from estoque.services import baixar_estoque
 from financeiro.models import LancamentoFinanceiro
 from .models import Venda, ItemVenda
 
@@ -40,33 +43,25 @@ def aprovar_venda(venda: Venda):
     if venda.status != 'ORCAMENTO':
         raise ValidationError(f"Esta venda não é um orçamento e não pode ser aprovada.")
 
-    if timezone.now().date() > venda.validade_orcamento:
+    if timezone.localdate() > venda.validade_orcamento:
+        # Mesmo UPDATE da varredura diária (tasks.verificar_orcamentos_vencidos)
+        Venda.objects.filter(pk=venda.pk, status='ORCAMENTO').update(status='VENCIDO')
         venda.status = 'VENCIDO'
-        venda.save()
         raise ValidationError(f"Orçamento expirado em {venda.validade_orcamento.strftime('%d/%m/%Y')}. A venda foi marcada como vencida.")
 
     with transaction.atomic():
-        # Valida o estoque de todos os itens ANTES de qualquer alteração
-        for item in venda.itens.all():
-            produto = item.produto
-            if produto.estoque_atual < item.quantidade:
-                raise ValidationError(f"Estoque insuficiente para o produto {produto.nome}. Disponível: {produto.estoque_atual}. Dê entrada no produto antes de aprovar a venda.")
-
-        # Deduz o estoque e cria movimentações
-        for item in venda.itens.all():
-            produto = Produto.objects.select_for_update().get(pk=item.produto.id)
-            produto.estoque_atual -= Decimal(item.quantidade)
-            produto.save()
-
-            MovimentacaoEstoque.objects.create(
-                empresa=venda.empresa,
-                produto=produto,
-                quantidade=item.quantidade,
-                tipo_movimento='SAIDA',
-                cliente=venda.cliente, # <--- THIS IS THE CRITICAL ADDITION
-                observacao=f"Venda #{venda.id} aprovada"
-            )
-        
+        # Trava a venda e relê o status: duas aprovações simultâneas não baixam o estoque duas vezes
+        if Venda.objects.select_for_update().values_list('status', flat=True).get(pk=venda.pk) != 'ORCAMENTO':
+            raise ValidationError("Esta venda já foi processada.")
+
+        # Valida e deduz o estoque de todos os itens de uma vez (produtos travados)
+        baixar_estoque(
+            venda.itens.values_list('produto_id', 'quantidade'),
+            observacao=f"Venda #{venda.id} aprovada",
+            cliente=venda.cliente,
+            empresa=venda.empresa,
+        )
+
         venda.status = 'CONCLUIDA'
         venda.save()
 
@@ -133,3 +128,62 @@ def aprovar_venda(venda: Venda):
                     status=status_pagamento, parcela_atual=1, total_parcelas=1
                 )
     return venda
+
+
+# =====================================================
+# ORÇAMENTO EM PDF (renderizado pelo Celery: core.tasks.renderizar_pdf)
+# =====================================================
+
+def montar_contexto_orcamento_venda(venda):
+    # O template percorre venda.itens.all: usa o prefetch quando houver
+    itens = list(venda.itens.all())
+    return {
+        'venda': venda,
+        'data_hoje': timezone.now(),
+        'logo_path': f"file://{os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')}",
+        'valor_final': venda.valor_total - venda.desconto - venda.valor_entrada,
+        'empty_rows': range(max(0, 5 - len(itens))),
+    }
+
+
+TEMPLATE_ORCAMENTO_VENDA = 'utils/pdfs/orcamento_venda.html'
+PASTA_ORCAMENTOS_VENDA = 'orcamentos_vendas'
+
+
+def nome_arquivo_orcamento_venda(venda):
+    cliente_nome_slug = slugify(venda.cliente.razao_social)
+    data_atual_slug = timezone.now().strftime('%d-%m-%Y')
+    return f"orcamento_{cliente_nome_slug}_{data_atual_slug}.pdf"
+
+
+def _venda_para_orcamento(venda_id):
+    return Venda.objects.select_related('cliente', 'empresa').prefetch_related('itens__produto').get(pk=venda_id)
+
+
+def _anexar_orcamento_venda(venda, nome):
+    if venda.arquivo_orcamento.name != nome:
+        venda.arquivo_orcamento.name = nome
+        venda.save(update_fields=['arquivo_orcamento'])
+    return venda.arquivo_orcamento
+
+
+def orcamento_venda_pdf(venda):
+    """(nome no storage, chave) do orçamento; só renderiza se a venda mudou desde o último PDF."""
+    from utils.pdf_service import obter_pdf
+    return obter_pdf(TEMPLATE_ORCAMENTO_VENDA, montar_contexto_orcamento_venda(venda), PASTA_ORCAMENTOS_VENDA)
+
+
+def salvar_orcamento_venda_pdf(venda_id):
+    """Gera (ou reaproveita) o orçamento da venda e anexa em arquivo_orcamento."""
+    venda = _venda_para_orcamento(venda_id)
+    nome, _ = orcamento_venda_pdf(venda)
+    return _anexar_orcamento_venda(venda, nome)
+
+
+def orcamento_venda_pdf_em_cache(venda_id):
+    """Anexa e devolve o orçamento se um PDF idêntico já existe; None se precisa renderizar."""
+    from utils.pdf_service import pdf_em_cache
+
+    venda = _venda_para_orcamento(venda_id)
+    nome = pdf_em_cache(TEMPLATE_ORCAMENTO_VENDA, montar_contexto_orcamento_venda(venda), PASTA_ORCAMENTOS_VENDA)
+    return _anexar_orcamento_venda(venda, nome) if nome else None
@@ -1,29 +1,49 @@
+import logging
+
 from celery import shared_task
 from django.utils import timezone
 from .models import Venda
 
-@shared_task
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
 def verificar_orcamentos_vencidos():
     """
-    Verifica e atualiza orçamentos de venda que expiraram.
+    Marca como VENCIDO, num único UPDATE, todo orçamento com validade anterior
+    a hoje (índice idx_venda_status_validade) e avisa os gestores com um resumo.
+    Agendar no beat diariamente, logo após a meia-noite: as telas só leem o status.
     """
-    hoje = timezone.now().date()
-    
-    # Busca orçamentos com data de validade anterior a hoje
-    orcamentos_vencidos = Venda.objects.filter(
+    from equipe.models import Equipe
+    from servicos.models import Notificacao
+    from servicos.services import criar_notificacoes
+    from servicos.signals import enviar_notificacoes_ws
+
+    hoje = timezone.localdate()
+    num_vencidos = Venda.objects.filter(
         status='ORCAMENTO',
         validade_orcamento__lt=hoje
-    )
-    
-    # Conta quantos são antes de atualizar
-    num_vencidos = orcamentos_vencidos.count()
-    
-    if num_vencidos > 0:
-        # Atualiza o status de todos os orçamentos vencidos de uma vez
-        orcamentos_vencidos.update(status='VENCIDO')
-        log_message = f"{num_vencidos} orçamento(s) de venda foram marcados como 'VENCIDO'."
-    else:
-        log_message = "Nenhum orçamento de venda vencido encontrado."
-        
-    print(log_message)
-    return log_message
+    ).update(status='VENCIDO')
+
+    if not num_vencidos:
+        logger.info("Nenhum orçamento de venda vencido encontrado.")
+        return 0
+    logger.info(f"{num_vencidos} orçamento(s) de venda foram marcados como 'VENCIDO'.")
+
+    gestores = Equipe.objects.filter(
+        cargo__in=[Equipe.Cargo.GESTOR, Equipe.Cargo.SOCIO],
+        usuario__isnull=False
+    ).values_list('usuario_id', flat=True)
+    notificacoes = [
+        Notificacao(
+            destinatario_id=usuario_id,
+            titulo="Orçamentos Vencidos",
+            mensagem=f"{num_vencidos} orçamento(s) de venda venceram e foram marcados como vencidos.",
+            link="/vendas",
+            # Rodou de novo no mesmo dia: um resumo só
+            chave_deduplicacao=f"orcamentos_vencidos:{hoje.isoformat()}",
+        )
+        for usuario_id in gestores
+    ]
+    enviar_notificacoes_ws(criar_notificacoes(notificacoes))
+    return num_vencidos
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from clientes.models import Cliente
+from core.models import Empresa
+from equipe.models import Equipe
+from servicos.models import Notificacao
+from .models import Venda
+from .tasks import verificar_orcamentos_vencidos
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'vendas-testes'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class VencimentoOrcamentosTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gestor', password='x')
+        self.vendedor = Equipe.objects.create(usuario=self.user, nome='Gestor', cargo='GESTOR')
+        self.empresa = Empresa.objects.create(razao_social='Empresa Teste', nome_fantasia='Empresa', cnpj='00000000000100')
+        self.cliente = Cliente.objects.create(razao_social='Cliente Teste', nome='Cliente')
+
+    def _venda(self, dias_validade, status='ORCAMENTO'):
+        return Venda.objects.create(
+            empresa=self.empresa, cliente=self.cliente, vendedor=self.vendedor, status=status,
+            validade_orcamento=timezone.localdate() + timedelta(days=dias_validade),
+        )
+
+    def test_varredura_vence_em_um_update_e_resume_numa_notificacao(self):
+        vencidos = [self._venda(-1), self._venda(-10)]
+        valido = self._venda(0)
+        concluida = self._venda(-5, status='CONCLUIDA')
+
+        # UPDATE + gestores + chaves existentes + bulk_create (num savepoint: 2 a mais)
+        with self.assertNumQueries(6):
+            self.assertEqual(verificar_orcamentos_vencidos(), 2)
+        self.assertEqual(verificar_orcamentos_vencidos(), 0)
+
+        status = dict(Venda.objects.values_list('id', 'status'))
+        self.assertEqual([status[v.id] for v in vencidos], ['VENCIDO', 'VENCIDO'])
+        self.assertEqual(status[valido.id], 'ORCAMENTO')
+        self.assertEqual(status[concluida.id], 'CONCLUIDA')
+        resumo = Notificacao.objects.get(destinatario=self.user)
+        self.assertIn('2 orçamento(s)', resumo.mensagem)
+
+    def test_detalhe_nao_grava(self):
+        venda = self._venda(-1)
+        self.client.force_authenticate(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/vendas/{venda.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(response.data['status'], 'ORCAMENTO')  # a varredura diária é quem vence
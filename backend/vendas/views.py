@@ -1,17 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from django.utils import timezone
 from rest_framework.response import Response
 from .models import Venda, ItemVenda
 from .serializers import VendaSerializer, VendaListSerializer, VendaDetailSerializer, ItemVendaSerializer
-from django.template.loader import render_to_string
-from weasyprint import HTML
-from django.http import HttpResponse
-from django.conf import settings
-import os
-from django.utils.text import slugify
 
-from .services import criar_orcamento_venda, aprovar_venda
+from core.models import TarefaPDF
+from core.serializers import TarefaPDFSerializer
+from core.services import solicitar_pdf
+from utils.pdf_service import responder_pdf
+from .services import criar_orcamento_venda, aprovar_venda, orcamento_venda_pdf, nome_arquivo_orcamento_venda
 
 class VendaViewSet(viewsets.ModelViewSet):
     queryset = Venda.objects.all()
@@ -23,17 +20,6 @@ class VendaViewSet(viewsets.ModelViewSet):
             return VendaDetailSerializer
         return VendaSerializer
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        
-        # Auto-update status if expired
-        if instance.status == 'ORCAMENTO' and instance.validade_orcamento < timezone.now().date():
-            instance.status = 'VENCIDO'
-            instance.save()
-            
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
-
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -49,32 +35,22 @@ class VendaViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(venda_aprovada)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get', 'post'])
     def gerar_pdf(self, request, pk=None):
+        """
+        POST: enfileira o PDF (202 + tarefa; acompanhar em /api/tarefas-pdf/<id>/).
+        GET: download direto (integrações antigas), com ETag.
+        """
         venda = self.get_object()
-        logo_path = f"file://{os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')}"
-
-        context = {
-            'venda': venda,
-            'data_hoje': timezone.now(),
-            'logo_path': logo_path,
-            'valor_final': venda.valor_total - venda.desconto - venda.valor_entrada,
-            'empty_rows': range(max(0, 5 - venda.itens.count())),
-        }
-
-        html_string = render_to_string('utils/pdfs/orcamento_venda.html', context)
-        html = HTML(string=html_string)
-        pdf = html.write_pdf()
-
-        # --- Lógica do nome do arquivo ---
-        cliente_nome_slug = slugify(venda.cliente.razao_social)
-        data_atual_slug = timezone.now().strftime('%d-%m-%Y')
-        filename = f"orcamento_{cliente_nome_slug}_{data_atual_slug}.pdf"
-
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        
-        return response
+        if request.method == 'POST':
+            tarefa = solicitar_pdf(TarefaPDF.Documento.ORCAMENTO_VENDA, venda.id, request.user)
+            # 200 quando o PDF já existia (cache por conteúdo); 202 quando foi para a fila
+            codigo = status.HTTP_200_OK if tarefa.status == TarefaPDF.Status.CONCLUIDO else status.HTTP_202_ACCEPTED
+            return Response(TarefaPDFSerializer(tarefa, context={'request': request}).data, status=codigo)
+
+        # PDF em cache pelo conteúdo: só renderiza se a venda mudou; ETag/If-None-Match -> 304
+        nome, chave = orcamento_venda_pdf(venda)
+        return responder_pdf(request, nome, chave, nome_arquivo_orcamento_venda(venda))
 
     @action(detail=True, methods=['post'])
     def upload_comprovante(self, request, pk=None):
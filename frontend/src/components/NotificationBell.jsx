@@ -10,6 +10,8 @@ export default function NotificationBell() {
   const [unreadCount, setUnreadCount] = useState(0);
   const [userId, setUserId] = useState(null);
   const menuRef = useRef(null);
+  // Maior id já recebido: no reconnect o backend reenvia só o que veio depois
+  const ultimoIdRef = useRef(0);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -27,9 +29,15 @@ export default function NotificationBell() {
   // 2. Busca o histórico de notificações antigas via API
   const carregarNotificacoes = async () => {
     try {
-      const res = await api.get('/notificacoes/');
-      setNotificacoes(res.data);
-      setUnreadCount(res.data.filter(n => !n.lida).length);
+      // Lista paginada (mais recentes primeiro): a primeira página basta para o sino
+      const [res, contador] = await Promise.all([
+        api.get('/notificacoes/'),
+        api.get('/notificacoes/contador/'),
+      ]);
+      const lista = res.data.results || res.data;
+      setNotificacoes(lista);
+      ultimoIdRef.current = Math.max(ultimoIdRef.current, ...lista.map(n => n.id || 0));
+      setUnreadCount(contador.data.nao_lidas);
     } catch (error) {
       console.error("Erro ao buscar histórico de notificações", error);
     }
@@ -45,34 +53,71 @@ export default function NotificationBell() {
     if (!userId) return;
 
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const ws = new WebSocket(`${protocol}//${window.location.host}/ws/notificacoes/${userId}/`);
-
-    ws.onopen = () => {
-      console.log('🔌 WebSocket conectado com sucesso!');
-    };
-
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      console.log("🔔 Nova notificação recebida via WebSocket:", data);
-      
-      // Dependendo de como o backend envia, pode estar dentro de 'message'
-      const novaNotificacao = data.message || data; 
-
-      // Adiciona a nova notificação no topo da lista e aumenta o contador
-      setNotificacoes(prev => [novaNotificacao, ...prev]);
-      setUnreadCount(prev => prev + 1);
-    };
-
-    ws.onclose = () => {
-      console.log('🔌 WebSocket desconectado');
+    let ws;
+    let tentativas = 0;
+    let reconectar;
+    let ping;
+    let encerrado = false;
+
+    const conectar = () => {
+      ws = new WebSocket(`${protocol}//${window.location.host}/ws/notificacoes/${userId}/`);
+
+      ws.onopen = () => {
+        tentativas = 0;
+        console.log('🔌 WebSocket conectado com sucesso!');
+        // ultimo_id + token: o backend reenvia o que chegou enquanto estávamos desconectados.
+        // Vai sempre, mesmo com 0 (REST ainda não respondeu): o que foi criado entre o GET e
+        // o connect também volta, e duplicatas caem pelo id. O token vai no frame, não na URL,
+        // para não ficar nos logs de acesso.
+        ws.send(JSON.stringify({ token: localStorage.getItem('token') || '', ultimo_id: ultimoIdRef.current }));
+        // Mantém a presença no backend enquanto a aba estiver aberta
+        ping = setInterval(() => ws.send(JSON.stringify({ tipo: 'ping' })), 5 * 60 * 1000);
+      };
+
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        console.log("🔔 Nova notificação recebida via WebSocket:", data);
+        
+        // Aviso de PDF pronto (tarefas-pdf) e resposta do ping usam o mesmo canal, mas não são notificação
+        if (data.pdf || data.tipo === 'pong') return;
+
+        // Dependendo de como o backend envia, pode estar dentro de 'message'
+        const novaNotificacao = data.message || data; 
+
+        // Reenvio e tempo real podem repetir a mesma notificação: descarta pelo id
+        if (novaNotificacao.id) {
+          ultimoIdRef.current = Math.max(ultimoIdRef.current, novaNotificacao.id);
+        }
+
+        // Adiciona a nova notificação no topo da lista e aumenta o contador
+        setNotificacoes(prev => (
+          novaNotificacao.id && prev.some(n => n.id === novaNotificacao.id) ? prev : [novaNotificacao, ...prev]
+        ));
+        // O backend já manda o total de não lidas junto
+        setUnreadCount(prev => (typeof data.nao_lidas === 'number' ? data.nao_lidas : prev + 1));
+      };
+
+      ws.onclose = () => {
+        console.log('🔌 WebSocket desconectado');
+        clearInterval(ping);
+        if (encerrado) return;
+        // Reconecta com espera crescente (1s, 2s, 4s... até 30s)
+        reconectar = setTimeout(conectar, Math.min(30000, 1000 * 2 ** tentativas));
+        tentativas += 1;
+      };
+
+      ws.onerror = (error) => {
+        console.error('🔌 Erro no WebSocket:', error);
+      };
     };
 
-    ws.onerror = (error) => {
-      console.error('🔌 Erro no WebSocket:', error);
-    };
+    conectar();
 
     // Limpa a conexão quando o usuário sai do sistema
     return () => {
+      encerrado = true;
+      clearTimeout(reconectar);
+      clearInterval(ping);
       ws.close();
     };
   }, [userId]);
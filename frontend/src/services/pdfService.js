@@ -0,0 +1,33 @@
+import api from './api';
+
+// Os PDFs são gerados em background: o backend responde 202 com a tarefa
+// e o front consulta /tarefas-pdf/<id>/ até ficar pronta.
+const INTERVALO_MS = 1000;
+const TEMPO_MAXIMO_MS = 120000;
+
+const esperar = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const pdfService = {
+  consultarTarefa: async (id) => {
+    const response = await api.get(`/tarefas-pdf/${id}/`);
+    return response.data;
+  },
+
+  aguardarTarefa: async (tarefa) => {
+    const inicio = Date.now();
+    let atual = tarefa;
+    while (atual.status === 'PENDENTE' || atual.status === 'PROCESSANDO') {
+      if (Date.now() - inicio > TEMPO_MAXIMO_MS) {
+        throw new Error('Tempo esgotado aguardando o PDF.');
+      }
+      await esperar(INTERVALO_MS);
+      atual = await pdfService.consultarTarefa(tarefa.id);
+    }
+    if (atual.status === 'ERRO') {
+      throw new Error(atual.erro || 'Falha ao gerar o PDF.');
+    }
+    return atual;
+  }
+};
+
+export default pdfService;
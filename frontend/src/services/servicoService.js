@@ -1,4 +1,5 @@
 import api from './api';
+import pdfService from './pdfService';
 
 const servicoService = {
   // 1. CRUD Básico da OS
@@ -102,7 +103,8 @@ const servicoService = {
 
   gerarOrcamentoPdf: async (id) => {
       const response = await api.post(`/servicos/${id}/gerar_orcamento/`);
-      return response.data;
+      const tarefa = await pdfService.aguardarTarefa(response.data);
+      return { ...tarefa, url: tarefa.arquivo_url };
   }
 };
 
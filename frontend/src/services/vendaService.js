@@ -1,4 +1,5 @@
 import api from './api';
+import pdfService from './pdfService';
 
 const vendaService = {
   listarVendas: (empresaId = null) => {
@@ -29,16 +30,16 @@ const vendaService = {
     return api.patch(`/vendas/${id}/alterar_validade/`, { nova_validade }).then(response => response.data);
   },
 
-  gerarPdf: (id) => {
-    return api.get(`/vendas/${id}/gerar_pdf/`, { responseType: 'blob' }).then(response => {
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', `orcamento_venda_${id}.pdf`);
-      document.body.appendChild(link);
-      link.click();
-      link.remove();
-    });
+  gerarPdf: async (id) => {
+    const response = await api.post(`/vendas/${id}/gerar_pdf/`);
+    const tarefa = await pdfService.aguardarTarefa(response.data);
+    const link = document.createElement('a');
+    link.href = tarefa.arquivo_url;
+    link.setAttribute('download', `orcamento_venda_${id}.pdf`);
+    link.setAttribute('target', '_blank');
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
   },
 
   uploadComprovante: (id, file) => {